@@ -0,0 +1,43 @@
+"""
+Plotly figures of the Digital Skills app, cached by ddvis.figures.
+
+    python charts.py    # warm the figure cache at container start
+"""
+import numpy as np
+from ddvis import animation, figures, geometry
+
+
+def generateColorScale(colors, naColor):
+    colorArray = []
+    colorArray.append([0, naColor])
+    for grenze, color in zip(np.linspace(0.01, 1, len(colors)), colors):
+        colorArray.append([grenze, color])
+    return colorArray
+
+
+def europe_map(geo_df, color, label, periods=None):
+    # missing values are stored as -1 and drawn with the naColor
+    fig = animation.period_choropleth(geo_df,
+                        locations='ISO',
+                        color=color,
+                        period="period", periods=periods,
+                        hover_name="country_name",
+                        color_continuous_scale=generateColorScale(colors=["white", "blue"], naColor="gray"),
+                        range_color=(0, np.max(geo_df[color])),
+                        labels={color: label},
+                        scope='europe'
+                        )
+    geometry.use_geojson(fig, level='medium')
+    fig.update_geos(fitbounds='locations', visible=False)
+    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
+    return fig
+
+
+# the parameters of the apps' calls, periods=None as select_periods gives when all periods fit
+WARM_UP = [
+    (europe_map, 'geo_digital_skills', {'color': 'At least basic digital skills', 'label': 'At least basic digital skills', 'periods': None}),
+    (europe_map, 'geo_digital_skills', {'color': 'StringencyIndex_Average', 'label': 'Lockdown Stringency', 'periods': None}),
+]
+
+if __name__ == '__main__':
+    figures.warm_up(WARM_UP)
@@ -0,0 +1,193 @@
+"""
+Build-time data compilation for the Digital Skills app.
+
+    python compile_data.py            # digital_skills.csv -> compiled/*.arrow
+    python compile_data.py --merge    # data/*.csv -> digital_skills.csv, then compile
+
+`--merge` is the former data_merge.ipynb notebook. It needs the Oxford
+COVID-19 Government Response Tracker export, too large to keep in the
+repository: it is downloaded from OXCGRT_URL to data/OxCGRT_simplified_v1.csv
+when missing and checked against the sha256 in OXCGRT_SHA256_PATH. The first
+download writes that file, commit it. Images are built from the merged
+digital_skills.csv.
+"""
+import os
+import re
+import sys
+import shutil
+import pandas as pd
+from ddvis import artifacts, fetch
+
+MERGED_CSV = 'digital_skills.csv'
+OXCGRT_CSV = 'data/OxCGRT_simplified_v1.csv'
+OXCGRT_URL = 'https://raw.githubusercontent.com/OxCGRT/covid-policy-dataset/main/data/OxCGRT_simplified_v1.csv'
+OXCGRT_SHA256_PATH = 'data/OxCGRT_simplified_v1.csv.sha256'
+
+# compiled columns and dtypes, see artifacts.write. The CSV's unnamed index and the
+# Date key of the stringency join (the period, or missing) are dropped.
+DIGITAL_SKILLS_SCHEMA = {
+    'period': 'int16',
+    'country': 'category',
+    'At least basic digital skills': 'float32',
+    'Above basic digital skills': 'float32',
+    'Broadband coverage': 'float32',
+    'Broadband take-up': 'float32',
+    'country_name': 'category',
+    'ISO': 'category',
+    'StringencyIndex_Average': 'float32',
+}
+REGRESSION_SCHEMA = {
+    'ISO': 'category',
+    'Average Lockdown Stringency': 'float32',
+    'Change in Basic Digital Skills': 'float32',
+}
+
+# https://digital-decade-desi.digital-strategy.ec.europa.eu/datasets/desi-2022/indicators
+# https://digital-decade-desi.digital-strategy.ec.europa.eu/datasets/desi/indicators
+# definitions of aggregates: https://digital-strategy.ec.europa.eu/en/policies/desi
+filename_map = {'At least basic digital skills': 'desi_1a2-data.csv',
+                'Above basic digital skills': 'desi_1a3-data.csv',
+                'At least basic digital skills (hist)': 'i_dsk_bab-data.csv',
+                'Above basic digital skills (hist)': 'i_dsk_ab-data.csv',
+                'Broadband coverage': 'desi_fbbc-data.csv',
+                'Broadband take-up': 'desi_fbbtc-data.csv',
+                }
+
+country_codes = {
+    'AT': ('Austria', 'AUT'),
+    'BE': ('Belgium', 'BEL'),
+    'BG': ('Bulgaria', 'BGR'),
+    'HR': ('Croatia', 'HRV'),
+    'CY': ('Cyprus', 'CYP'),
+    'CZ': ('Czechia', 'CZE'),
+    'DK': ('Denmark', 'DNK'),
+    'EE': ('Estonia', 'EST'),
+    'FI': ('Finland', 'FIN'),
+    'FR': ('France', 'FRA'),
+    'DE': ('Germany', 'DEU'),
+    'EL': ('Greece', 'GRC'),
+    'HU': ('Hungary', 'HUN'),
+    'IE': ('Ireland', 'IRL'),
+    'IT': ('Italy', 'ITA'),
+    'LV': ('Latvia', 'LVA'),
+    'LT': ('Lithuania', 'LTU'),
+    'LU': ('Luxembourg', 'LUX'),
+    'MT': ('Malta', 'MLT'),
+    'NL': ('Netherlands', 'NLD'),
+    'PL': ('Poland', 'POL'),
+    'PT': ('Portugal', 'PRT'),
+    'RO': ('Romania', 'ROU'),
+    'SK': ('Slovakia', 'SVK'),
+    'SI': ('Slovenia', 'SVN'),
+    'ES': ('Spain', 'ESP'),
+    'SE': ('Sweden', 'SWE'),
+    'UK': ('United Kingdom', 'GBR'),
+    'EU': ('European Union', 'EU'),
+}
+
+
+def download_oxcgrt():
+    """
+    Download the OxCGRT export to OXCGRT_CSV unless it is there, and check its
+    sha256 against OXCGRT_SHA256_PATH, recording it when there is none yet.
+    """
+    if not os.path.isfile(OXCGRT_CSV):
+        print(f"Downloading {OXCGRT_URL}")
+        shutil.copyfile(fetch.fetch(OXCGRT_URL, background=False), OXCGRT_CSV)
+    digest = artifacts.file_hash(OXCGRT_CSV)
+    if not os.path.isfile(OXCGRT_SHA256_PATH):
+        with open(OXCGRT_SHA256_PATH, 'w') as file:
+            file.write(f'{digest}\n')
+        print(f"Recorded the sha256 of {OXCGRT_CSV} in {OXCGRT_SHA256_PATH}, commit it")
+        return
+    with open(OXCGRT_SHA256_PATH, 'r') as file:
+        expected = file.read().strip()
+    if digest != expected:
+        raise ValueError(f"{OXCGRT_CSV} has sha256 {digest}, expected {expected} ({OXCGRT_SHA256_PATH})")
+
+
+def merge_sources():
+    """
+    DESI indicators for the EU, Lloyds/Ofcom surveys for the UK and yearly
+    average lockdown stringency, one row per (period, country).
+    """
+    merged_df = pd.read_csv('data/desi_fbbc-data.csv')
+    merged_df = merged_df.drop(['value', 'unit', 'flags', 'breakdown', 'indicator'], axis=1)
+
+    for name, filename in filename_map.items():
+        df = pd.read_csv('data/' + filename)
+        df = df.drop(['unit', 'flags', 'breakdown', 'indicator'], axis=1)
+        df.columns = ['period', 'country', name]
+        df['period'] = df['period'].apply(lambda x: int(re.sub('desi_', '', str(x))))
+        merged_df = merged_df.merge(df, how='outer', left_on=['period', 'country'], right_on=['period', 'country'])
+
+    merged_df = merged_df.set_index('period').sort_index(kind='stable')
+
+    # Prior to 2022, the digital skills assessment did not include "content creation" as a skill
+    for column in ['Above basic digital skills', 'At least basic digital skills']:
+        merged_df[column] = merged_df[column].combine_first(merged_df[f'{column} (hist)'])
+        merged_df[column] = merged_df.groupby('country')[column].ffill()
+    merged_df = merged_df.drop(['At least basic digital skills (hist)', 'Above basic digital skills (hist)'], axis=1)
+
+    # UK data is taken from the Lloyd's Consumer Digital Index, which is the source cited by the ONS for this purpose.
+    # The methodology was changed in 2019 to capture a larger number of online skills, for continuity and
+    # comparability with the EU, our values reflect only the basic skills.
+    uk_skills = pd.read_csv('data/lloyds_digital_skills_surveys.csv')
+    uk_broadband = pd.read_csv('data/ofcom_connected_nations.csv')
+    uk_df = uk_skills.merge(uk_broadband, left_on=['period', 'country'], right_on=['period', 'country'])
+    merged_df = pd.concat([merged_df, uk_df.set_index('period')])
+
+    merged_df['country_name'] = merged_df['country'].map(lambda x: country_codes[x][0])
+    merged_df['ISO'] = merged_df['country'].map(lambda x: country_codes[x][1])
+
+    gvt_df = pd.read_csv(OXCGRT_CSV)
+    gvt_df = gvt_df[['CountryName', 'CountryCode', 'Date', 'StringencyIndex_Average']]
+    gvt_df['Date'] = pd.to_datetime(gvt_df['Date'].astype(str), format='%Y%m%d')
+    gvt_df = pd.DataFrame(gvt_df.set_index('Date').groupby('CountryCode')['StringencyIndex_Average'].resample('1YE').mean())
+    gvt_df = gvt_df.reset_index()
+    gvt_df['Date'] = gvt_df['Date'].dt.year
+
+    merged_df = merged_df.reset_index()
+    merged_df = merged_df.merge(gvt_df, right_on=['CountryCode', 'Date'], left_on=['ISO', 'period'], how='left')
+    return merged_df.drop(['CountryCode'], axis=1)
+
+
+def load_merged():
+    return pd.read_csv(MERGED_CSV)
+
+
+def map_data(users):
+    """
+    The rows the maps draw, missing values as -1. The maps draw the vendored
+    shapes by ISO code (geometry.use_geojson), no geometry is stored.
+    """
+    return users.fillna({"At least basic digital skills": -1, "StringencyIndex_Average": -1})
+
+
+def reg_data(df):
+    offset_df = df[['period', 'At least basic digital skills', 'ISO']].copy()
+    offset_df['offset_period'] = offset_df['period'] - 4
+    offset_df = offset_df.merge(offset_df, left_on=['period', 'ISO'], right_on=['offset_period', 'ISO'], how='left', suffixes=('', ' (offset)'))
+    offset_df['change in basic digital skills'] = offset_df['At least basic digital skills (offset)'] - offset_df['At least basic digital skills']
+    offset_df = offset_df[offset_df['period'] == 2019].sort_values('ISO')
+
+    grouped_df = pd.DataFrame(df.groupby('ISO')['StringencyIndex_Average'].mean())
+
+    out_df = grouped_df.merge(offset_df, left_on=['ISO'], right_on=['ISO'])
+    out_df = out_df[['ISO', 'StringencyIndex_Average', 'change in basic digital skills']]
+    out_df.columns = ['ISO', 'Average Lockdown Stringency', 'Change in Basic Digital Skills']
+    return out_df
+
+
+def compile_all():
+    users = load_merged()
+    artifacts.write(users, 'digital_skills', sources=[MERGED_CSV], schema=DIGITAL_SKILLS_SCHEMA)
+    artifacts.write(map_data(users), 'geo_digital_skills', sources=[MERGED_CSV], schema=DIGITAL_SKILLS_SCHEMA)
+    artifacts.write(reg_data(users), 'regression', sources=[MERGED_CSV], schema=REGRESSION_SCHEMA)
+
+
+if __name__ == '__main__':
+    if '--merge' in sys.argv:
+        download_oxcgrt()
+        merge_sources().to_csv(MERGED_CSV)
+    compile_all()
@@ -0,0 +1,34 @@
+"""
+Plotly figures of the Exclusion Reasons app, cached by ddvis.figures.
+
+    python charts.py    # warm the figure cache at container start
+"""
+from ddvis import animation, figures, geometry
+
+
+def world_map(df, color, range_color, periods=None):
+    import plotly.express as px
+
+    fig = animation.period_choropleth(df, locations="ISO",
+        color=color,
+        period="period", periods=periods,
+        range_color=range_color,
+        hover_name="country_x",
+        projection="natural earth",
+        color_continuous_scale = px.colors.sequential.Plasma,
+        )
+    geometry.use_geojson(fig, level='low')
+
+#    fig.update_geos(fitbounds='locations', visible=False)
+    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
+    return fig
+
+
+# the parameters of the apps' calls, periods=None as select_periods gives when all periods fit
+WARM_UP = [
+    (world_map, 'exclusion_reasons', {'color': 'Individuals using the Internet (% of population)', 'range_color': [0, 100], 'periods': None}),
+    (world_map, 'exclusion_reasons', {'color': '2G Wireless Access', 'range_color': [80, 100], 'periods': None}),
+]
+
+if __name__ == '__main__':
+    figures.warm_up(WARM_UP)
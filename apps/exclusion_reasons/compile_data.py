@@ -0,0 +1,92 @@
+"""
+Build-time data compilation for the Exclusion Reasons app.
+
+    python compile_data.py            # exclusion_reasons.csv -> compiled/*.arrow
+    python compile_data.py --merge    # data/*.csv -> exclusion_reasons.csv, then compile
+
+`--merge` is the former data_merge.ipynb notebook.
+"""
+import sys
+import itertools
+import pandas as pd
+from ddvis import artifacts, countries
+
+MERGED_CSV = 'exclusion_reasons.csv'
+
+barrier_columns = ['Cost of service is too high', 'Cost of the equipment is too high',
+                   'Cultural reasons', 'Do not need the Internet',
+                   'Have access to the Internet elsewhere',
+                   'Internet service is available but it does not correspond to household needs',
+                   'Internet service is not available in the area',
+                   'No electricity in the household', 'Other reason',
+                   'Privacy or security concerns']
+
+# compiled columns and dtypes, see artifacts.write; the CSV's unnamed index is dropped
+EXCLUSION_REASONS_SCHEMA = {
+    'ISO': 'category',
+    'period': 'int16',
+    'country_x': 'category',
+    **dict.fromkeys(barrier_columns + ['Individuals using the Internet (% of population)', '2G Wireless Access'],
+                    'float32'),
+}
+
+
+def merge_sources():
+    """
+    ITU barriers to internet access, World Bank internet use and UN 2G coverage,
+    densified to one row per (ISO, period) and forward filled per country.
+    """
+    usage = pd.read_csv('data/internet_use.csv')
+    usage = usage.drop(['Indicator Name', 'Indicator Code'], axis=1)
+    usage = usage.melt(id_vars=['Country Name', 'Country Code'], var_name='period',
+                       value_name='Individuals using the Internet (% of population)').dropna()
+    usage = usage.rename(columns={'Country Name': 'country', 'Country Code': 'ISO'})
+    usage['period'] = pd.to_numeric(usage['period'], errors='coerce')
+
+    barriers = pd.read_csv('data/internet_barriers.csv')
+    barriers = barriers[barriers['seriesDescription'] == barriers['seriesDescription'][0]]
+    barriers = barriers[['seriesName', 'entityIso', 'entityName', 'dataYear', 'dataValue']]
+    barriers = barriers.set_index(['seriesName', 'entityIso', 'entityName', 'dataYear']).unstack(0)
+    barriers = barriers.droplevel(0, axis=1)
+    barriers = barriers.reset_index()
+    barriers.columns = ['ISO', 'country', 'period'] + barrier_columns
+
+    merged_df = barriers.merge(usage, how='left', left_on=['ISO', 'period'], right_on=['ISO', 'period'])
+
+    iso_codes = set(merged_df['ISO'].values)
+    years = set(merged_df['period'].values)
+    dense_index = set(itertools.product(iso_codes, years)) - set(merged_df.set_index(['ISO', 'period']).index)
+    dense_df = pd.concat([merged_df.set_index(['ISO', 'period']), pd.DataFrame(index=pd.Index(sorted(dense_index)))])
+    dense_df = dense_df.reset_index(names=['ISO', 'period'])
+    dense_df = dense_df.sort_values(['ISO', 'period'], kind='stable')
+
+    wireless_df = pd.read_csv('data/wireless_data_access.csv')
+    wireless_df = wireless_df[['GeoAreaName', 'TimePeriod', 'Value', 'SeriesCode']]
+    wireless_df = wireless_df[wireless_df['SeriesCode'] == 'IT_MOB_2GNTWK']
+    # UN SDG area names and ITU names (their codes include World Bank ones, WBG) joined by ISO3 code
+    wireless_df['ISO3'] = countries.resolve(wireless_df['GeoAreaName'])
+    wireless_df = wireless_df.drop(['GeoAreaName', 'SeriesCode'], axis=1)
+    wireless_df.columns = ['period', '2G Wireless Access', 'ISO3']
+    iso3 = barriers.drop_duplicates('ISO').set_index('ISO')['country']
+    dense_df['ISO3'] = countries.resolve(dense_df['ISO'].map(iso3))
+
+    dense_df = dense_df.merge(wireless_df.dropna(subset=['ISO3']), on=['ISO3', 'period'], how='left')
+    dense_df = dense_df.drop(['country_y', 'ISO3'], axis=1)
+
+    for col in barrier_columns + ['Individuals using the Internet (% of population)', 'country_x', '2G Wireless Access']:
+        dense_df[col] = dense_df.groupby('ISO')[col].ffill()
+    return dense_df
+
+
+def load_merged():
+    return pd.read_csv(MERGED_CSV)
+
+
+def compile_all():
+    artifacts.write(load_merged(), 'exclusion_reasons', sources=[MERGED_CSV], schema=EXCLUSION_REASONS_SCHEMA)
+
+
+if __name__ == '__main__':
+    if '--merge' in sys.argv:
+        merge_sources().to_csv(MERGED_CSV)
+    compile_all()
@@ -1,10 +1,9 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import geopandas as gpd
-import plotly.express as px
-import plotly.graph_objects as go
-from pandas import DataFrame
+from ddvis import animation, artifacts, metrics, profiling
+from ddvis.explorer import data_explorer
+from ddvis.figures import cached_figure
+from ddvis.tabs import render_tabs
+import charts
 
 # set up page details
 st.set_page_config(
@@ -13,76 +12,50 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed",
 )
+# stage timings and cache hits at /metrics on METRICS_PORT, see ddvis/metrics.py
+metrics.serve()
+# samples this rerun when asked with ?profile=<PROFILE_TOKEN>, see ddvis/profiling.py
+profiling.profile_rerun()
 
 
-@st.cache_data
 def get_data():
-    df = pd.read_csv('exclusion_reasons.csv')
-    return df
-
-
-@st.cache_data
-def get_geometries(base_df: DataFrame):
-    url = "https://naciscdn.org/naturalearth/110m/cultural/ne_110m_admin_0_countries.zip"
-    gdf_ne = gpd.read_file(url)  # zipped shapefile
-    gdf_ne = gdf_ne[["NAME", "CONTINENT", "POP_EST", 'geometry']]
-    df = gdf_ne
-
-    df1 = df[['NAME', 'geometry']]
-    df1.rename(columns={'NAME': 'country_name'}, inplace=True)
-
-    users_2 = base_df.copy()
-
-    merged = users_2.merge(df1, how='left', on='country_name')
-
-    return merged
+    # exclusion_reasons.csv typed at build time by compile_data.py
+    return artifacts.shared('exclusion_reasons')
 
 
 df = get_data()
-#geo_df = get_geometries(df)
 
-tab1, tab2, tab3 = st.tabs(
-    ['**Internet Use**', '**Wireless 2G Access**', '**Data**'])
 
-with tab1:
+def internet_use_tab():
     st.header('Map')
     st.write(
         f'This plot shows the global penetration of internet usage as a percent of the population.')
     
-    fig = px.choropleth(df, locations="ISO",
-        color="Individuals using the Internet (% of population)",
-        range_color=[0,100],
-        hover_name="country_x", 
-        projection="natural earth",
-        color_continuous_scale = px.colors.sequential.Plasma,
-        animation_frame="period", animation_group="ISO",
-        )
-
-#    fig.update_geos(fitbounds='locations', visible=False)
-    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
+    fig = cached_figure(charts.world_map, df, 'exclusion_reasons',
+                        color="Individuals using the Internet (% of population)", range_color=[0, 100],
+                        periods=animation.select_periods(df['period'], key='internet_periods'))
     st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
-with tab2:
+
+def wireless_tab():
     st.header('Map')
     st.write(
         f'This plot shows the global penetration of 2G wireless internet.')
     
-    fig = px.choropleth(df, locations="ISO",
-        color="2G Wireless Access",
-        range_color=[80,100],
-        hover_name="country_x", 
-        projection="natural earth",
-        color_continuous_scale = px.colors.sequential.Plasma,
-        animation_frame="period", animation_group="ISO",
-        )
-
-#    fig.update_geos(fitbounds='locations', visible=False)
-    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
+    fig = cached_figure(charts.world_map, df, 'exclusion_reasons',
+                        color="2G Wireless Access", range_color=[80, 100],
+                        periods=animation.select_periods(df['period'], key='wireless_periods'))
     st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
 
-with tab3:
+def data_tab():
     st.header('Data')
     st.write(f'In this table, it is possible to observe raw data.')
-    columns_to_display = [col for col in df.columns if col != 'geometry']
-    st.dataframe(df[columns_to_display], use_container_width=True)
+    data_explorer('exclusion_reasons')
+
+
+render_tabs({
+    '**Internet Use**': internet_use_tab,
+    '**Wireless 2G Access**': wireless_tab,
+    '**Data**': data_tab,
+})
@@ -0,0 +1,79 @@
+"""
+Plotly figures and static maps of the Hidden Labour Force of AI app, cached by ddvis.figures.
+
+    python charts.py    # warm the figure cache at container start
+"""
+from ddvis import figures, geometry
+
+
+def world_map(geo_gigwork):
+    import plotly.express as px
+
+    annotations = []
+    # countries without data are not drawn
+    fig = px.choropleth(geo_gigwork[geo_gigwork['country'].notna()],
+                        locations='ISO_A3',
+                        color="share",
+                        hover_name="country",
+                        labels={'share': 'Share (%) of Online Data Entry Jobs'}
+                        )
+    geometry.use_geojson(fig, level='low')
+    fig.update_geos(fitbounds='locations', visible=False)
+    fig.update_layout(
+        margin={'r': 0, 't': 0, 'l': 0, 'b': 0},
+        annotations=annotations
+    )
+    return fig
+
+
+def static_map(frames):
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm
+    import matplotlib.colors as colors
+
+    geo_gigwork, geogigwork_cities = frames
+
+    # Hidden Labour Force of AI
+    fig, ax = plt.subplots(1, 1, figsize=(30, 20))
+
+    geo_gigwork.plot('share', cmap='Blues',
+                     missing_kwds={
+                         "color": "gainsboro",
+                         "edgecolor": "lightgrey",
+                         "hatch": "///",
+                         "label": "Missing values",
+                     },
+                     vmin=0, vmax=1, ax=ax)
+
+    arrowprops = dict(facecolor='black', shrink=0.05, width=.5, headwidth=2, headlength=1)
+
+    for x, y, label, offset in zip(geogigwork_cities.geometry.x, geogigwork_cities.geometry.y,
+                                   geogigwork_cities.company, geogigwork_cities.offset):
+        ax.annotate(label, xy=(x, y), xytext=offset, textcoords="offset points", arrowprops=arrowprops, fontsize=8)
+
+    ax.tick_params(axis='both', which='both', bottom=False, top=False, left=False, labelbottom=False, labelleft=False)
+    ax.grid(False)
+    ax.set_facecolor('w')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['bottom'].set_visible(False)
+    ax.spines['left'].set_visible(False)
+    ax.set_title('Global Locations of Data Annotators')
+
+    mappable = cm.ScalarMappable(norm=colors.Normalize(vmin=0, vmax=1, clip=False), cmap='Blues')
+    plt.colorbar(mappable, ax=ax, orientation='horizontal', location='top', shrink=.3,
+                 label='Share (%) of Online Data Entry Jobs')
+
+    return fig
+
+
+WARM_UP = [
+    (world_map, 'geo_gigwork', {}),
+]
+
+STATIC_MAPS = [
+    (static_map, ('geo_gigwork', 'geo_company_cities'), {}),
+]
+
+if __name__ == '__main__':
+    figures.warm_up(WARM_UP, STATIC_MAPS)
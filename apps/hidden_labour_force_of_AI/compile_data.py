@@ -0,0 +1,55 @@
+"""
+Build-time data compilation for the Hidden Labour Force of AI app.
+
+    python compile_data.py
+
+Writes typed, pre-joined Arrow artifacts to compiled/, see ddvis/artifacts.py.
+"""
+import pandas as pd
+import geopandas as gpd
+from ddvis import artifacts, countries, geometry
+
+COMPANY_MAPPING_JSON = 'company_mapping.json'
+GIG_WORK_CSV = 'worker_country_occupation_share_2022_to_2023.csv'
+
+# compiled columns and dtypes, see artifacts.write
+GEO_GIGWORK_SCHEMA = {
+    'CNTRY_NAME': 'category',
+    'code': 'category',
+    'ISO_A3': 'category',
+    'geometry': 'geometry',
+    'country': 'category',
+    'occupation': 'category',
+    'share': 'float32',
+}
+GEO_COMPANY_CITIES_SCHEMA = {'city': 'str', 'company': 'str', 'offset': 'object', 'name': 'str', 'geometry': 'geometry'}
+
+
+def join_gigwork():
+    country_shapes = geometry.countries(['NAME', 'ISO_A2', 'ISO_A3', 'geometry'])
+    country_shapes = country_shapes.rename(columns={'NAME': 'CNTRY_NAME', 'ISO_A2': 'code'})
+    country_shapes['ISO_A3'] = countries.resolve(country_shapes['ISO_A3'])
+
+    gig_work = pd.read_csv(GIG_WORK_CSV)
+    gig_work['ISO_A3'] = countries.resolve(gig_work['country'])
+    countries.report(gig_work['country'], GIG_WORK_CSV)
+    geo_gigwork = country_shapes.merge(gig_work, on='ISO_A3', how='left')
+
+    return geo_gigwork[geo_gigwork['CNTRY_NAME'] != 'Antarctica']
+
+
+def join_company_cities():
+    cities = geometry.cities()
+    gigwork_cities = pd.read_json(COMPANY_MAPPING_JSON, orient='records', encoding='utf-8')
+    return gpd.GeoDataFrame(gigwork_cities.merge(cities, left_on='city', right_on='name'), crs=cities.crs)
+
+
+def compile_all():
+    artifacts.write(join_gigwork(), 'geo_gigwork',
+                    sources=[countries.CODES_PATH, GIG_WORK_CSV, geometry.COUNTRIES_PATH], schema=GEO_GIGWORK_SCHEMA)
+    artifacts.write(join_company_cities(), 'geo_company_cities',
+                    sources=[COMPANY_MAPPING_JSON, geometry.CITIES_PATH], schema=GEO_COMPANY_CITIES_SCHEMA)
+
+
+if __name__ == '__main__':
+    compile_all()
@@ -0,0 +1,51 @@
+"""
+Plotly figures and static maps of the Internet Users by Country app, cached by ddvis.figures.
+
+    python charts.py    # warm the figure cache at container start
+"""
+import numpy as np
+from ddvis import figures, geometry
+
+
+def world_map(geo_df):
+    import plotly.express as px
+
+    fig = px.choropleth(geo_df,
+                        locations='ISO_A3',
+                        color="percent",
+                        hover_name="country",
+                        # color_continuous_scale=px.colors.sequential.Plasma,
+                        labels={'percent': 'Percent of Internet Users'}
+                        )
+    geometry.use_geojson(fig, level='low')
+    fig.update_geos(fitbounds='locations', visible=False)
+    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
+    return fig
+
+
+def static_map(geo_df):
+    # Creating a map Percentage of Internet Users Around the World
+    title = str(np.around(geo_df['percent'].mean(), decimals=2)) + '% population of the World has access to Internet'
+
+    fig = geo_df.dropna().plot(column='percent', cmap='YlOrBr', figsize=(30, 30),
+                               scheme='User_Defined',
+                               classification_kwds=dict(bins=[10, 20, 30, 40, 50, 60, 70, 80, 90, 100]),
+                               edgecolor='black', legend=True)
+    fig.get_legend().set_bbox_to_anchor((0.15, 0.4))
+    fig.get_legend().set_title('Percentage (%)')
+    fig.set_title("Percentage of Internet Users Around the World", size=30, pad=20)
+    fig.axis('off')
+    fig.text(-15, -60, title, horizontalalignment='left', size=15, color='black', weight='semibold')
+    return fig.figure
+
+
+WARM_UP = [
+    (world_map, 'geo_users', {}),
+]
+
+STATIC_MAPS = [
+    (static_map, 'geo_users', {}),
+]
+
+if __name__ == '__main__':
+    figures.warm_up(WARM_UP, STATIC_MAPS)
@@ -0,0 +1,56 @@
+"""
+Build-time data compilation for the Internet Users by Country app.
+
+    python compile_data.py
+
+Writes typed, pre-joined Arrow artifacts to compiled/, see ddvis/artifacts.py.
+"""
+import pandas as pd
+from ddvis import artifacts, countries, geometry
+
+USERS_CSV = 'List of Countries by number of Internet Users - Sheet1.csv'
+
+# compiled columns and dtypes, see artifacts.write; counts stay int64, world totals overflow int32
+USERS_SCHEMA = {
+    'Country or Area': 'category',
+    'Internet Users': 'int64',
+    'Population': 'int64',
+    'Rank': 'int16',
+    'Percentage': 'str',
+    'Rank.1': 'Int16',
+    'percent': 'float32',
+    'ISO_A3': 'category',
+}
+GEO_USERS_SCHEMA = {'country': 'category', 'ISO_A3': 'category', 'geometry': 'geometry', 'percent': 'float32'}
+
+
+def clean_users():
+    users = pd.read_csv(USERS_CSV)
+    users = users.sort_values('Country or Area', ascending=False).drop_duplicates('Country or Area').sort_index()
+    users['Population'] = users['Population'].str.replace(',', '').astype('int64')
+    users['Internet Users'] = users['Internet Users'].str.replace(',', '').astype('int64')
+    # '-' where a country has no rank
+    users['Rank.1'] = pd.to_numeric(users['Rank.1'], errors='coerce')
+    users['percent'] = users['Internet Users'] / users['Population']
+    users['percent'] = users['percent'] * 100
+    users['ISO_A3'] = countries.resolve(users['Country or Area'])
+    countries.report(users['Country or Area'], USERS_CSV)
+    return users
+
+
+def join_geometries(users):
+    df1 = geometry.countries(['NAME', 'ISO_A3', 'geometry']).rename(columns={'NAME': 'country'})
+    df1['ISO_A3'] = countries.resolve(df1['ISO_A3'])
+    # both keys are Categoricals over the same codes, joined as integers
+    return df1.merge(users[['ISO_A3', 'percent']], how='left', on='ISO_A3')
+
+
+def compile_all():
+    users = clean_users()
+    artifacts.write(users, 'users', sources=[USERS_CSV], schema=USERS_SCHEMA)
+    artifacts.write(join_geometries(users), 'geo_users', sources=[USERS_CSV, geometry.COUNTRIES_PATH],
+                    schema=GEO_USERS_SCHEMA)
+
+
+if __name__ == '__main__':
+    compile_all()
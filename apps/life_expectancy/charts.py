@@ -0,0 +1,80 @@
+"""
+Plotly figures of the Life Expectancy app, cached by ddvis.figures.
+
+    python charts.py    # warm the figure cache at container start
+"""
+from ddvis import animation, fetch, figures, geometry
+
+US_EXPORTS_URL = 'https://raw.githubusercontent.com/plotly/datasets/master/2011_us_ag_exports.csv'
+
+
+def custom_template():
+    import plotly.graph_objects as go
+
+    return {'layout':
+        go.Layout(
+            font={'family': 'Helvetica',
+                  'size': 14,
+                  'color': '#1f1f1f'},
+
+            title={'font': {'family': 'Helvetica',
+                            'size': 20,
+                            'color': '#1f1f1f'}},
+
+            legend={'font': {'family': 'Helvetica',
+                             'size': 14,
+                             'color': '#1f1f1f'}},
+
+            plot_bgcolor='#f2f2f2',
+            paper_bgcolor='#ffffff'
+        )}
+
+
+def life_expectancy_map(df_test, periods=None):
+    import plotly.express as px
+
+    fig = animation.period_choropleth(df_test,
+                        locations="iso_alpha",
+                        color="lifeExp",
+                        period="year", periods=periods,
+                        hover_name="country",
+                        color_continuous_scale=px.colors.sequential.Plasma
+                        )
+    geometry.use_geojson(fig, level='low')
+
+    fig.update_geos(fitbounds='locations', visible=False)
+    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
+    fig.update_layout(height=600, width=1000, template=custom_template(),
+                      xaxis_title='<b>GDP per Capita</b>',
+                      yaxis_title='<b>Life Expectation</b>')
+    return fig
+
+
+def gapminder_scatter(df_test):
+    import plotly.express as px
+
+    # px splits the traces by animation frame and color, much slower on categorical labels
+    df_test = df_test.astype({'country': 'str', 'continent': 'str'})
+    fig = px.scatter(df_test, x="gdpPercap", y="lifeExp", animation_frame="year", animation_group="country",
+                     size="pop", color="continent", hover_name="country",
+                     log_x=True, size_max=55, range_x=[100, 100000], range_y=[25, 90])
+
+    fig["layout"].pop("updatemenus")  # optional, drop animation buttons
+    fig.update_layout(height=600, width=1000, template=custom_template(), xaxis_title='<b>GDP per Capita</b>',
+                      yaxis_title='<b>Life Expectation</b>')
+    return fig
+
+
+# the parameters of the apps' calls, periods=None as select_periods gives when all periods fit
+WARM_UP = [
+    (life_expectancy_map, 'gapminder', {'periods': None}),
+    (gapminder_scatter, 'gapminder', {}),
+]
+
+if __name__ == '__main__':
+    figures.warm_up(WARM_UP)
+    # a local copy to fall back on if GitHub is unreachable later
+    try:
+        fetch.fetch(US_EXPORTS_URL)
+    except OSError as error:
+        print(f"Could not fetch {US_EXPORTS_URL}: {error}")
@@ -0,0 +1,33 @@
+"""
+Build-time data compilation for the Life Expectancy app.
+
+    python compile_data.py
+
+Writes typed Arrow artifacts to compiled/, see ddvis/artifacts.py.
+"""
+import plotly.express as px
+from ddvis import artifacts, countries
+
+# compiled columns and dtypes, see artifacts.write; populations stay int64
+GAPMINDER_SCHEMA = {
+    'country': 'category',
+    'continent': 'category',
+    'year': 'int16',
+    'lifeExp': 'float32',
+    'pop': 'int64',
+    'gdpPercap': 'float32',
+    'iso_alpha': 'category',
+    'iso_num': 'int16',
+}
+
+
+def compile_all():
+    # gapminder ships with plotly as a gzipped CSV
+    gapminder = px.data.gapminder()
+    # its iso_alpha gives North Korea the code of South Korea
+    gapminder['iso_alpha'] = countries.resolve(gapminder['country'])
+    artifacts.write(gapminder, 'gapminder', schema=GAPMINDER_SCHEMA)
+
+
+if __name__ == '__main__':
+    compile_all()
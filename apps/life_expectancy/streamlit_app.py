@@ -1,8 +1,9 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
+from ddvis import animation, artifacts, fetch, metrics, profiling
+from ddvis.explorer import data_explorer
+from ddvis.figures import cached_figure
+from ddvis.tabs import render_tabs
+import charts
 
 # set up page details
 st.set_page_config(
@@ -11,62 +12,40 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed",
 )
+# stage timings and cache hits at /metrics on METRICS_PORT, see ddvis/metrics.py
+metrics.serve()
+# samples this rerun when asked with ?profile=<PROFILE_TOKEN>, see ddvis/profiling.py
+profiling.profile_rerun()
 
-custom_template = {'layout':
-    go.Layout(
-        font={'family': 'Helvetica',
-              'size': 14,
-              'color': '#1f1f1f'},
 
-        title={'font': {'family': 'Helvetica',
-                        'size': 20,
-                        'color': '#1f1f1f'}},
-
-        legend={'font': {'family': 'Helvetica',
-                         'size': 14,
-                         'color': '#1f1f1f'}},
-
-        plot_bgcolor='#f2f2f2',
-        paper_bgcolor='#ffffff'
-    )}
-
-
-@st.cache_data
 def get_test_data():
-    return px.data.gapminder()
+    # px.data.gapminder(), typed at build time by compile_data.py
+    return artifacts.shared('gapminder')
 
 
 df_test = get_test_data()
 
-tab1, tab2, tab3, tab4 = st.tabs(
-    ['**Map with slider**', '**Map with slider 2**', '**Chart with slider**', '**Time Series Data**'])
 
-with tab1:
+def map_tab():
     st.header('Map with slider')
     st.write(
         f'In this plot, it is possible to observe the presence of outliers. The ages **around and over 100** are most likely erroneous data inputs. These errors may have been made by accident or on purpose. For instance, some users may not want to disclose their personal information.')
 
-    fig = px.choropleth(df_test,
-                        locations="iso_alpha",
-                        color="lifeExp",
-                        hover_name="country",
-                        animation_frame="year",
-                        color_continuous_scale=px.colors.sequential.Plasma
-                        )
-
-    fig.update_geos(fitbounds='locations', visible=False)
-    fig.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
-    fig.update_layout(height=600, width=1000, template=custom_template,
-                      xaxis_title='<b>GDP per Capita</b>',
-                      yaxis_title='<b>Life Expectation</b>')
+    fig = cached_figure(charts.life_expectancy_map, df_test, 'gapminder',
+                        periods=animation.select_periods(df_test['year'], key='map_years'))
     st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
-with tab2:
+
+def us_map_tab():
+    import numpy as np
+    import pandas as pd
+
     st.header('Map with slider 2')
     st.write(
         f'In this plot, it is possible to observe the presence of outliers. The ages **around and over 100** are most likely erroneous data inputs. These errors may have been made by accident or on purpose. For instance, some users may not want to disclose their personal information.')
 
-    df_test_2 = pd.read_csv('https://raw.githubusercontent.com/plotly/datasets/master/2011_us_ag_exports.csv')
+    # local copy, revalidated in the background, see ddvis/fetch.py
+    df_test_2 = pd.read_csv(fetch.fetch(charts.US_EXPORTS_URL))
     data = [dict(type='choropleth',
                  locations=df_test_2['code'].astype(str),
                  z=df_test_2['total exports'].astype(float),
@@ -98,22 +77,25 @@ with tab2:
 
     st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
-with tab3:
+
+def chart_tab():
     st.header('Chart with Slider')
     st.write(
         f'In this plot, it is possible to observe the presence of outliers. The ages **around and over 100** are most likely erroneous data inputs. These errors may have been made by accident or on purpose. For instance, some users may not want to disclose their personal information.')
 
-    fig = px.scatter(df_test, x="gdpPercap", y="lifeExp", animation_frame="year", animation_group="country",
-                     size="pop", color="continent", hover_name="country",
-                     log_x=True, size_max=55, range_x=[100, 100000], range_y=[25, 90])
-
-    fig["layout"].pop("updatemenus")  # optional, drop animation buttons
-    fig.update_layout(height=600, width=1000, template=custom_template, xaxis_title='<b>GDP per Capita</b>',
-                      yaxis_title='<b>Life Expectation</b>')
+    fig = cached_figure(charts.gapminder_scatter, df_test, 'gapminder')
     st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
-with tab4:
+
+def data_tab():
     st.header('Data')
     st.write(f'In this table, it is possible to observe raw data.')
-    columns_to_display = [col for col in df_test.columns if col != 'geometry']
-    st.dataframe(df_test[columns_to_display], use_container_width=True)
+    data_explorer('gapminder')
+
+
+render_tabs({
+    '**Map with slider**': map_tab,
+    '**Map with slider 2**': us_map_tab,
+    '**Chart with slider**': chart_tab,
+    '**Time Series Data**': data_tab,
+})
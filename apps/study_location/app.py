@@ -1,43 +1,19 @@
 import os
-import pandas as pd
-import geopandas as gpd
+from functools import lru_cache
 from dash import dcc, Dash
 from dash import html
 from dash import dash_table
 import plotly.express as px
 from dash.dependencies import Input, Output
+from flask import Response
+from ddvis import artifacts, geometry, metrics, profiling
+from ddvis.tables import TableQuery
 
 
-# Load and prepare data
+# Load prepared data, built by compile_data.py
+@metrics.timed('data')
 def get_data():
-    print("Loading data")
-    country_mapping = pd.read_json('data/country_mapping.json', orient='records', encoding='utf-8')
-    country_shapes = gpd.read_file(
-        'https://services.arcgis.com/B7NI2jUD81lCgSpx/arcgis/rest/services/Assignment_6_Spatial_Reference_Systems/FeatureServer/1/query?outFields=*&where=1%3D1&f=geojson')
-    df = pd.read_csv('data/study_location_data.csv')
-
-    country_shapes = country_shapes.merge(country_mapping, left_on='CNTRY_NAME', right_on='geoName', how='left')
-    geo_df = df.merge(country_mapping, left_on='country', right_on='geoName')
-    geo_df = country_shapes.merge(geo_df, left_on='code', right_on='code', how='left')
-    geo_df = geo_df[geo_df['CNTRY_NAME'] != 'Antarctica']
-
-    # Load world population data
-    population_data = pd.read_csv('data/world_population.csv')
-    population_data.rename(columns={'2022 Population': 'population'}, inplace=True)
-
-    # Merge population data based on the CCA3 code
-    geo_df = geo_df.merge(population_data[['CCA3', 'population']], left_on='CCA3_x', right_on='CCA3', how='left')
-
-    # Add extra column number / population
-    geo_df['papers_per_capita'] = geo_df['number'] / geo_df['population'] * 1e+6
-
-    # Final renaming and cleaning
-    geo_df.rename(columns={'country': 'country_data', 'CNTRY_NAME': 'country'}, inplace=True)
-
-    # remove unused columns
-    geo_df.drop(columns=['CCA3_x', 'CCA3_y', 'CCA3', 'country_data'], inplace=True)
-    geo_df['number'] = geo_df['number'].fillna(0)
-    return geo_df
+    return artifacts.read('study_locations')
 
 
 # Data example for the paper list
@@ -79,6 +55,11 @@ def generate_markup(papers):
 geo_df = get_data()
 # keep only rows with number > 0
 geo_filtered_df = geo_df[geo_df['number'] > 0]
+# columnar copy of the Data tab rows, queried page by page
+table = TableQuery(artifacts.read('study_table'))
+# (papers, number of papers) per country, built once, without geometries
+papers_by_country = {row.country: (row.papers, row.number)
+                     for row in geo_df[['country', 'papers', 'number']].itertuples(index=False)}
 
 # Assuming your color_continuous_scale is defined as follows:
 color_continuous_scale = [
@@ -111,8 +92,26 @@ app._favicon = ("favicon.png")
 app.title = "Digital Divide, Study Location"
 server = app.server
 
-columns_to_display = [col for col in geo_df.columns if
-                      col not in ['geometry', 'geoName_y', 'geoName_x', 'OBJECTID']]
+
+@server.route(f"{app.config.url_base_pathname}metrics")
+def metrics_endpoint():
+    # the sum over all gunicorn workers, whichever one answers, see gunicorn.conf.py
+    return Response(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
+
+columns_to_display = table.columns
+
+world_map = px.choropleth(geo_df,
+                          locations='ISO_A3',
+                          color="number",
+                          hover_name="country",
+                          # the country names of the dropdown, see mapClick
+                          custom_data=['country'],
+                          labels={'number': 'Number of studies'},
+                          color_continuous_scale=color_continuous_scale,
+                          range_color=[0, geo_df['number'].max()])
+geometry.use_geojson(world_map, level='low')
+world_map.update_geos(fitbounds='locations', visible=False)
+world_map.update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0})
 # Layout of the app
 app.layout = html.Div([
     dcc.Tabs(id='tabs', value='tab-1', children=[
@@ -120,16 +119,7 @@ app.layout = html.Div([
             html.Div([
                 html.H4('Global Study Distribution Map'),
                 dcc.Graph(
-                    figure=px.choropleth(geo_df,
-                                         locations='country',
-                                         locationmode='country names',
-                                         color="number",
-                                         hover_name="country",
-                                         labels={'number': 'Number of studies'},
-                                         color_continuous_scale=color_continuous_scale,
-                                         range_color=[0, geo_df['number'].max()])
-                    .update_geos(fitbounds='locations', visible=False)
-                    .update_layout(margin={'r': 0, 't': 0, 'l': 0, 'b': 0}),
+                    figure=world_map,
                     id="map",
                 )
             ]),
@@ -137,14 +127,16 @@ app.layout = html.Div([
         dcc.Tab(label='Data', value='tab-2', children=[
             html.Div([
                 html.H4('Detailed Data Table'),
+                # rows are paged, filtered and sorted on the server, see update_table
                 dash_table.DataTable(
-                    data=geo_filtered_df[columns_to_display].to_dict('records'),
                     columns=[{'name': i, 'id': i} for i in columns_to_display],
                     style_table={'overflowX': 'auto'},
-                    filter_action="native",
-                    sort_action="native",
+                    filter_action="custom",
+                    filter_query='',
+                    sort_action="custom",
                     sort_mode="multi",
-                    page_action="native",
+                    sort_by=[],
+                    page_action="custom",
                     page_current=0,
                     page_size=10,
                     id='data-table'
@@ -163,34 +155,32 @@ app.layout = html.Div([
 ])
 
 
-@app.callback(
-    # Output("graph", "figure"),
+# Map clicks are handled in the browser, no server round trip
+app.clientside_callback(
+    """
+    function mapClick(clickData) {
+        return clickData ? clickData.points[0].customdata[0] : "";
+    }
+    """,
     Output("country-selection", "value"),
-    [Input("map", "clickData")]
+    Input("map", "clickData")
 )
-def mapClick(clickData):
-    return clickData['points'][0]['location'] if clickData else ""
 
 
-@app.callback(
-    Output('papers-div', 'children'),
-    [Input('country-selection', 'value')]
-)
-def update_data(value):
+@lru_cache(maxsize=512)
+def papers_markdown(value):
+    """
+    Markdown of the papers of a country, rendered once per value.
+    """
     papers_count = ""
-    try:
-        # print("value selected: ", value)
-        dff = geo_df[geo_df.country == value]
-        # print("dff: ", dff)
-        papers = dff['papers'].values[0]
-        papers_count = f" {int(dff['number'].values[0])} papers"
-        print("papers data: ", papers)
-    except:
+    if value in papers_by_country:
+        papers, number = papers_by_country[value]
+        papers_count = f" {int(number)} papers"
+    else:
         papers = "No data available for this country."
 
     markup_text = generate_markup(papers_examples)
-    div = [
-        dcc.Markdown(f'''
+    return f'''
 
 ### paper data: {papers} {papers_count}
 
@@ -198,7 +188,23 @@ def update_data(value):
 ----------
 {markup_text}
 ----------
-        '''),
+        '''
+
+
+# pre-render every country at startup
+for country in papers_by_country:
+    papers_markdown(country)
+
+
+@app.callback(
+    Output('papers-div', 'children'),
+    [Input('country-selection', 'value')]
+)
+@metrics.timed('callback')
+@profiling.profiled
+def update_data(value):
+    div = [
+        dcc.Markdown(papers_markdown(value)),
         # px.bar(pd.DataFrame({"x": [], "y": []}))
     ]
     return div
@@ -206,15 +212,46 @@ def update_data(value):
     # return px.line(dff, x='year', y='pop')
 
 
-@app.callback(Output("tabs", "value"),
-              Input("map", "clickData"))
-def select_tab(clickData):
-    if clickData:
-        # Change tab to the third one after clicking on the map
-        return "tab-3"
-    return "tab-1"
+@app.callback(
+    Output('data-table', 'data'),
+    Output('data-table', 'page_count'),
+    Input('data-table', 'page_current'),
+    Input('data-table', 'page_size'),
+    Input('data-table', 'sort_by'),
+    Input('data-table', 'filter_query'))
+@metrics.timed('callback')
+@profiling.profiled
+def update_table(page_current, page_size, sort_by, filter_query):
+    return table.page(filter_query, sort_by, page_current or 0, page_size)
+
+
+app.clientside_callback(
+    """
+    function selectTab(clickData) {
+        // Change tab to the third one after clicking on the map
+        return clickData ? "tab-3" : "tab-1";
+    }
+    """,
+    Output("tabs", "value"),
+    Input("map", "clickData")
+)
 
 
 if __name__ == '__main__':
-    app.run_server(debug=False,
-                   dev_tools_hot_reload=False)
+    # same server as in the container, with the data already loaded above
+    import runpy
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            settings = runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+            for key, value in settings.items():
+                if key in self.cfg.settings:
+                    self.cfg.set(key, value)
+            # ddvis.metrics was imported before the settings named the workers' directory
+            metrics.multiprocess(os.environ['METRICS_MULTIPROCESS_DIR'])
+
+        def load(self):
+            return server
+
+    Server().run()
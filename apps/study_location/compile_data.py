@@ -0,0 +1,86 @@
+"""
+Build-time data compilation for the Study Location app.
+
+    python compile_data.py
+
+Writes typed, pre-joined Arrow artifacts to compiled/, see ddvis/artifacts.py.
+"""
+import pandas as pd
+from ddvis import artifacts, countries, geometry
+
+STUDIES_CSV = 'data/study_location_data.csv'
+POPULATION_CSV = 'data/world_population.csv'
+
+
+# compiled columns and dtypes, see artifacts.write. Measures stay float64: the Data
+# table sends them to the browser as JSON numbers, float32 would show rounding noise.
+STUDY_TABLE_SCHEMA = {
+    'country': 'category',
+    'code': 'category',
+    'number': 'int16',
+    'papers': 'str',
+    'population': 'float64',
+    'papers_per_capita': 'float64',
+}
+STUDY_LOCATIONS_SCHEMA = dict(STUDY_TABLE_SCHEMA, ISO_A3='category')
+
+
+def join_papers(papers):
+    """
+    Papers of the names merged into one country, each listed once.
+    """
+    return '; '.join(dict.fromkeys(paper.strip() for paper in papers.dropna() if paper.strip())) or None
+
+
+def join_studies():
+    country_shapes = geometry.countries(['NAME', 'ISO_A2', 'ISO_A3', 'geometry'])
+    df = pd.read_csv(STUDIES_CSV)
+    df['ISO_A3'] = countries.resolve(df['country'])
+    countries.report(df['country'], STUDIES_CSV)
+    # names of the same country (China, Mainland China) count together, with the papers of both
+    df = df.groupby('ISO_A3', observed=True, as_index=False).agg({'country': 'first', 'number': 'sum', 'papers': join_papers})
+
+    country_shapes = country_shapes.rename(columns={'NAME': 'CNTRY_NAME', 'ISO_A2': 'code'})
+    country_shapes['ISO_A3'] = countries.resolve(country_shapes['ISO_A3'])
+    geo_df = country_shapes.merge(df, on='ISO_A3', how='left')
+    geo_df = geo_df[geo_df['CNTRY_NAME'] != 'Antarctica']
+
+    # Load world population data
+    population_data = pd.read_csv(POPULATION_CSV)
+    population_data.rename(columns={'2022 Population': 'population'}, inplace=True)
+    population_data['ISO_A3'] = countries.resolve(population_data['CCA3'])
+
+    # Merge population data based on the ISO3 code
+    geo_df = geo_df.merge(population_data[['ISO_A3', 'population']], on='ISO_A3', how='left')
+
+    # Add extra column number / population
+    geo_df['papers_per_capita'] = geo_df['number'] / geo_df['population'] * 1e+6
+
+    # Final renaming and cleaning
+    geo_df.rename(columns={'country': 'country_data', 'CNTRY_NAME': 'country'}, inplace=True)
+
+    # remove unused columns
+    geo_df.drop(columns=['country_data'], inplace=True)
+    geo_df['number'] = geo_df['number'].fillna(0)
+    return geo_df
+
+
+def table_rows(geo_df):
+    """
+    Rows of the Data tab: countries with studies, without geometries and join keys.
+    """
+    columns = [col for col in geo_df.columns if col not in ['geometry', 'ISO_A3', 'geoName', 'geoName_y', 'geoName_x', 'OBJECTID']]
+    return pd.DataFrame(geo_df.loc[geo_df['number'] > 0, columns])
+
+
+def compile_all():
+    sources = [countries.CODES_PATH, STUDIES_CSV, POPULATION_CSV, geometry.COUNTRIES_PATH]
+    geo_df = join_studies()
+    # the app needs no shapes, the map gets them from ddvis.geometry
+    artifacts.write(pd.DataFrame(geo_df.drop(columns='geometry')), 'study_locations', sources=sources,
+                    schema=STUDY_LOCATIONS_SCHEMA)
+    artifacts.write(table_rows(geo_df), 'study_table', sources=sources, schema=STUDY_TABLE_SCHEMA)
+
+
+if __name__ == '__main__':
+    compile_all()
@@ -0,0 +1,43 @@
+"""
+gunicorn settings of the study_location app.
+
+    gunicorn -c gunicorn.conf.py app:server
+
+Worker and thread counts come from the [gunicorn] section of config.toml,
+which deploy.py passes to the container as GUNICORN_WORKERS and
+GUNICORN_THREADS.
+
+The workers add up their metrics in METRICS_MULTIPROCESS_DIR, a fresh
+directory per server unless it is set.
+"""
+import os
+import gc
+import glob
+import tempfile
+import multiprocessing
+
+bind = '0.0.0.0:8501'
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count())
+threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+# app.py (data, table columns, rendered markup) is imported once in the master,
+# the forked workers share its memory copy-on-write
+preload_app = True
+
+# read by ddvis.metrics when app.py imports it, after this file
+os.environ['METRICS_MULTIPROCESS_DIR'] = os.environ.get('METRICS_MULTIPROCESS_DIR') or tempfile.mkdtemp(prefix='ddvis-metrics-')
+# samples of an earlier server would be added to this one's
+for path in glob.glob(os.path.join(os.environ['METRICS_MULTIPROCESS_DIR'], '*.json')):
+    os.remove(path)
+
+
+def when_ready(server):
+    # keep the preloaded objects out of the collector, so workers do not
+    # write to (and copy) their pages when they collect garbage
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from ddvis import metrics
+
+    # keep the counters of the exited worker, drop its gauges
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,9 @@
+"""
+Shared helpers for the Digital Divide apps.
+
+The package lives at the repository root and is copied next to each app
+by deploy/deploy.py before the image is built, so apps import it as a
+top level package:
+
+    from ddvis import geometry
+"""
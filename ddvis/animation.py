@@ -0,0 +1,104 @@
+"""
+Animated choropleths sent as one trace plus per-period values.
+
+plotly.express animations build a full trace per period: locations, hover
+text and values, each repeated in every frame. period_choropleth draws every
+location once in a single trace and makes each frame only the float32 values
+of one period, a delta plotly.js merges into that trace. Building it is one
+pivot of the data, not a figure per period.
+
+The frames sent are bounded: with more periods than MAX_FRAMES the app shows
+a slider for the range of periods (select_periods) and the frames of another
+range are built and sent when it is picked.
+
+Example:
+    # charts.py
+    def europe_map(geo_df, color, periods=None):
+        return animation.period_choropleth(geo_df, 'ISO', color, 'period', periods=periods)
+
+    # streamlit_app.py
+    periods = animation.select_periods(geo_df['period'])
+    fig = cached_figure(charts.europe_map, geo_df, 'geo_digital_skills', color=color, periods=periods)
+"""
+import os
+import numpy as np
+
+# most periods animated by one figure, more are paged with select_periods
+MAX_FRAMES = int(os.environ.get('ANIMATION_MAX_FRAMES', 12))
+
+
+def period_values(frame, locations, color, period, periods=None):
+    """
+    (locations, periods, float32 values[location, period]) of `color`,
+    missing values as NaN.
+    """
+    # a location given twice in a period shows its last value, as the one plotly drew on top
+    values = frame.pivot_table(index=locations, columns=period, values=color, aggfunc='last', dropna=False)
+    if periods is not None:
+        values = values.reindex(columns=list(periods))
+    values = values.dropna(how='all')
+    return values.index.to_numpy(), list(values.columns), values.to_numpy(dtype=np.float32, na_value=np.nan)
+
+
+def animation_layout(period, labels):
+    """
+    Period slider and play/pause buttons, as plotly.express lays them out.
+    """
+    def animate(frames, duration):
+        return [frames, {'frame': {'duration': duration, 'redraw': True}, 'mode': 'immediate',
+                         'fromcurrent': True, 'transition': {'duration': duration, 'easing': 'linear'}}]
+
+    return {
+        'sliders': [{'active': 0, 'currentvalue': {'prefix': f'{period}='}, 'len': 0.9, 'pad': {'b': 10, 't': 60},
+                     'x': 0.1, 'xanchor': 'left', 'y': 0, 'yanchor': 'top',
+                     'steps': [{'args': animate([label], 0), 'label': label, 'method': 'animate'} for label in labels]}],
+        'updatemenus': [{'buttons': [{'args': animate(None, 500), 'label': '&#9654;', 'method': 'animate'},
+                                     {'args': animate([None], 0), 'label': '&#9724;', 'method': 'animate'}],
+                         'direction': 'left', 'pad': {'r': 10, 't': 70}, 'showactive': False, 'type': 'buttons',
+                         'x': 0.1, 'xanchor': 'right', 'y': 0, 'yanchor': 'top'}],
+    }
+
+
+def period_choropleth(frame, locations, color, period, periods=None, hover_name=None, range_color=None,
+                      **choropleth_args):
+    """
+    Choropleth of `color` animated over `period`, see the module docstring.
+    `periods` limits the frames to those periods (all when None), the
+    other arguments are those of px.choropleth.
+    """
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    location_codes, periods, values = period_values(frame, locations, color, period, periods)
+    if range_color is None:
+        # the same colors for the same values in every period, whichever periods are shown
+        range_color = [float(frame[color].min()), float(frame[color].max())]
+
+    base = pd.DataFrame({locations: location_codes, color: values[:, 0]})
+    if hover_name is not None:
+        names = frame.drop_duplicates(locations, keep='last').set_index(locations)[hover_name]
+        base[hover_name] = names.reindex(location_codes).to_numpy()
+    fig = px.choropleth(base, locations=locations, color=color, hover_name=hover_name, range_color=range_color,
+                        **choropleth_args)
+
+    labels = [str(value) for value in periods]
+    fig.frames = [go.Frame(name=label, data=[go.Choropleth(z=values[:, index])])
+                  for index, label in enumerate(labels)]
+    fig.update_layout(**animation_layout(period, labels))
+    return fig
+
+
+def select_periods(periods, window=MAX_FRAMES, key=None):
+    """
+    Periods a figure animates: None (all) when they fit in one figure,
+    otherwise the `window` periods up to the one picked on a slider.
+    """
+    import streamlit as st
+
+    periods = sorted(set(periods))
+    if len(periods) <= window:
+        return None
+    end = st.select_slider('Periods up to', periods, value=periods[-1], key=key)
+    index = periods.index(end)
+    return periods[max(0, index - window + 1): index + 1]
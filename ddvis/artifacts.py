@@ -0,0 +1,226 @@
+"""
+Compiled data artifacts.
+
+Each app has a compile_data.py script that runs its cleaning and joins once,
+at image build time, and writes the results as uncompressed Arrow (Feather)
+files in `compiled/`. A manifest records the content hash of every artifact
+and of the source files it was built from. On the serving path apps only
+memory-map these files, no CSV or JSON is parsed.
+
+Each artifact is written with a declared schema, {column: dtype}:
+categorical country names and codes, int16 years, float32 measures. Columns
+not in the schema are dropped. The schema is kept in the manifest and a
+frame that does not match it is rejected when read.
+
+Example:
+    # compile_data.py
+    USERS_SCHEMA = {'country': 'category', 'year': 'int16', 'percent': 'float32'}
+    artifacts.write(users, 'users', sources=['users.csv'], schema=USERS_SCHEMA)
+
+    # streamlit_app.py
+    users = artifacts.shared('users')
+
+Paths are relative to the working directory, or to the app directory set
+with app_directory() when several apps share one process (ddvis/host.py).
+"""
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from ddvis import metrics
+
+ARTIFACTS_DIR = 'compiled'
+MANIFEST_NAME = 'manifest.json'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# app directory of the script running in the current thread, host mode only
+_app = threading.local()
+
+
+@contextmanager
+def app_directory(dir_path):
+    """
+    Resolve artifact paths against dir_path in this thread, Streamlit runs
+    each session's script in a thread of its own.
+    """
+    previous = getattr(_app, 'dir_path', None)
+    _app.dir_path = dir_path
+    try:
+        yield
+    finally:
+        _app.dir_path = previous
+
+
+def resolve(artifacts_dir):
+    dir_path = getattr(_app, 'dir_path', None)
+    return os.path.join(dir_path, artifacts_dir) if dir_path else artifacts_dir
+
+
+def artifact_path(name, artifacts_dir=ARTIFACTS_DIR):
+    return os.path.join(resolve(artifacts_dir), f'{name}.arrow')
+
+
+def load_manifest(artifacts_dir=ARTIFACTS_DIR):
+    manifest_path = os.path.join(resolve(artifacts_dir), MANIFEST_NAME)
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as file:
+        return json.load(file)
+
+
+def version(name, artifacts_dir=ARTIFACTS_DIR):
+    """
+    Content hash of a compiled artifact, used to key anything derived from it.
+    Artifacts do not change while a server runs, so the lookup is memoized.
+    """
+    return _version(name, os.path.abspath(resolve(artifacts_dir)))
+
+
+@lru_cache(maxsize=None)
+def _version(name, artifacts_dir):
+    with open(os.path.join(artifacts_dir, MANIFEST_NAME), 'r') as file:
+        return json.load(file)[name]['hash']
+
+
+def memory_bytes(frame):
+    return int(frame.memory_usage(index=False, deep=True).sum())
+
+
+def apply_schema(frame, schema):
+    """
+    The columns of `schema` ({column: dtype}) in its order, cast to their
+    dtypes. 'geometry' columns are kept as they are.
+    """
+    missing = [column for column in schema if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} of the schema are missing, the frame has {list(frame.columns)}")
+    return frame[list(schema)].astype({column: dtype for column, dtype in schema.items() if dtype != 'geometry'})
+
+
+def check_schema(frame, expected, name):
+    """
+    Raise if `frame` does not have exactly the columns and dtypes `expected`
+    ({column: dtype name}).
+    """
+    dtypes = {column: str(dtype) for column, dtype in frame.dtypes.items()}
+    if dtypes != expected:
+        differences = sorted(f"{column}: {dtypes.get(column, 'missing')} != {expected.get(column, 'not in schema')}"
+                             for column in set(dtypes) | set(expected) if dtypes.get(column) != expected.get(column))
+        raise ValueError(f"Artifact {name} does not match its schema ({'; '.join(differences)}), "
+                         f"run `python compile_data.py` again")
+
+
+def write(frame, name, sources=(), artifacts_dir=ARTIFACTS_DIR, schema=None):
+    """
+    Write a (Geo)DataFrame as an uncompressed Arrow file and record it in the manifest.
+    The index is dropped, artifacts are plain tables. With a schema the frame
+    is reduced and cast to it first, and the memory saved is reported.
+    """
+    os.makedirs(artifacts_dir, exist_ok=True)
+    path = artifact_path(name, artifacts_dir)
+    frame = frame.reset_index(drop=True)
+    before = memory_bytes(frame)
+    if schema is not None:
+        dropped = [column for column in frame.columns if column not in schema]
+        frame = apply_schema(frame, schema)
+        if dropped:
+            print(f"{name}: dropped columns not in the schema: {', '.join(map(str, dropped))}")
+    frame.to_feather(path, compression='uncompressed')
+
+    manifest = load_manifest(artifacts_dir)
+    manifest[name] = {
+        'file': os.path.basename(path),
+        'hash': file_hash(path),
+        'rows': len(frame),
+        'columns': {column: str(dtype) for column, dtype in frame.dtypes.items()},
+        'memory_bytes': memory_bytes(frame),
+        'sources': {os.path.relpath(source): file_hash(source) for source in sorted(sources)},
+    }
+    if schema is not None:
+        manifest[name]['schema'] = dict(schema)
+    with open(os.path.join(artifacts_dir, MANIFEST_NAME), 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    print(f"Compiled {name}: {len(frame)} rows, {manifest[name]['memory_bytes'] / 1024:.0f} KB in memory "
+          f"(untyped {before / 1024:.0f} KB) -> {path}")
+    return path
+
+
+def read(name, artifacts_dir=ARTIFACTS_DIR, columns=None):
+    """
+    Memory-map a compiled artifact. Files written from a GeoDataFrame come
+    back as a GeoDataFrame.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    path = artifact_path(name, artifacts_dir)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Artifact {path} is missing, run `python compile_data.py` first")
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    if b'geo' in metadata:
+        import geopandas as gpd
+
+        frame = gpd.read_feather(path, columns=columns, memory_map=True)
+    else:
+        frame = feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    entry = load_manifest(artifacts_dir).get(name, {})
+    if 'schema' in entry:
+        # the dtypes the schema was cast to when written, as this pandas names them
+        dtypes = entry['columns']
+        check_schema(frame, {column: dtypes[column] for column in columns} if columns else dtypes, name)
+    return frame
+
+
+def read_table(name, artifacts_dir=ARTIFACTS_DIR, columns=None):
+    """
+    Memory-mapped Arrow table of a compiled artifact, geometry columns as WKB.
+    """
+    import pyarrow.feather as feather
+
+    path = artifact_path(name, artifacts_dir)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Artifact {path} is missing, run `python compile_data.py` first")
+    return feather.read_table(path, columns=columns, memory_map=True)
+
+
+# frames of shared() per artifact file and columns, read once per process
+_shared = {}
+_shared_lock = threading.Lock()
+# in-memory size of the shared frames, {(app, artifact): bytes}
+_shared_bytes = {}
+metrics.gauge('ddvis_artifact_memory_bytes', 'In-memory size of a shared artifact frame.',
+              lambda: {(('app', app), ('name', name)): size for (app, name), size in _shared_bytes.items()})
+
+
+def shared(name, artifacts_dir=ARTIFACTS_DIR, columns=None):
+    """
+    A compiled artifact read once per process and shared by every session,
+    in place of st.cache_data, which pickles the frame and hands every rerun
+    a deserialized copy. Each call returns a shallow copy: no data is
+    copied, and with copy-on-write (always on in pandas 3, which the apps'
+    requirements.txt pin) a caller that changes its frame (new columns,
+    fillna or rename with inplace=True) copies only what it changes, the
+    shared frame stays as read.
+    """
+    key = (os.path.abspath(artifact_path(name, artifacts_dir)), tuple(columns) if columns else None)
+    frame = _shared.get(key)
+    metrics.count('artifact', name, hit=frame is not None)
+    if frame is None:
+        with _shared_lock:
+            frame = _shared.get(key)
+            if frame is None:
+                with metrics.timer('data', name):
+                    frame = _shared[key] = read(name, artifacts_dir, columns)
+                _shared_bytes[(metrics.app_name(), name)] = memory_bytes(frame)
+    return frame.copy(deep=False)
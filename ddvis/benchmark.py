@@ -0,0 +1,298 @@
+"""
+Offline benchmarks of the apps: data compilation and loading, figure
+building and complete reruns.
+
+Each app is measured in a fresh interpreter, from the repository's CSVs and
+the vendored geometries, in a temporary copy of its directory: the app's
+files are linked there, and the artifacts compiled by the benchmark are
+written there, not over the app's own compiled/. Benchmarks per app:
+
+    compile                  compile_data.compile_all(), sources to artifacts
+    load <artifact>          artifacts.read of each compiled artifact
+    figure <build> <params>  each charts.WARM_UP figure, built and encoded
+    png <draw> <params>      each charts.STATIC_MAPS map, drawn and rendered
+    first run                Streamlit: AppTest's first run, figure cache empty;
+                             Dash: importing app.py
+    rerun <tab>              Streamlit: a rerun showing the tab, caches warm
+    GET <path>               Dash: the page, layout and dependencies
+    callback <output>        Dash: each server callback, with the inputs'
+                             initial values from the layout
+
+Times are the median of BENCHMARK_REPEAT runs after an untimed one (first
+runs are run once).
+`--save` keeps the results as a JSON baseline; otherwise they are compared
+with the baseline, every benchmark slower by more than BENCHMARK_THRESHOLD
+(relative) and BENCHMARK_MIN_SECONDS (absolute) is reported and the exit
+status is 1. The repository's benchmark_baseline.json is a reference run,
+its python, machine and cpus say where; timings only compare on the same
+machine, so to compare a branch with main elsewhere, save a baseline of
+your own:
+
+    git checkout main && python -m ddvis.benchmark --save --baseline /tmp/main.json
+    git checkout my-branch && python -m ddvis.benchmark --baseline /tmp/main.json
+
+    python -m ddvis.benchmark [app directories] [--save] [--baseline PATH] [--repeat N] [--json]
+
+Settings (environment):
+    BENCHMARK_BASELINE      baseline file, default benchmark_baseline.json at the repository root
+    BENCHMARK_REPEAT        runs per benchmark, default 5
+    BENCHMARK_THRESHOLD     relative slowdown reported, default 0.2 (20 %)
+    BENCHMARK_MIN_SECONDS   smaller slowdowns are noise, default 0.005
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS_DIR = os.path.join(REPOSITORY_ROOT, 'apps')
+
+BASELINE_PATH = os.environ.get('BENCHMARK_BASELINE', os.path.join(REPOSITORY_ROOT, 'benchmark_baseline.json'))
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 5))
+THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', 0.2))
+MIN_SECONDS = float(os.environ.get('BENCHMARK_MIN_SECONDS', 0.005))
+
+
+def timed(function, repeat=REPEAT):
+    """
+    Median and minimum seconds of `repeat` calls of function, and its last
+    result. Repeated benchmarks get one untimed call first, for lazy imports.
+    """
+    if repeat > 1:
+        function()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return {'seconds': round(statistics.median(seconds), 6), 'min': round(min(seconds), 6), 'runs': repeat}, result
+
+
+def _label(function, params):
+    return f"{function.__qualname__} {json.dumps(params, sort_keys=True, default=str)}" if params else function.__qualname__
+
+
+def data_benchmarks(results, repeat):
+    """
+    compile, load and figure benchmarks of the app in the working directory.
+    """
+    from ddvis import artifacts, figures
+
+    if os.path.isfile('compile_data.py'):
+        import compile_data
+
+        results['compile'], _ = timed(compile_data.compile_all, repeat)
+
+    for name in artifacts.load_manifest():
+        results[f'load {name}'], _ = timed(lambda: artifacts.read(name), repeat)
+
+    if not os.path.isfile('charts.py'):
+        return
+    import charts
+
+    for build, artifact, params in getattr(charts, 'WARM_UP', []):
+        data = figures._read(artifact)
+        results[f'figure {_label(build, params)}'], encoded = timed(lambda: figures.encode(build(data, **params)), repeat)
+        results[f'figure {_label(build, params)}']['bytes'] = len(encoded)
+    for draw, artifact, params in getattr(charts, 'STATIC_MAPS', []):
+        data = figures._read(artifact)
+        results[f'png {_label(draw, params)}'], png = timed(lambda: figures.render_png(draw(data, **params), 100), repeat)
+        results[f'png {_label(draw, params)}']['bytes'] = len(png)
+
+
+def streamlit_benchmarks(results, repeat):
+    """
+    First run and per-tab reruns of streamlit_app.py through AppTest.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.abspath('streamlit_app.py'), default_timeout=300)
+    results['first run'], _ = timed(at.run, 1)
+    results['first run']['exceptions'] = len(at.exception)
+
+    for label in [tab.label for tab in at.tabs]:
+        def rerun():
+            at.session_state['tabs'] = label
+            return at.run()
+
+        results[f'rerun {label}'], _ = timed(rerun, repeat)
+        # tabs that need the network fail offline, their time is kept but flagged
+        results[f'rerun {label}']['exceptions'] = len(at.exception)
+
+
+def dash_benchmarks(results, repeat):
+    """
+    Import of app.py, then requests and server callbacks through the Dash test client.
+    """
+    import importlib
+
+    module = {}
+    results['first run'], _ = timed(lambda: module.setdefault('app', importlib.import_module('app')), 1)
+    app = module['app'].app
+    client = app.server.test_client()
+    prefix = app.config.url_base_pathname
+
+    for path in ('', '_dash-layout', '_dash-dependencies'):
+        results[f'GET /{path}'], response = timed(lambda: client.get(prefix + path), repeat)
+        results[f'GET /{path}']['bytes'] = len(response.data)
+
+    components = {component.id: component for component in app.layout._traverse() if getattr(component, 'id', None)}
+    for output, callback in app.callback_map.items():
+        if 'callback' not in callback:
+            # clientside callbacks run in the browser
+            continue
+        outputs = callback['output'] if isinstance(callback['output'], list) else [callback['output']]
+        outputs = [{'id': item.component_id, 'property': item.component_property} for item in outputs]
+        inputs = [dict(item, value=getattr(components.get(item['id']), item['property'], None))
+                  for item in callback['inputs']]
+        payload = {'output': output, 'outputs': outputs if len(outputs) > 1 else outputs[0], 'inputs': inputs,
+                   'changedPropIds': [f"{inputs[0]['id']}.{inputs[0]['property']}"], 'state': []}
+        results[f'callback {output}'], response = timed(
+            lambda: client.post(prefix + '_dash-update-component', json=payload), repeat)
+        if response.status_code != 200:
+            raise RuntimeError(f"Callback {output} failed with status {response.status_code}")
+
+
+def link_app(app_directory, directory):
+    """
+    Link every entry of app_directory into directory, except the compiled
+    artifacts and bytecode, which are written anew there.
+    """
+    for entry in os.listdir(app_directory):
+        if entry not in ('compiled', '__pycache__'):
+            os.symlink(os.path.join(app_directory, entry), os.path.join(directory, entry))
+
+
+def run_app(app_directory, repeat=REPEAT):
+    """
+    {benchmark: result} of one app, measured in this interpreter.
+    """
+    results = {}
+    # the first run draws every figure, none is read from an earlier run's cache
+    with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as work_dir, \
+            contextlib.redirect_stdout(sys.stderr):
+        os.environ['FIGURE_CACHE_DIR'] = cache_dir
+        link_app(os.path.abspath(app_directory), work_dir)
+        os.chdir(work_dir)
+        sys.path.insert(0, work_dir)
+        data_benchmarks(results, repeat)
+        if os.path.isfile('streamlit_app.py'):
+            streamlit_benchmarks(results, repeat)
+        else:
+            dash_benchmarks(results, repeat)
+    return results
+
+
+def app_directories():
+    return sorted(os.path.join(APPS_DIR, name) for name in os.listdir(APPS_DIR)
+                  if os.path.isfile(os.path.join(APPS_DIR, name, 'streamlit_app.py'))
+                  or os.path.isfile(os.path.join(APPS_DIR, name, 'app.py')))
+
+
+def measure(app_directory, repeat=REPEAT):
+    """
+    Benchmarks of one app, run in a fresh interpreter.
+    """
+    app_directory = os.path.abspath(app_directory)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPOSITORY_ROOT, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-m', 'ddvis.benchmark', '--run-app', app_directory, '--repeat', str(repeat)],
+                            cwd=app_directory, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmarks of {app_directory} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def measure_all(directories=None, repeat=REPEAT):
+    apps = {}
+    for app_directory in directories or app_directories():
+        name = os.path.basename(os.path.abspath(app_directory))
+        print(f"Benchmarking {name}", file=sys.stderr)
+        apps[name] = measure(app_directory, repeat)
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count(), 'repeat': repeat, 'apps': apps}
+
+
+def compare(baseline, current, threshold=THRESHOLD, min_seconds=MIN_SECONDS):
+    """
+    (app, benchmark, baseline seconds, current seconds, regressed) of every
+    benchmark in both runs; None seconds for benchmarks only in one of them.
+    """
+    rows = []
+    for app, results in current['apps'].items():
+        before = baseline['apps'].get(app, {})
+        for name in sorted(set(results) | set(before)):
+            old = before.get(name, {}).get('seconds')
+            new = results.get(name, {}).get('seconds')
+            regressed = old is not None and new is not None and new - old > max(threshold * old, min_seconds)
+            rows.append((app, name, old, new, regressed))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':78} {'baseline':>10} {'current':>10} {'change':>8}")
+    for app, name, old, new, regressed in rows:
+        change = f'{(new / old - 1) * 100:+7.1f}%' if old and new is not None else '     new' if old is None else ' removed'
+        print(f"{(app + ' ' + name)[:78]:78} "
+              + ' '.join(f'{seconds * 1000:8.1f}ms' if seconds is not None else ' ' * 10 for seconds in (old, new))
+              + f' {change}' + ('  SLOWER' if regressed else ''))
+
+
+def print_results(current):
+    print(f"{'benchmark':78} {'median':>10} {'min':>10}")
+    for app, results in current['apps'].items():
+        for name, result in results.items():
+            note = f"  {result['exceptions']} exceptions" if result.get('exceptions') else ''
+            print(f"{(app + ' ' + name)[:78]:78} {result['seconds'] * 1000:8.1f}ms {result['min'] * 1000:8.1f}ms{note}")
+
+
+def main(arguments):
+    def option(name, default):
+        if name in arguments:
+            index = arguments.index(name)
+            value = arguments[index + 1]
+            del arguments[index: index + 2]
+            return value
+        return default
+
+    repeat = int(option('--repeat', REPEAT))
+    if '--run-app' in arguments:
+        print(json.dumps(run_app(option('--run-app', '.'), repeat)))
+        return 0
+
+    baseline_path = option('--baseline', BASELINE_PATH)
+    threshold = float(option('--threshold', THRESHOLD))
+    flags = {argument for argument in arguments if argument.startswith('--')}
+    current = measure_all([argument for argument in arguments if argument not in flags], repeat)
+
+    if '--json' in flags:
+        print(json.dumps(current, indent=2))
+    else:
+        print_results(current)
+    if '--save' in flags:
+        with open(baseline_path, 'w') as file:
+            json.dump(current, file, indent=2)
+        print(f"Saved baseline to {baseline_path}", file=sys.stderr)
+        return 0
+    if not os.path.isfile(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --save first", file=sys.stderr)
+        return 0
+
+    with open(baseline_path, 'r') as file:
+        baseline = json.load(file)
+    rows = compare(baseline, current, threshold)
+    print()
+    print_comparison(rows)
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} benchmarks slower than the baseline by more than {threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+"""
+Country identifiers resolved to ISO3 codes.
+
+The datasets name countries in many ways: 'Korea, Rep.', 'Korea (Rep. of)',
+'South Korea', 'KR', 'KOR'. resolve() maps names, aliases, ISO2 and ISO3
+codes to the ISO3 code the shapes of ddvis.geometry are keyed by, in one
+bulk lookup: the distinct values are normalized once (case, accents,
+blanks) and looked up in a hash index of every known key. The result is a
+Categorical over codes(), so frames resolved by it join on integer codes and
+the choropleths locate countries by ISO3, not by names Plotly matches in
+the browser.
+
+Known keys are the Natural Earth names and codes of the vendored countries
+and the aliases of ddvis/data/country_codes.json (records of `geoName`,
+ISO2 `code` and ISO3 `CCA3`).
+
+Example:
+    users['ISO_A3'] = countries.resolve(users['Country or Area'])
+    shapes = geometry.countries(['ISO_A3', 'geometry'])
+    geo_users = shapes.merge(users, on='ISO_A3', how='left')
+"""
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from ddvis import geometry
+
+CODES_PATH = os.path.join(geometry.DATA_DIR, 'country_codes.json')
+
+
+def normalize(name):
+    """
+    Lookup key of a country identifier: case folded, without accents,
+    typographic apostrophes and repeated blanks.
+    """
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', name.replace('’', "'").casefold()).strip()
+
+
+@lru_cache(maxsize=1)
+def _index():
+    """
+    (hash index of the known keys, position of each key's ISO3 code in codes()).
+    """
+    import pandas as pd
+
+    shapes = geometry.countries(['NAME', 'ISO_A2', 'ISO_A3'])
+    aliases = pd.read_json(CODES_PATH, orient='records', encoding='utf-8')
+    # the same identifiers as (key, ISO3) pairs, first one wins on a clash
+    pairs = pd.concat([
+        pd.DataFrame({'key': shapes['ISO_A3'], 'iso3': shapes['ISO_A3']}),
+        pd.DataFrame({'key': aliases['CCA3'], 'iso3': aliases['CCA3']}),
+        pd.DataFrame({'key': shapes['NAME'], 'iso3': shapes['ISO_A3']}),
+        pd.DataFrame({'key': aliases['geoName'], 'iso3': aliases['CCA3']}),
+        pd.DataFrame({'key': shapes['ISO_A2'], 'iso3': shapes['ISO_A3']}),
+        pd.DataFrame({'key': aliases['code'], 'iso3': aliases['CCA3']}),
+    ]).dropna()
+    pairs['key'] = pairs['key'].map(normalize)
+    pairs = pairs.drop_duplicates('key')
+
+    codes = pd.Index(sorted(pairs['iso3'].unique()))
+    return pd.Index(pairs['key']), codes.get_indexer(pairs['iso3']), codes
+
+
+def codes():
+    """
+    Every ISO3 code resolve() returns, sorted: the categories of its result.
+    """
+    return _index()[2]
+
+
+def resolve(values):
+    """
+    ISO3 codes of country identifiers (names, aliases, ISO2 or ISO3 codes)
+    as a Categorical over codes(), NaN where an identifier is unknown.
+    """
+    import numpy as np
+    import pandas as pd
+
+    keys, positions, categories = _index()
+    value_codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    found = keys.get_indexer([normalize(value) for value in uniques])
+    unique_codes = np.where(found >= 0, positions[found], -1)
+    resolved = np.where(value_codes >= 0, unique_codes[value_codes], -1)
+    return pd.Categorical.from_codes(resolved, categories=categories)
+
+
+def unresolved(values):
+    """
+    Distinct identifiers resolve() does not know, to extend country_codes.json with.
+    """
+    import pandas as pd
+
+    values = pd.Series(values, dtype=object)
+    missing = pd.isna(resolve(values)) & values.notna()
+    return sorted(values[missing].unique())
+
+
+def report(values, label):
+    """
+    Print the identifiers of `label` left unresolved, at data compilation.
+    """
+    missing = unresolved(values)
+    if missing:
+        print(f"{label}: {len(missing)} countries not resolved to ISO3: {', '.join(map(str, missing))}")
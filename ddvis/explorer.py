@@ -0,0 +1,128 @@
+"""
+Paged data explorer for the Data tabs of the Streamlit apps.
+
+st.dataframe(df[columns]) copies the frame and serializes every row on each
+rerun. data_explorer reads the compiled artifact once as a memory-mapped
+Arrow table, projected to the shown columns, and serves one page at a time:
+TableQuery (ddvis/tables.py) filters and sorts row positions, the page is
+taken from the Arrow table and encoded as Arrow IPC. Tables and encoded
+pages are cached per process and shared by all sessions: a rerun sends the
+cached bytes of one page, whatever the table size, without serializing it
+again. The bytes are sent through Streamlit's internals, st.dataframe only
+takes data to encode; if they fail, the page is shown with st.dataframe.
+
+Filters use the DataTable syntax of tables.py:
+
+    {country} contains United && {year} >= 2000
+
+Example:
+    def data_tab():
+        st.header('Data')
+        data_explorer('gapminder')
+"""
+import json
+import math
+from functools import lru_cache
+import pyarrow as pa
+import streamlit as st
+from ddvis import artifacts
+from ddvis.tables import TableQuery
+
+PAGE_SIZE = 50
+
+# cleared the first time Streamlit does not take an encoded page, st.dataframe is used from then on
+_send_encoded = True
+
+
+@lru_cache(maxsize=16)
+def _table(name, artifacts_dir, version, columns):
+    # version keys the entry, a rebuilt artifact is read again
+    table = artifacts.read_table(name, artifacts_dir, columns=list(columns))
+    return table, TableQuery(table.to_pandas())
+
+
+def encode(table):
+    """
+    Arrow IPC stream of a table, as st.dataframe sends it.
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@lru_cache(maxsize=256)
+def _page(name, artifacts_dir, version, columns, filter_query, sort_by, page, page_size):
+    """
+    (Arrow IPC bytes of the page, matching rows, number of pages).
+    """
+    table, query = _table(name, artifacts_dir, version, columns)
+    rows = query.rows(filter_query, [{'column_id': column, 'direction': direction} for column, direction in sort_by])
+    page_count = max(1, math.ceil(len(rows) / page_size))
+    return encode(table.take(rows[page * page_size: (page + 1) * page_size])), len(rows), page_count
+
+
+def _enqueue_encoded(payload):
+    """
+    The element st.dataframe(page, width='stretch', hide_index=True) sends,
+    built from the encoded page. st.dataframe only takes data to encode,
+    this goes through Streamlit's internals.
+    """
+    from streamlit.elements.lib.layout_utils import LayoutConfig
+    from streamlit.proto.Dataframe_pb2 import Dataframe
+
+    proto = Dataframe()
+    proto.arrow_data.data = payload
+    proto.editing_mode = Dataframe.EditingMode.READ_ONLY
+    proto.columns = json.dumps({'_index': {'hidden': True}})
+    st._main._enqueue('dataframe', proto, layout_config=LayoutConfig(width='stretch'))
+
+
+def _show_page(payload):
+    """
+    Show an encoded page, as is while Streamlit's internals take it,
+    otherwise through st.dataframe.
+    """
+    global _send_encoded
+    if _send_encoded:
+        try:
+            _enqueue_encoded(payload)
+            return
+        except Exception as error:
+            _send_encoded = False
+            print(f"Encoded pages are not sent anymore, using st.dataframe: {error!r}")
+    st.dataframe(pa.ipc.open_stream(payload).read_all(), width='stretch', hide_index=True)
+
+
+def shown_columns(name, artifacts_dir=artifacts.ARTIFACTS_DIR):
+    """
+    Columns of a compiled artifact, without geometries.
+    """
+    columns = artifacts.load_manifest(artifacts_dir)[name]['columns']
+    return tuple(column for column, dtype in columns.items() if column != 'geometry' and dtype != 'geometry')
+
+
+def data_explorer(name, columns=None, key=None, page_size=PAGE_SIZE):
+    """
+    Filter, sort order and page of the compiled artifact `name`, then the page.
+    """
+    key = key or name
+    artifacts_dir = artifacts.resolve(artifacts.ARTIFACTS_DIR)
+    version = artifacts.version(name)
+    columns = tuple(columns) if columns else shown_columns(name)
+
+    filter_column, sort_column, order_column = st.columns([3, 2, 1])
+    filter_query = filter_column.text_input('Filter', key=f'{key}_filter',
+                                            placeholder='{country} contains United && {number} > 3')
+    sort = sort_column.selectbox('Sort by', ('',) + columns, key=f'{key}_sort')
+    descending = order_column.toggle('Descending', key=f'{key}_descending')
+    sort_by = ((sort, 'desc' if descending else 'asc'),) if sort else ()
+
+    _, rows, page_count = _page(name, artifacts_dir, version, columns, filter_query, sort_by, 0, page_size)
+    if st.session_state.get(f'{key}_page', 1) > page_count:
+        # the filter left fewer pages than the one shown
+        st.session_state[f'{key}_page'] = 1
+    page = st.number_input('Page', min_value=1, max_value=page_count, key=f'{key}_page') - 1
+    payload, _, _ = _page(name, artifacts_dir, version, columns, filter_query, sort_by, page, page_size)
+    _show_page(payload)
+    st.caption(f'{rows} rows, page {page + 1} of {page_count}')
@@ -0,0 +1,151 @@
+"""
+Cached fetches of remote datasets.
+
+Every remote file the apps read goes through fetch(url), which returns the
+path of a local copy. Copies are kept on disk, keyed by URL, next to the
+response's ETag and Last-Modified. A copy younger than FETCH_MAX_AGE is
+used as is; an older one is served at once and revalidated in the
+background with If-None-Match / If-Modified-Since. When the server cannot be
+reached the cached copy is used, only a URL never fetched fails.
+
+Example:
+    df = pd.read_csv(fetch.fetch('https://raw.githubusercontent.com/plotly/datasets/master/2011_us_ag_exports.csv'))
+
+Settings (environment):
+    FETCH_CACHE_DIR     directory of the copies, default ~/.cache/ddvis/fetch
+    FETCH_MAX_AGE       seconds a copy is used without revalidation, default 86400
+    FETCH_TIMEOUT       seconds to wait for the server, default 10
+    FETCH_FIXTURES_URL  base URL of a local stand-in server: https://host/path
+                        is fetched from <FETCH_FIXTURES_URL>/host/path instead
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CACHE_DIR = os.environ.get('FETCH_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ddvis', 'fetch'))
+MAX_AGE = float(os.environ.get('FETCH_MAX_AGE', 24 * 3600))
+TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', 10))
+FIXTURES_URL = os.environ.get('FETCH_FIXTURES_URL')
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def source_url(url):
+    """
+    URL actually fetched, the fixtures server's stand-in in fixtures mode.
+    """
+    if not FIXTURES_URL:
+        return url
+    parts = urllib.parse.urlsplit(url)
+    return f"{FIXTURES_URL.rstrip('/')}/{parts.netloc}{parts.path}" + (f'?{parts.query}' if parts.query else '')
+
+
+def cache_paths(url, cache_dir=CACHE_DIR):
+    """
+    (data path, metadata path) of the copy of url.
+    """
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+    name = os.path.basename(urllib.parse.urlsplit(url).path) or 'index'
+    data_path = os.path.join(cache_dir, f'{key}-{name}')
+    return data_path, f'{data_path}.json'
+
+
+def _lock(url):
+    with _locks_lock:
+        return _locks.setdefault(url, threading.Lock())
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def revalidate(url, cache_dir=CACHE_DIR, timeout=TIMEOUT):
+    """
+    Fetch url into the cache, conditionally when a copy exists. Returns the
+    status: 200 (new content), 304 (copy still current).
+    """
+    data_path, meta_path = cache_paths(url, cache_dir)
+    meta = _read_meta(meta_path) if os.path.isfile(data_path) else None
+    request = urllib.request.Request(url, headers={'User-Agent': 'ddvis-fetch'})
+    if meta and meta.get('etag'):
+        request.add_header('If-None-Match', meta['etag'])
+    if meta and meta.get('last_modified'):
+        request.add_header('If-Modified-Since', meta['last_modified'])
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data, status, headers = response.read(), response.status, response.headers
+    except urllib.error.HTTPError as error:
+        if error.code != 304 or meta is None:
+            raise
+        status, headers, data = 304, error.headers, None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if status != 304:
+        _write(data_path, data)
+        meta = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+    meta['checked'] = time.time()
+    _write(meta_path, json.dumps(meta).encode('utf-8'))
+    return status
+
+
+def _revalidate_quietly(url, cache_dir, timeout):
+    lock = _lock(url)
+    if not lock.acquire(blocking=False):
+        # another thread is already revalidating url
+        return
+    try:
+        revalidate(url, cache_dir, timeout)
+    except (OSError, urllib.error.URLError) as error:
+        print(f"Could not revalidate {url}, keeping the cached copy: {error}")
+    finally:
+        lock.release()
+
+
+def fetch(url, max_age=MAX_AGE, cache_dir=CACHE_DIR, timeout=TIMEOUT, background=True):
+    """
+    Path of a local copy of url, see the module docstring. With
+    background=False a stale copy is revalidated before returning.
+    """
+    url = source_url(url)
+    data_path, meta_path = cache_paths(url, cache_dir)
+    meta = _read_meta(meta_path) if os.path.isfile(data_path) else None
+    if meta is None:
+        # nothing to fall back on, wait for the download
+        with _lock(url):
+            if not os.path.isfile(data_path):
+                revalidate(url, cache_dir, timeout)
+        return data_path
+
+    if time.time() - meta.get('checked', 0) > max_age:
+        if background:
+            threading.Thread(target=_revalidate_quietly, args=(url, cache_dir, timeout), daemon=True).start()
+        else:
+            _revalidate_quietly(url, cache_dir, timeout)
+    return data_path
+
+
+def local(source, **kwargs):
+    """
+    source itself when it is a local path, the path of its cached copy when it is a URL.
+    """
+    if urllib.parse.urlsplit(str(source)).scheme in ('http', 'https'):
+        return fetch(source, **kwargs)
+    return source
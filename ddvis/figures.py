@@ -0,0 +1,272 @@
+"""
+Plotly figure and static render cache.
+
+Figures are built once per (builder, data version, parameters), serialized,
+and kept as plotly Figures of that JSON in a bounded in-memory LRU shared by
+all sessions of the process, optionally backed by a directory of the JSON
+on disk. A rerun hands the cached Figure to st.plotly_chart, which only
+serializes it. The data version is the
+content hash of the compiled artifact the figure is drawn from, see
+ddvis/artifacts.py.
+
+Example:
+    # charts.py of an app
+    def world_map(geo_df, color):
+        return px.choropleth(geo_df, ...)
+
+    WARM_UP = [(world_map, 'geo_users', {'color': 'percent'})]
+
+    # streamlit_app.py
+    st.plotly_chart(cached_figure(charts.world_map, geo_df, 'geo_users', color='percent'))
+
+Figures are cached as they are sent to browsers, see encode: numeric
+arrays as base64 typed arrays and animation frames without the trace data
+that every frame repeats.
+
+Matplotlib figures are rasterized to PNG at fixed resolutions through
+cached_png and the same kind of cache.
+
+Settings (environment):
+    FIGURE_CACHE_MAX_BYTES  in-memory bound for Plotly JSON, default 64 MB
+    PNG_CACHE_MAX_BYTES     in-memory bound for PNG renders, default 32 MB
+    FIGURE_CACHE_DIR        directory for the on-disk copy, unset = memory only
+
+    python -m ddvis.figures [app directory]    # wire size of the app's figures
+"""
+import io
+import os
+import sys
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from ddvis import artifacts, metrics
+
+
+def drop_repeated_frame_data(figure):
+    """
+    Remove from the animation frames of a figure dict the trace attributes
+    that are the same in every frame and in the initial traces (locations,
+    hover text, templates). plotly.js merges a frame into the current
+    traces when animating, so they keep these values.
+    """
+    frames = figure.get('frames') or []
+    traces = figure.get('data') or []
+    # frames must map onto the traces one to one, by position
+    if not frames or any('traces' in frame or len(frame.get('data', [])) != len(traces) for frame in frames):
+        return figure
+    for index, trace in enumerate(traces):
+        frame_traces = [frame['data'][index] for frame in frames]
+        for key in list(frame_traces[0]):
+            if key == 'type' or key not in trace:
+                continue
+            if all(frame_trace.get(key) == trace[key] for frame_trace in frame_traces):
+                for frame_trace in frame_traces:
+                    del frame_trace[key]
+    return figure
+
+
+def encode(fig):
+    """
+    JSON bytes of a plotly Figure as cached and sent. plotly >= 6 writes
+    numpy arrays as base64 typed arrays ({"dtype": "f8", "bdata": ...}), which
+    plotly.js decodes without parsing numbers.
+    """
+    figure = drop_repeated_frame_data(json.loads(fig.to_json()))
+    return json.dumps(figure, separators=(',', ':')).encode('utf-8')
+
+
+def figure_key(name, data_version, params):
+    payload = json.dumps([name, data_version, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def decode_figure(data):
+    """
+    plotly Figure of encoded JSON bytes, kept by the figure cache. Streamlit
+    serializes a Figure as is but validates a dict anew on every call.
+    """
+    import plotly.graph_objects as go
+
+    return go.Figure(json.loads(data))
+
+
+class FigureCache:
+    """
+    LRU of rendered figures (bytes) bounded by total size in bytes. With
+    `decode` the memory holds decode(bytes) instead, built once per entry
+    and shared read-only by every caller; the size is still that of the bytes.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None, suffix='.json', name='figure', decode=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.decode = decode
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # key: (size in bytes, value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}{self.suffix}')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        if self.cache_dir and os.path.isfile(self._disk_path(key)):
+            with open(self._disk_path(key), 'rb') as file:
+                data = file.read()
+            self.hits += 1
+            return self._remember(key, data)
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        value = self._remember(key, data)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{self._disk_path(key)}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        return value
+
+    def _remember(self, key, data):
+        """
+        Keep data (or its decoded value) for key, the value kept is returned.
+        """
+        value = self.decode(data) if self.decode else data
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][1]
+            self._entries[key] = (len(data), value)
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= evicted
+        return value
+
+    def get_or_render(self, key, render, label=''):
+        """
+        Cached value for `key`, calling render() -> bytes on a miss. Lookups
+        and render times are recorded under `label`, see ddvis/metrics.py.
+        """
+        value = self.get(key)
+        metrics.count(self.name, label, hit=value is not None)
+        if value is None:
+            with metrics.timer(self.name, label):
+                data = render()
+            value = self.put(key, data)
+        return value
+
+    def figure(self, key, build, label=''):
+        """
+        Figure for `key`, calling build() -> plotly Figure on a miss. The
+        Figure is shared, pass it to st.plotly_chart as is, do not change it.
+        """
+        return self.get_or_render(key, lambda: encode(build()), label)
+
+
+figure_cache = FigureCache(max_bytes=int(os.environ.get('FIGURE_CACHE_MAX_BYTES', 64 << 20)),
+                           cache_dir=os.environ.get('FIGURE_CACHE_DIR'), decode=decode_figure)
+
+# PNG renders of Matplotlib figures share the directory but not the memory budget
+png_cache = FigureCache(max_bytes=int(os.environ.get('PNG_CACHE_MAX_BYTES', 32 << 20)),
+                        cache_dir=os.environ.get('FIGURE_CACHE_DIR'), suffix='.png', name='png')
+
+# Resolutions static maps are rasterized at, anything else is rejected so
+# the number of cached renders per map stays fixed. The apps only show 100 dpi.
+PNG_DPIS = (100,)
+
+
+def _data_version(artifact):
+    if isinstance(artifact, str):
+        return artifacts.version(artifact)
+    return [artifacts.version(name) for name in artifact]
+
+
+def _read(artifact):
+    if isinstance(artifact, str):
+        return artifacts.read(artifact)
+    return tuple(artifacts.read(name) for name in artifact)
+
+
+def cached_figure(build, data, artifact, **params):
+    """
+    build(data, **params) through the shared cache. `artifact` names the
+    compiled artifact `data` was read from and versions the entry, a tuple
+    of names when `data` is a tuple of frames.
+    """
+    key = figure_key(build.__qualname__, _data_version(artifact), params)
+    return figure_cache.figure(key, lambda: build(data, **params), build.__qualname__)
+
+
+def render_png(fig, dpi):
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    finally:
+        # pyplot keeps every figure alive until it is closed
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+def cached_png(draw, data, artifact, dpi=100, **params):
+    """
+    PNG bytes of draw(data, **params) -> Matplotlib Figure, rasterized once
+    per data version and dpi. Serve with st.image.
+    """
+    if dpi not in PNG_DPIS:
+        raise ValueError(f"dpi must be one of {PNG_DPIS}, got {dpi}")
+    key = figure_key(draw.__qualname__, _data_version(artifact), dict(params, dpi=dpi))
+    return png_cache.get_or_render(key, lambda: render_png(draw(data, **params), dpi), draw.__qualname__)
+
+
+def warm_up(figures, static_maps=()):
+    """
+    Build every (build, artifact, params) Plotly entry and render every
+    (draw, artifact, params) static map at each of PNG_DPIS. Run at
+    container start so the first page view is served from the on-disk cache.
+    """
+    for build, artifact, params in figures:
+        cached_figure(build, _read(artifact), artifact, **params)
+        print(f"Warmed {build.__qualname__} {params}")
+    for draw, artifact, params in static_maps:
+        for dpi in PNG_DPIS:
+            cached_png(draw, _read(artifact), artifact, dpi=dpi, **params)
+        print(f"Warmed {draw.__qualname__} {params} at {PNG_DPIS} dpi")
+
+
+def wire_sizes(fig):
+    """
+    (plain JSON, encoded, encoded and deflated) bytes of a figure, deflate as
+    websocket compression and gzip do it.
+    """
+    plain = fig.to_json().encode('utf-8')
+    encoded = encode(fig)
+    return len(plain), len(encoded), len(zlib.compress(encoded, 5))
+
+
+if __name__ == '__main__':
+    # python -m ddvis.figures [app directory]: sizes of the figures in the app's charts.WARM_UP
+    app_directory = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else '.')
+    sys.path.insert(0, app_directory)
+    with artifacts.app_directory(app_directory):
+        import charts
+
+        print(f"{'figure':60} {'json':>9} {'encoded':>9} {'deflated':>9}")
+        for build, artifact, params in charts.WARM_UP:
+            sizes = wire_sizes(build(_read(artifact), **params))
+            print(f"{build.__qualname__ + ' ' + json.dumps(params, default=str)[:40]:60} "
+                  + ' '.join(f'{size / 1024:7.1f}KB' for size in sizes))
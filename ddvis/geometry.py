@@ -0,0 +1,206 @@
+"""
+Offline geometry store.
+
+Country shapes and city points are vendored as GeoParquet files in
+ddvis/data, so apps never download Natural Earth or ArcGIS layers at
+runtime. Files are read lazily on first use and kept in an in-process LRU.
+
+Example:
+    from ddvis import geometry
+
+    world = geometry.countries()          # NAME, CONTINENT, POP_EST, ISO_A3, ISO_A2, geometry
+    uk = geometry.country('GBR')          # single row, looked up by ISO3
+
+Choropleths get their shapes from the same store as compact GeoJSON at a
+fixed detail level, instead of Plotly's world topology from its CDN:
+
+    fig = px.choropleth(df, locations='ISO_A3', color='share')
+    geometry.use_geojson(fig, level='low')
+"""
+import os
+import sys
+from functools import lru_cache
+from ddvis import fetch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+COUNTRIES_PATH = os.path.join(DATA_DIR, 'ne_110m_countries.parquet')
+CITIES_PATH = os.path.join(DATA_DIR, 'ne_110m_cities.parquet')
+
+COUNTRY_COLUMNS = ['NAME', 'CONTINENT', 'POP_EST', 'ISO_A3', 'ISO_A2', 'geometry']
+
+# Tolerance (degrees) used to pre-simplify the vendored shapes.
+SIMPLIFY_TOLERANCE = 0.01
+
+# Detail levels of the shapes sent to browsers: simplification tolerance
+# (degrees) and decimals kept of the coordinates. Levels are fixed so every
+# figure of a level shares the same simplified shapes.
+DETAIL_LEVELS = {
+    'low': (1.0, 1),      # world maps, 1000 px wide: 1 degree is about 3 px, 0.1 degree below one
+    'medium': (0.25, 2),  # continents
+    'high': (0.0, 3),     # the vendored shapes, quantized only
+}
+
+# Countries Natural Earth publishes without an ISO3 code ('-99').
+ISO3_OVERRIDES = {'Kosovo': 'KOS', 'N. Cyprus': 'CYN', 'Somaliland': 'SOL'}
+
+
+@lru_cache(maxsize=4)
+def _read(path):
+    import geopandas as gpd
+
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Geometry file {path} is missing, run `python -m ddvis.geometry` to build it")
+    return gpd.read_parquet(path)
+
+
+def countries(columns=None):
+    """
+    Country polygons keyed by ISO_A3, one row per country.
+    The frame is shared between callers, so a copy is returned.
+    """
+    gdf = _read(COUNTRIES_PATH)
+    if columns is not None:
+        gdf = gdf[list(columns)]
+    return gdf.copy()
+
+
+def cities():
+    """
+    Populated places points (NAME, geometry), the same data geopandas used
+    to ship as the `naturalearth_cities` dataset.
+    """
+    return _read(CITIES_PATH).copy()
+
+
+@lru_cache(maxsize=256)
+def country(iso3):
+    """
+    Single country row by ISO3 code, raises KeyError for unknown codes.
+    """
+    gdf = _read(COUNTRIES_PATH)
+    match = gdf[gdf['ISO_A3'] == iso3]
+    if match.empty:
+        raise KeyError(iso3)
+    return match.iloc[0]
+
+
+def _rounded(coordinates, digits):
+    if isinstance(coordinates[0], float):
+        return [round(value, digits) for value in coordinates]
+    return [_rounded(part, digits) for part in coordinates]
+
+
+@lru_cache(maxsize=len(DETAIL_LEVELS))
+def _level_features(level):
+    """
+    {ISO3: GeoJSON feature} of every country at a detail level.
+    """
+    # coverage_simplify and orient_polygons need shapely >= 2.1, pinned in the apps' requirements.txt
+    import shapely
+
+    tolerance, decimals = DETAIL_LEVELS[level]
+    finest = max(decimals for _, decimals in DETAIL_LEVELS.values())
+    gdf = _read(COUNTRIES_PATH)
+    shapes = gdf.geometry.to_numpy()
+    if tolerance:
+        # simplifies the countries together, borders shared by neighbours stay shared
+        shapes = shapely.coverage_simplify(shapes, tolerance)
+    snapped = shapely.set_precision(shapes, 10 ** -decimals)
+    # countries smaller than the grid keep the finest one instead of vanishing
+    collapsed = shapely.is_empty(snapped)
+    snapped[collapsed] = shapely.set_precision(shapes[collapsed], 10 ** -finest)
+    # d3, which draws Plotly maps, expects clockwise exterior rings
+    snapped = shapely.orient_polygons(snapped, exterior_cw=True)
+
+    features = {}
+    for iso3, shape, small in zip(gdf['ISO_A3'], snapped, collapsed):
+        if not shape.is_empty:
+            mapping = shapely.geometry.mapping(shape)
+            coordinates = _rounded(mapping['coordinates'], finest if small else decimals)
+            features[iso3] = {'type': 'Feature', 'id': iso3,
+                              'geometry': {'type': mapping['type'], 'coordinates': coordinates}}
+    return features
+
+
+def geojson(iso3_codes=None, level='low'):
+    """
+    GeoJSON FeatureCollection of the given countries (all when None) at a
+    detail level, with the ISO3 codes as feature ids.
+    """
+    features = _level_features(level)
+    codes = features if iso3_codes is None else {code for code in iso3_codes if code in features}
+    return {'type': 'FeatureCollection', 'features': [features[code] for code in sorted(codes)]}
+
+
+def use_geojson(fig, level='low'):
+    """
+    Draw the choropleth traces of fig, located by ISO3 codes, with shapes of
+    the store at `level`, limited to the countries the figure shows. The
+    shapes are set on the initial traces only, animation frames reuse them.
+    """
+    traces = [trace for trace in fig.data if trace.type == 'choropleth']
+    frame_traces = [trace for frame in fig.frames for trace in frame.data if trace.type == 'choropleth']
+    codes = set()
+    for trace in traces + frame_traces:
+        codes.update(code for code in (trace.locations if trace.locations is not None else ()) if isinstance(code, str))
+
+    shapes = geojson(codes, level)
+    for trace in traces:
+        trace.update(geojson=shapes, featureidkey='id', locationmode='geojson-id')
+    for trace in frame_traces:
+        trace.update(locationmode='geojson-id')
+    return fig
+
+
+def build_countries(source, codes_path, out_path=COUNTRIES_PATH, tolerance=SIMPLIFY_TOLERANCE):
+    """
+    Build the vendored countries file from a Natural Earth 110m admin 0 layer.
+
+    source: NE zip/shapefile, e.g.
+        https://naciscdn.org/naturalearth/110m/cultural/ne_110m_admin_0_countries.zip
+    codes_path: JSON records with `code` (ISO2) and `CCA3` (ISO3), used when
+        the source has no ISO_A2 column (geopandas' naturalearth_lowres).
+    """
+    import geopandas as gpd
+    import pandas as pd
+
+    gdf = gpd.read_file(fetch.local(source))
+    gdf = gdf.rename(columns={c: c.upper() for c in gdf.columns if c != 'geometry'})
+
+    missing = gdf['ISO_A3'].eq('-99')
+    if 'ADM0_A3' in gdf.columns:
+        gdf.loc[missing, 'ISO_A3'] = gdf.loc[missing, 'ADM0_A3']
+    gdf['ISO_A3'] = gdf['ISO_A3'].where(~gdf['ISO_A3'].eq('-99'), gdf['NAME'].map(ISO3_OVERRIDES))
+
+    if 'ISO_A2' not in gdf.columns:
+        codes = pd.read_json(fetch.local(codes_path), orient='records', encoding='utf-8')
+        codes = codes.drop_duplicates('CCA3').set_index('CCA3')['code']
+        gdf['ISO_A2'] = gdf['ISO_A3'].map(codes)
+
+    gdf = gdf[COUNTRY_COLUMNS].dropna(subset=['ISO_A3'])
+    gdf = gdf.sort_values('ISO_A3').drop_duplicates('ISO_A3').reset_index(drop=True)
+    gdf['geometry'] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+    gdf.to_parquet(out_path, index=False)
+    print(f"Saved {len(gdf)} countries to {out_path}")
+    return gdf
+
+
+def build_cities(source, out_path=CITIES_PATH):
+    """
+    Build the vendored cities file from a Natural Earth populated places layer.
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(fetch.local(source))
+    gdf = gdf.rename(columns={c: c.upper() for c in gdf.columns if c != 'geometry'})
+    gdf = gdf[['NAME', 'geometry']].rename(columns={'NAME': 'name'})
+    gdf.to_parquet(out_path, index=False)
+    print(f"Saved {len(gdf)} cities to {out_path}")
+    return gdf
+
+
+if __name__ == '__main__':
+    # python -m ddvis.geometry <countries source> <cities source> <codes json>
+    build_countries(sys.argv[1], sys.argv[3])
+    build_cities(sys.argv[2])
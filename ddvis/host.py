@@ -0,0 +1,107 @@
+"""
+Several Streamlit apps in one process.
+
+Every app normally runs in a container of its own, each with its own copy of
+pandas, geopandas, plotly and streamlit in memory. In host mode one Streamlit
+server runs host/streamlit_app.py, which executes the streamlit_app.py of the
+requested app. The apps then share the interpreter, the imported libraries
+and the ddvis caches (geometries, figures, memory-mapped artifacts).
+
+The app is picked from the X-Ddvis-App header that the nginx location of each
+app sets (deploy.py --host), so the public /<application name>/ routes stay
+the same, or from the ?app= query parameter.
+
+Each app keeps its own modules (charts.py, compile_data.py) and its compiled/
+directory: local imports are loaded under a per-app module name and artifact
+paths are resolved against the app directory, see artifacts.app_directory.
+"""
+import os
+import sys
+import glob
+import builtins
+import threading
+import importlib.util
+from ddvis import artifacts
+
+APP_HEADER = 'X-Ddvis-App'
+
+
+def discover_apps(apps_directory):
+    """
+    {application name: app directory} for the Streamlit apps in apps_directory.
+    """
+    import toml
+
+    apps = {}
+    for dir_path in sorted(glob.glob(os.path.join(apps_directory, '*/'))):
+        config_path = os.path.join(dir_path, 'config.toml')
+        if os.path.isfile(config_path) and os.path.isfile(os.path.join(dir_path, 'streamlit_app.py')):
+            name = toml.load(config_path).get('application', {}).get('name')
+            if name:
+                apps[name] = os.path.abspath(dir_path)
+    return apps
+
+
+def module_prefix(dir_path):
+    return f'ddvis_app_{os.path.basename(os.path.normpath(dir_path))}'
+
+
+_import_lock = threading.RLock()
+
+
+def load_local_module(dir_path, name):
+    """
+    dir_path/name.py imported as a module private to that app.
+    """
+    module_name = f'{module_prefix(dir_path)}.{name}'
+    with _import_lock:
+        module = sys.modules.get(module_name)
+        if module is None:
+            spec = importlib.util.spec_from_file_location(module_name, os.path.join(dir_path, f'{name}.py'))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            try:
+                with artifacts.app_directory(dir_path):
+                    spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[module_name]
+                raise
+    return module
+
+
+def local_importer(dir_path):
+    """
+    __import__ replacement that resolves top-level imports of the app's own
+    modules to the app's copies and leaves everything else to Python.
+    """
+    local_names = {os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(dir_path, '*.py'))}
+
+    def app_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and name in local_names:
+            return load_local_module(dir_path, name)
+        return builtins.__import__(name, globals, locals, fromlist, level)
+
+    return app_import
+
+
+_code = {}
+
+
+def run_app(dir_path):
+    """
+    Execute dir_path/streamlit_app.py in the current script run.
+    """
+    script_path = os.path.join(dir_path, 'streamlit_app.py')
+    code = _code.get(script_path)
+    if code is None:
+        with open(script_path, 'r') as file:
+            # compiled with its real file name so inspect, tracebacks and st.cache_data see the source
+            code = _code[script_path] = compile(file.read(), script_path, 'exec')
+    namespace = {
+        # a module name per app keeps st.cache_data keys of same-named functions apart
+        '__name__': f'{module_prefix(dir_path)}.streamlit_app',
+        '__file__': script_path,
+        '__builtins__': dict(builtins.__dict__, __import__=local_importer(dir_path)),
+    }
+    with artifacts.app_directory(dir_path):
+        exec(code, namespace)
@@ -0,0 +1,101 @@
+"""
+Import-time profile of an app's cold start.
+
+Runs the app once in a fresh interpreter under `python -X importtime` and
+reports what its first run imports: the total import time, the slowest
+top-level imports and the wall time of the first run (first paint).
+Streamlit apps are run with streamlit.testing, Dash apps (app.py) are
+imported. Imports made before the app starts, by the test harness, are
+not counted.
+
+    python -m ddvis.importtime [app directory] [--json]
+
+deploy.py runs it inside every freshly built image and records the result.
+"""
+import os
+import re
+import sys
+import json
+import subprocess
+
+MARKER = 'ddvis-importtime-start'
+
+STREAMLIT_RUN = f"""
+import sys, time
+from streamlit.testing.v1 import AppTest
+sys.stderr.write('{MARKER}\\n'); sys.stderr.flush()
+start = time.perf_counter()
+at = AppTest.from_file('streamlit_app.py', default_timeout=300).run()
+sys.stderr.write(f'{MARKER} %f %d\\n' % (time.perf_counter() - start, len(at.exception)))
+"""
+
+DASH_RUN = f"""
+import sys, time
+sys.path.insert(0, '.')
+sys.stderr.write('{MARKER}\\n'); sys.stderr.flush()
+start = time.perf_counter()
+import app
+sys.stderr.write(f'{MARKER} %f 0\\n' % (time.perf_counter() - start))
+"""
+
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def parse(stderr):
+    """
+    (module, self seconds, cumulative seconds, depth) per import made after
+    the start marker, plus the first run seconds and exception count.
+    """
+    entries = []
+    started = False
+    first_run_seconds, exceptions = None, 0
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            fields = line.split()
+            if len(fields) == 3:
+                first_run_seconds, exceptions = float(fields[1]), int(fields[2])
+            started = True
+            continue
+        match = LINE.match(line)
+        if started and match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+    return entries, first_run_seconds, exceptions
+
+
+def profile(app_directory='.', top=10):
+    app_directory = os.path.abspath(app_directory)
+    code = STREAMLIT_RUN if os.path.isfile(os.path.join(app_directory, 'streamlit_app.py')) else DASH_RUN
+    # the shared package sits next to the app in images, one level up from apps/ in the repository
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=app_directory, env=env,
+                            capture_output=True, text=True)
+    entries, first_run_seconds, exceptions = parse(result.stderr)
+    if first_run_seconds is None:
+        raise RuntimeError(f"App in {app_directory} did not start:\n{result.stderr[-2000:]}")
+
+    top_level = sorted((entry for entry in entries if entry[3] == 0), key=lambda entry: -entry[2])
+    return {
+        'import_seconds': round(sum(entry[2] for entry in top_level), 4),
+        'first_run_seconds': round(first_run_seconds, 4),
+        'modules': len(entries),
+        'exceptions': exceptions,
+        'top': [[name, round(cumulative, 4)] for name, _, cumulative, _ in top_level[:top]],
+    }
+
+
+def print_report(report):
+    print(f"imports {report['import_seconds'] * 1000:.0f} ms ({report['modules']} modules), "
+          f"first run {report['first_run_seconds'] * 1000:.0f} ms")
+    for name, seconds in report['top']:
+        print(f"    {seconds * 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    arguments = [argument for argument in sys.argv[1:] if argument != '--json']
+    report = profile(arguments[0] if arguments else '.')
+    if '--json' in sys.argv:
+        print(json.dumps(report))
+    else:
+        print_report(report)
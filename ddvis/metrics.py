@@ -0,0 +1,439 @@
+"""
+Runtime metrics of the apps, in the Prometheus text format.
+
+Every app records the time of its stages and the hits of its caches here:
+
+    stage   data       artifacts read by artifacts.shared, loaders decorated
+                       with metrics.timed('data')
+            figure     Plotly figures built and encoded on a figure cache miss
+            png        Matplotlib maps drawn and rasterized on a PNG cache miss
+            tab        a tab rendered by ddvis.tabs.render_tabs
+            callback   a Dash callback decorated with metrics.timed
+
+    cache   artifact, figure and png lookups, hits and misses per name
+
+with the active Streamlit sessions and the resident memory of the process.
+Streamlit apps serve them on a side port (serve()), study_location on the
+/<application name>/metrics route of its Flask server. deploy.py proxies
+both at /<application name>/metrics, for local addresses only.
+
+serve() is called by the app script, so the side port opens with the first
+session of the process; the container health check does not start one.
+
+Processes of one server (the gunicorn workers of study_location) add up
+their samples through METRICS_MULTIPROCESS_DIR: each one writes its own
+to <pid>.json there, at most every FLUSH_SECONDS, and exposition() returns
+the sum over all of them, whichever worker answers the scrape. Counters of
+exited workers are kept (mark_process_dead), gauges are those of the live
+processes.
+
+Example:
+    @metrics.timed('data')
+    def get_data():
+        return artifacts.read('study_locations')
+
+    metrics.serve()
+
+    with metrics.timer('data', 'get_data'):
+        ...
+
+    curl http://localhost:9464/metrics
+
+Samples carry the app they were recorded for: BASE_URL_PATH, as deploy.py
+names the container, or the app host mode runs in this thread, see app().
+
+Settings (environment):
+    METRICS_PORT                port of the side server of Streamlit apps, unset = not served
+    METRICS_MULTIPROCESS_DIR    directory shared by the worker processes, unset = one process
+"""
+import os
+import json
+import time
+import bisect
+import atexit
+import functools
+import threading
+from contextlib import contextmanager
+
+PORT = os.environ.get('METRICS_PORT')
+# see multiprocess()
+MULTIPROCESS_DIR = None
+# seconds a worker's samples may be late in the shared directory
+FLUSH_SECONDS = 1.0
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# seconds, from a cached rerun to a cold figure build
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+# {(app, stage, name): [count per bucket, then +Inf], sum}
+_stages = {}
+# {(app, cache, name): [lookups, misses]}
+_caches = {}
+# name: (type, help, function returning {labels: value}), sampled at each scrape
+_gauges = {}
+
+# app host mode runs in the current thread
+_app = threading.local()
+
+
+@contextmanager
+def app(name):
+    """
+    Record the samples of this thread for app `name`, see ddvis/host.py.
+    """
+    previous = getattr(_app, 'name', None)
+    _app.name = name
+    try:
+        yield
+    finally:
+        _app.name = previous
+
+
+def app_name():
+    return getattr(_app, 'name', None) or os.environ.get('BASE_URL_PATH') or os.path.basename(os.getcwd())
+
+
+def observe(stage, name, seconds):
+    key = (app_name(), stage, name)
+    with _lock:
+        buckets, total = _stages.get(key) or ([0] * (len(BUCKETS) + 1), 0.0)
+        buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        _stages[key] = buckets, total + seconds
+    _changed()
+
+
+@contextmanager
+def timer(stage, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, name, time.perf_counter() - start)
+
+
+def timed(stage, name=None):
+    """
+    Decorator recording the time of each call as `stage`, under the
+    function's name by default.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage, name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(cache, name, hit):
+    key = (app_name(), cache, name)
+    with _lock:
+        counts = _caches.setdefault(key, [0, 0])
+        counts[0] += 1
+        counts[1] += not hit
+    _changed()
+
+
+def gauge(name, help, function, type='gauge'):
+    """
+    Register a metric sampled at each scrape: function() -> {labels dict items tuple: value}.
+    """
+    _gauges[name] = (type, help, function)
+
+
+def resident_memory():
+    """
+    Resident set size of this process in bytes, None where /proc is missing.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def active_sessions():
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return None
+    return Runtime.instance()._session_mgr.num_active_sessions()
+
+
+def _labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}' if labels else ''
+
+
+def _local():
+    """
+    Samples of this process: (stages, caches, {metric: (type, help, {labels: value})}).
+    """
+    with _lock:
+        stages = {key: (list(buckets), total) for key, (buckets, total) in _stages.items()}
+        caches = {key: list(counts) for key, counts in _caches.items()}
+    samples = dict(_gauges)
+    samples.setdefault('process_resident_memory_bytes',
+                       ('gauge', 'Resident memory size in bytes.', lambda: {(): resident_memory()}))
+    gauges = {metric: (type, help, {tuple(labels): value for labels, value in function().items() if value is not None})
+              for metric, (type, help, function) in samples.items()}
+    return stages, caches, gauges
+
+
+def _dump(stages, caches, gauges):
+    return {'stages': [[*key, buckets, total] for key, (buckets, total) in stages.items()],
+            'caches': [[*key, *counts] for key, counts in caches.items()],
+            'gauges': [[metric, type, help, [[[list(pair) for pair in labels], value] for labels, value in values.items()]]
+                       for metric, (type, help, values) in gauges.items()]}
+
+
+def _add(state, snapshot, live=True):
+    """
+    Add a _dump()ed snapshot to state; the gauges of processes no longer `live` are left out.
+    """
+    stages, caches, gauges = state
+    for *key, buckets, total in snapshot['stages']:
+        before, before_total = stages.get(tuple(key)) or ([0] * len(buckets), 0.0)
+        stages[tuple(key)] = [a + b for a, b in zip(before, buckets)], before_total + total
+    for *key, lookups, misses in snapshot['caches']:
+        before = caches.get(tuple(key), [0, 0])
+        caches[tuple(key)] = [before[0] + lookups, before[1] + misses]
+    for metric, type, help, values in snapshot['gauges']:
+        if type != 'counter' and not live:
+            continue
+        _, _, merged = gauges.setdefault(metric, (type, help, {}))
+        for labels, value in values:
+            labels = tuple(tuple(pair) for pair in labels)
+            merged[labels] = merged.get(labels, 0) + value
+    return state
+
+
+def _path(pid, directory=None):
+    return os.path.join(directory or MULTIPROCESS_DIR, f'{pid}.json')
+
+
+def _write(path, snapshot):
+    # the flusher thread and a scrape can write the same file at once
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(snapshot, file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _directory_lock(exclusive=False, directory=None):
+    import fcntl
+
+    with open(os.path.join(directory or MULTIPROCESS_DIR, '.lock'), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # a worker that has not written yet
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush():
+    """
+    Write the samples of this process to MULTIPROCESS_DIR.
+    """
+    global _dirty
+    if not MULTIPROCESS_DIR:
+        return
+    # one flush at a time, an older snapshot never replaces a newer one
+    with _flush_lock:
+        _dirty = False
+        _write(_path(os.getpid()), _dump(*_local()))
+
+
+# samples changed since the last flush, and the process writing them
+_dirty = False
+_flusher_pid = None
+_flush_lock = threading.Lock()
+
+
+def _flush_changes():
+    global _dirty
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        if not _dirty:
+            continue
+        try:
+            flush()
+        except Exception as error:
+            # the thread is started once per process, it keeps running and tries again
+            _dirty = True
+            print(f"Could not write the metrics of process {os.getpid()}: {error!r}")
+
+
+def _changed():
+    global _dirty, _flusher_pid
+    if not MULTIPROCESS_DIR:
+        return
+    _dirty = True
+    if _flusher_pid != os.getpid():
+        # threads do not survive a fork, each worker starts its own
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_changes, name='ddvis-metrics-flush', daemon=True).start()
+        atexit.register(flush)
+
+
+def _forked():
+    global _lock, _flush_lock, _dirty, _flusher_pid
+    # the parent's samples stay in its own file, the child starts from zero
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _stages.clear()
+    _caches.clear()
+    _dirty = False
+    _flusher_pid = None
+
+
+def multiprocess(directory):
+    """
+    Add up the samples of this process and of the processes forked from it
+    (gunicorn workers) in `directory`.
+    """
+    global MULTIPROCESS_DIR
+    os.makedirs(directory, exist_ok=True)
+    if MULTIPROCESS_DIR is None:
+        os.register_at_fork(before=flush, after_in_child=_forked)
+    MULTIPROCESS_DIR = directory
+
+
+if os.environ.get('METRICS_MULTIPROCESS_DIR'):
+    multiprocess(os.environ['METRICS_MULTIPROCESS_DIR'])
+
+
+def mark_process_dead(pid, directory=None):
+    """
+    Move the counters of the exited process `pid` into the directory's
+    archive, so they keep adding up; its gauges are dropped. Call it from
+    gunicorn's child_exit hook.
+    """
+    directory = directory or MULTIPROCESS_DIR
+    if not directory:
+        return
+    with _directory_lock(exclusive=True, directory=directory):
+        snapshot = _read(_path(pid, directory))
+        if snapshot is None:
+            return
+        archive_path = os.path.join(directory, 'archive.json')
+        state = _add(({}, {}, {}), _read(archive_path) or _dump({}, {}, {}))
+        _write(archive_path, _dump(*_add(state, snapshot, live=False)))
+        os.remove(_path(pid, directory))
+
+
+def _collect():
+    """
+    Samples of this process, or of every process of MULTIPROCESS_DIR.
+    """
+    if not MULTIPROCESS_DIR:
+        return _local()
+    flush()
+    state = ({}, {}, {})
+    with _directory_lock():
+        for file_name in sorted(os.listdir(MULTIPROCESS_DIR)):
+            if not file_name.endswith('.json'):
+                continue
+            snapshot = _read(os.path.join(MULTIPROCESS_DIR, file_name))
+            if snapshot is None:
+                continue
+            pid = file_name[:-len('.json')]
+            _add(state, snapshot, live=pid.isdigit() and _alive(int(pid)))
+    return state
+
+
+def exposition(**extra_labels):
+    """
+    Every metric in the Prometheus text format, `extra_labels` added to each sample.
+    """
+    stages, caches, gauges = _collect()
+
+    lines = ['# HELP ddvis_stage_seconds Time spent in a stage of the app.',
+             '# TYPE ddvis_stage_seconds histogram']
+    for (app_label, stage, name), (buckets, total) in sorted(stages.items()):
+        labels = dict(extra_labels, app=app_label, stage=stage, name=name)
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+            cumulative += bucket
+            lines.append(f'ddvis_stage_seconds_bucket{_labels(dict(labels, le=str(bound)))} {cumulative}')
+        lines.append(f'ddvis_stage_seconds_sum{_labels(labels)} {total:.6f}')
+        lines.append(f'ddvis_stage_seconds_count{_labels(labels)} {cumulative}')
+
+    for metric, help, hits in (('ddvis_cache_hits_total', 'Cache lookups answered from the cache.', True),
+                               ('ddvis_cache_misses_total', 'Cache lookups that computed the value.', False)):
+        lines += [f'# HELP {metric} {help}', f'# TYPE {metric} counter']
+        for (app_label, cache, name), (lookups, misses) in sorted(caches.items()):
+            value = lookups - misses if hits else misses
+            lines.append(f'{metric}{_labels(dict(extra_labels, app=app_label, cache=cache, name=name))} {value}')
+
+    for metric, (type, help, values) in sorted(gauges.items()):
+        lines += [f'# HELP {metric} {help}', f'# TYPE {metric} {type}']
+        for labels, value in sorted(values.items()):
+            lines.append(f'{metric}{_labels(dict(extra_labels, **dict(labels)))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+_server = None
+
+
+def serve(port=PORT):
+    """
+    Serve exposition() at /metrics on `port` from a daemon thread, once per
+    process. Streamlit runs the app script on every rerun, later calls do
+    nothing.
+    """
+    global _server
+    if not port:
+        return None
+    with _lock:
+        if _server is not None:
+            return _server
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # one request per scrape interval, not worth a log line
+                pass
+
+        gauge('ddvis_active_sessions', 'Streamlit sessions connected to this process.',
+              lambda: {(): active_sessions()})
+        try:
+            _server = ThreadingHTTPServer(('0.0.0.0', int(port)), Handler)
+        except OSError as error:
+            # another app of this machine serves on the port, run without metrics
+            print(f"Metrics not served on port {port}: {error}")
+            _server = False
+            return None
+        threading.Thread(target=_server.serve_forever, name='ddvis-metrics', daemon=True).start()
+    return _server
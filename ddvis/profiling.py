@@ -0,0 +1,229 @@
+"""
+On-demand profiles of single Streamlit reruns and Dash callbacks.
+
+A profiled run is sampled from a thread of its own: every PROFILE_INTERVAL
+the stack of the running script or callback is recorded, from the app's
+own frame down. The samples are written as a speedscope profile (open it
+in https://www.speedscope.app or `npx speedscope <file>`, the left heavy
+view is the flame graph) to PROFILE_DIR, where only the PROFILE_KEEP most
+recent ones are kept.
+
+Nothing is profiled unless PROFILE_TOKEN or PROFILE_RATE is set; then a run
+is profiled when the page was opened with ?profile=<PROFILE_TOKEN>, or
+with probability PROFILE_RATE. The parameter is removed from the page
+once its rerun is profiled, so one request profiles one rerun. A Dash
+callback is profiled when its own request has the parameter or an
+X-Profile: <PROFILE_TOKEN> header, not the other callbacks of the page, so
+again one request gives one profile. With both unset profile_rerun
+returns at once and profiled returns the callback undecorated.
+
+Example:
+    # streamlit_app.py, at the top of the script
+    profiling.profile_rerun()
+
+    # Dash
+    @app.callback(...)
+    @profiling.profiled
+    def update_table(...):
+
+    https://example.org/life-expectancy-app/?profile=<token>
+    curl -H 'X-Profile: <token>' -d @callback.json https://example.org/study-location-app/_dash-update-component
+
+Settings (environment):
+    PROFILE_TOKEN        secret of the ?profile= parameter, unset = parameter ignored
+    PROFILE_RATE         fraction of runs profiled without the parameter, default 0
+    PROFILE_DIR          where profiles are written, default <tmp>/ddvis-profiles
+    PROFILE_KEEP         number of profiles kept, default 20
+    PROFILE_INTERVAL     seconds between samples, default 0.005
+    PROFILE_MAX_SECONDS  a run is sampled for at most this long, default 120
+"""
+import os
+import re
+import sys
+import glob
+import hmac
+import json
+import time
+import random
+import tempfile
+import functools
+import threading
+from ddvis import metrics
+
+TOKEN = os.environ.get('PROFILE_TOKEN')
+RATE = float(os.environ.get('PROFILE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ddvis-profiles'))
+KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 120))
+ENABLED = bool(TOKEN) or RATE > 0
+
+QUERY_PARAMETER = 'profile'
+HEADER = 'X-Profile'
+
+
+def authorized(value):
+    return bool(TOKEN and value) and hmac.compare_digest(str(value).encode('utf-8'), TOKEN.encode('utf-8'))
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the stack of thread `thread_id` below `root` (the frame of the
+    profiled script or callback) until stop(), or, with follow=True, until
+    `root` returns.
+    """
+
+    def __init__(self, name, root, thread_id, follow=False):
+        super().__init__(name='ddvis-profiler', daemon=True)
+        self.profile_name = name
+        self.root = root
+        self.thread_id = thread_id
+        self.follow = follow
+        self.frames = []
+        self.samples = []
+        self.weights = []
+        self.path = None
+        self._index = {}
+        self._stopped = threading.Event()
+
+    def stack(self, frame):
+        """
+        Frame indices from root to `frame`, None once root is not on the stack.
+        """
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            if frame is self.root:
+                break
+            frame = frame.f_back
+        else:
+            return None
+        stack = []
+        for code in reversed(codes):
+            index = self._index.get(code)
+            if index is None:
+                index = self._index[code] = len(self.frames)
+                self.frames.append({'name': getattr(code, 'co_qualname', code.co_name),
+                                    'file': code.co_filename, 'line': code.co_firstlineno})
+            stack.append(index)
+        return stack
+
+    def run(self):
+        start = last = time.perf_counter()
+        while not self._stopped.wait(INTERVAL):
+            stack = self.stack(sys._current_frames().get(self.thread_id))
+            now = time.perf_counter()
+            if stack is None and self.follow:
+                break
+            if stack is not None:
+                self.samples.append(stack)
+                self.weights.append(now - last)
+            last = now
+            if now - start > MAX_SECONDS:
+                break
+        # the frames are not needed anymore, do not keep the run's locals alive
+        self.root = None
+        if self.samples:
+            self.path = write(self.profile_name, self.frames, self.samples, self.weights)
+            print(f"Profile of {self.profile_name}: {sum(self.weights) * 1000:.0f} ms sampled, written to {self.path}")
+        else:
+            print(f"Profile of {self.profile_name}: no sample, the run was shorter than {INTERVAL * 1000:.0f} ms")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def speedscope(name, frames, samples, weights):
+    """
+    Profile dict in the speedscope file format, one sampled profile in seconds.
+    """
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'ddvis.profiling',
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{'type': 'sampled', 'name': name, 'unit': 'seconds', 'startValue': 0,
+                      'endValue': sum(weights), 'samples': samples, 'weights': weights}],
+    }
+
+
+def prune(profile_dir=PROFILE_DIR, keep=KEEP):
+    """
+    Delete all but the `keep` most recent profiles of profile_dir.
+    """
+    paths = sorted(glob.glob(os.path.join(profile_dir, '*.speedscope.json')), key=os.path.getmtime)
+    for path in paths[:max(len(paths) - keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            # removed by another process of the same container
+            pass
+
+
+def write(name, frames, samples, weights, profile_dir=PROFILE_DIR):
+    os.makedirs(profile_dir, exist_ok=True)
+    slug = re.sub(r'[^\w.-]+', '-', name).strip('-')
+    now = time.time()
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+    path = os.path.join(profile_dir, f"{stamp}-{os.getpid()}-{slug}.speedscope.json")
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(speedscope(name, frames, samples, weights), file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    prune(profile_dir)
+    return path
+
+
+def _rerun_requested():
+    import streamlit as st
+
+    if RATE and random.random() < RATE:
+        return True
+    if TOKEN and authorized(st.query_params.get(QUERY_PARAMETER)):
+        # one rerun per request, the next ones of the session are not profiled
+        del st.query_params[QUERY_PARAMETER]
+        return True
+    return False
+
+
+def profile_rerun(name=None):
+    """
+    Profile the rest of the calling script's run if it was requested, see
+    the module docstring. Call it at the top of streamlit_app.py.
+    """
+    if not ENABLED or not _rerun_requested():
+        return None
+    sampler = Sampler(name or metrics.app_name(), sys._getframe(1), threading.get_ident(), follow=True)
+    sampler.start()
+    return sampler
+
+
+def _callback_requested():
+    from flask import request
+
+    if RATE and random.random() < RATE:
+        return True
+    # the callback's own request only, the page's URL would profile every callback it fires
+    return authorized(request.args.get(QUERY_PARAMETER)) or authorized(request.headers.get(HEADER))
+
+
+def profiled(function):
+    """
+    Decorator profiling a Dash callback when it was requested.
+    """
+    if not ENABLED:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _callback_requested():
+            return function(*args, **kwargs)
+        sampler = Sampler(f'{metrics.app_name()} {function.__name__}', sys._getframe(), threading.get_ident())
+        sampler.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sampler.stop()
+
+    return wrapper
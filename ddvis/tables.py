@@ -0,0 +1,181 @@
+"""
+Server-side paging, filtering and sorting of a table.
+
+TableQuery keeps one numpy array per column of a (compiled) DataFrame plus
+sort ranks computed once, so a request only touches the rows that pass the
+filter and only the requested page is materialized. The filter syntax is
+the filter_query of Dash DataTable with filter_action="custom":
+
+    {number} > 3 && {country} contains "United"
+
+Example:
+    table = TableQuery(artifacts.read('study_table'))
+    records, page_count = table.page(filter_query, sort_by, page_current, page_size)
+"""
+import math
+import numpy as np
+import pandas as pd
+
+OPERATORS = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+
+
+def split_filter_part(filter_part):
+    """
+    (column, operator, value) of one '&&'-separated part of a filter query,
+    operator being the word form ('ge', 'eq', 'contains', ...).
+    """
+    # operators are looked for after the column name only, values may contain them
+    name_end = filter_part.find('}') + 1
+    name = filter_part[filter_part.find('{') + 1: name_end - 1]
+    expression = ' ' + filter_part[name_end:].lstrip()
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if expression.startswith(' ' + operator):
+                value_part = expression[len(operator) + 1:].strip()
+                if not name or not value_part:
+                    return None, None, None
+                first = value_part[0]
+                if first == value_part[-1] and first in ("'", '"', '`') and len(value_part) > 1:
+                    value = value_part[1: -1].replace('\\' + first, first)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string, not here
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def as_text(value):
+    """
+    A filter value matched against text: numbers as written, 31 and not 31.0.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class TableQuery:
+    """
+    Columnar, read-only copy of a DataFrame answering page requests.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self.columns = list(self.frame.columns)
+        self.size = len(self.frame)
+        self._cells = {}
+        self._values = {}
+        self._text = {}
+        self._missing = {}
+        self._rank = {}
+        self._orders = {}
+        for column in self.columns:
+            series = self.frame[column]
+            if pd.api.types.is_float_dtype(series) and series.dtype.itemsize < 8:
+                # compact float32 columns compare and read as displayed: 3.4, not 3.4000000953674316
+                series = pd.Series(series.to_numpy(dtype=f'float{series.dtype.itemsize * 8}', na_value=np.nan)
+                                   .astype(str).astype(float), name=column)
+            self._missing[column] = series.isna().to_numpy()
+            # row values for the returned pages, taking rows from Arrow-backed columns is slow
+            self._cells[column] = series.to_numpy(dtype=object, na_value=None)
+            if pd.api.types.is_numeric_dtype(series):
+                self._values[column] = series.to_numpy(dtype=float, na_value=np.nan)
+            # text of every column, for contains and string comparisons
+            self._text[column] = series.astype(object).where(~series.isna(), '').astype(str).to_numpy(dtype=str)
+            # dense rank of each value, missing values rank last
+            _, rank = np.unique(self._values.get(column, self._text[column]), return_inverse=True)
+            self._rank[column] = np.where(self._missing[column], rank.max(initial=0) + 1, rank)
+
+    def mask(self, filter_query):
+        """
+        Boolean array of the rows matching filter_query, None when nothing is filtered.
+        """
+        mask = None
+        for filter_part in (filter_query or '').split(' && '):
+            column, operator, value = split_filter_part(filter_part)
+            if column not in self._text:
+                continue
+            part = self._match(column, operator, value)
+            mask = part if mask is None else mask & part
+        return mask
+
+    def _match(self, column, operator, value):
+        missing = self._missing[column]
+        if operator == 'contains':
+            return (np.char.find(self._text[column], as_text(value)) >= 0) & ~missing
+        if operator == 'datestartswith':
+            return np.char.startswith(self._text[column], as_text(value)) & ~missing
+
+        if column in self._values and isinstance(value, float):
+            values = self._values[column]
+        else:
+            values, value = self._text[column], as_text(value)
+        with np.errstate(invalid='ignore'):
+            if operator == 'eq':
+                return (values == value) & ~missing
+            if operator == 'ne':
+                return (values != value) | missing
+            if operator == 'lt':
+                return (values < value) & ~missing
+            if operator == 'le':
+                return (values <= value) & ~missing
+            if operator == 'gt':
+                return (values > value) & ~missing
+            return (values >= value) & ~missing
+
+    def order(self, rows, sort_by):
+        """
+        rows sorted by the DataTable sort_by list, missing values last.
+        """
+        keys = []
+        # np.lexsort sorts by the last key first
+        for sort in reversed(sort_by or []):
+            rank = self._rank.get(sort['column_id'])
+            if rank is None:
+                continue
+            rank = rank[rows]
+            if sort.get('direction') == 'desc':
+                # missing values have the highest rank, keep them at the end
+                rank = np.where(self._missing[sort['column_id']][rows], rank.max(initial=0) + 1, -rank)
+            keys.append(rank)
+        if not keys:
+            return rows
+        return rows[np.lexsort(keys)]
+
+    def rows(self, filter_query='', sort_by=()):
+        """
+        Positions of the rows matching filter_query, in sort_by order.
+        """
+        mask = self.mask(filter_query)
+        sort_by = [sort for sort in sort_by or [] if sort['column_id'] in self._rank]
+        if mask is None and len(sort_by) <= 1:
+            # unfiltered single-column orders are kept, a page is then a slice
+            key = tuple((sort['column_id'], sort.get('direction')) for sort in sort_by)
+            rows = self._orders.get(key)
+            if rows is None:
+                rows = self._orders[key] = self.order(np.arange(self.size), sort_by)
+            return rows
+        return self.order(np.arange(self.size) if mask is None else np.flatnonzero(mask), sort_by)
+
+    def page(self, filter_query='', sort_by=(), page_current=0, page_size=10):
+        """
+        (records of the requested page, number of pages).
+        """
+        rows = self.rows(filter_query, sort_by)
+        page_count = max(1, math.ceil(len(rows) / page_size))
+        start = page_current * page_size
+        page_rows = rows[start: start + page_size]
+        cells = [self._cells[column][page_rows] for column in self.columns]
+        records = [dict(zip(self.columns, values)) for values in zip(*cells)]
+        return records, page_count
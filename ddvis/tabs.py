@@ -0,0 +1,74 @@
+"""
+Lazy Streamlit tabs.
+
+st.tabs runs the body of every tab on each rerun although only one is
+visible. render_tabs takes one function per tab and, with Streamlit's
+rerun-on-change tabs, only calls the function of the selected tab. Render
+times are recorded as the `tab` stage of ddvis/metrics.py and kept per
+process, so the time skipped for hidden tabs can be reported.
+
+Example:
+    def map_tab():
+        st.plotly_chart(...)
+
+    render_tabs({'**Map**': map_tab, '**Data**': data_tab})
+"""
+import time
+import threading
+import streamlit as st
+from ddvis import metrics
+
+
+class TabTimings:
+    """
+    Render time statistics per tab label, shared by all sessions of the process.
+    """
+
+    def __init__(self):
+        self.count = {}
+        self.total = {}
+        self.skipped = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds):
+        with self._lock:
+            self.count[label] = self.count.get(label, 0) + 1
+            self.total[label] = self.total.get(label, 0.0) + seconds
+
+    def mean(self, label):
+        with self._lock:
+            if not self.count.get(label):
+                return 0.0
+            return self.total[label] / self.count[label]
+
+    def skip(self, labels):
+        """
+        Estimated time saved by not rendering `labels`, from their mean render times.
+        """
+        saved = sum(self.mean(label) for label in labels)
+        with self._lock:
+            self.skipped += saved
+        return saved
+
+
+tab_timings = TabTimings()
+metrics.gauge('ddvis_tabs_skipped_seconds_total', 'Estimated render time saved by not rendering hidden tabs.',
+              lambda: {(): round(tab_timings.skipped, 6)}, type='counter')
+
+
+def render_tabs(pages, key='tabs'):
+    """
+    pages: {label: render function}. Only the selected tab's function runs.
+    """
+    labels = list(pages)
+    tabs = st.tabs(labels, key=key, on_change='rerun')
+    for tab, label in zip(tabs, labels):
+        with tab:
+            if not tab.open:
+                continue
+            start = time.perf_counter()
+            pages[label]()
+            elapsed = time.perf_counter() - start
+            tab_timings.record(label, elapsed)
+            tab_timings.skip([other for other in labels if other != label])
+            metrics.observe('tab', label.strip('*'), elapsed)
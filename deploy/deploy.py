@@ -1,9 +1,43 @@
 import os
+import re
 import glob
+import json
+import time
 import toml
+import hashlib
+import shutil
+import argparse
+import tempfile
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
+shared_package_path = os.path.abspath(os.path.join(script_dir, '../ddvis'))
+host_path = os.path.abspath(os.path.join(script_dir, '../host'))
+host_port = 8500
+# containers publish their metrics side port (ddvis/metrics.py) on 127.0.0.1 at their port + 1000
+metrics_port_offset = 1000
+# addresses allowed to scrape /<application name>/metrics through nginx
+metrics_allow = os.environ.get('METRICS_ALLOW', '127.0.0.1').split()
+nginx_snippets_path = '/etc/nginx/snippets/ddivs.config'
+# brotli needs the ngx_brotli module, gzip is always on
+nginx_brotli = os.environ.get('NGINX_BROTLI') == '1'
+compressed_types = 'application/json application/javascript text/css text/plain image/svg+xml'
+base_dockerfile_path = os.path.join(script_dir, 'Dockerfile_base')
+base_image_name = 'ddvis-base'
+# content hashes of what is currently deployed, kept on the deploy host
+deploy_manifest_path = os.environ.get('DEPLOY_MANIFEST', os.path.join(script_dir, 'deployed.json'))
+
+# generated or staged by the deploy itself, not part of an app's content
+IGNORED_NAMES = {'compiled', 'ddvis', 'docker-compose.yml', '__pycache__', '.ipynb_checkpoints'}
+
+
+def run_command(args, cwd=None, env=None):
+    """
+    Run a command and capture its output. Every docker and nginx call goes
+    through a runner with this signature, so tests can pass a fake one.
+    """
+    return subprocess.run(args, cwd=cwd, env=env, capture_output=True, text=True)
 
 
 def load_config(config_path):
@@ -21,25 +55,384 @@ def load_config(config_path):
         return None
 
 
-def set_env_and_run_docker(config, dir_path, external_port):
-    application_config = config.get('application', {})
-    application_name = application_config.get('name', '')
-    os.environ["APP_PATH"] = dir_path
-    os.environ["BASE_URL_PATH"] = application_name
-    os.environ["CONTAINER_NAME"] = f'strealmit-{application_name}'
-    os.environ["EXTERNAL_PORT"] = str(external_port)
+def find_applications(apps_directory):
+    """
+    One entry per app directory with a config.toml. Ports are assigned in
+    directory order starting at 8501.
+    """
+    applications = []
+    external_port = 8501
+    for dir_path in sorted(glob.glob(os.path.join(apps_directory, '*/'))):
+        print(f"Checking {dir_path}")
+        config_path = os.path.join(dir_path, 'config.toml')
+        if os.path.isfile(config_path):
+            config = load_config(config_path)
+            if config:
+                applications.append({
+                    'name': config.get('application', {}).get('name', ''),
+                    'dir_path': dir_path,
+                    'config': config,
+                    'external_port': external_port,
+                })
+        else:
+            print(f"No config file found in {dir_path}")
 
-    docker_compose_path = os.path.abspath(os.path.join(script_dir, 'docker-compose-template.yml'))
-    print(f"Dir path: {dir_path}")
-    print(f"Base URL Path: {application_name}")
-    print(f"Container Name: {os.environ['CONTAINER_NAME']}")
-    print(f"External Port: {os.environ['EXTERNAL_PORT']}")
-    print(f"Docker Compose Path: {docker_compose_path}")
+        external_port += 1
+    return applications
+
+
+def is_streamlit_application(application):
+    return os.path.isfile(os.path.join(application['dir_path'], 'streamlit_app.py'))
+
+
+def host_application(applications):
+    """
+    Host mode: one container serving every Streamlit app, see ddvis/host.py.
+    Its content is the host directory and all hosted apps.
+    """
+    hosted = [application for application in applications if is_streamlit_application(application)]
+    return {
+        'name': 'host',
+        'dir_path': host_path + '/',
+        'config': {},
+        'external_port': host_port,
+        'host': True,
+        'hosted': hosted,
+        'sources': [(host_path, 'host/')] + [(application['dir_path'], f"apps/{os.path.basename(os.path.normpath(application['dir_path']))}/")
+                                             for application in hosted],
+    }
 
-    print(f"Running docker-compose up -d for {dir_path}")
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def tree_hashes(root, prefix=''):
+    """
+    {relative path: sha256} of every file under root, skipping IGNORED_NAMES.
+    """
+    hashes = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names if name not in IGNORED_NAMES)
+        for file_name in sorted(file_names):
+            if file_name in IGNORED_NAMES or file_name.endswith('.pyc'):
+                continue
+            path = os.path.join(dir_path, file_name)
+            hashes[prefix + os.path.relpath(path, root)] = file_hash(path)
+    return hashes
+
+
+def application_hashes(application):
+    """
+    Content of an app image: source, Dockerfile, requirements.txt, config.toml
+    and data files of the app directory plus the shared package and compose
+    template copied into it, and Dockerfile_base of the image it is built on.
+    """
+    hashes = {}
+    for root, prefix in application.get('sources', [(application['dir_path'], '')]):
+        hashes.update(tree_hashes(root, prefix))
+    hashes.update(tree_hashes(shared_package_path, prefix='ddvis/'))
+    hashes['Dockerfile_base'] = file_hash(base_dockerfile_path)
+    if not application.get('host'):
+        hashes['docker-compose.yml'] = file_hash(os.path.join(script_dir, 'docker-compose-template.yml'))
+    return hashes
+
+
+def content_hash(hashes):
+    payload = json.dumps(hashes, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_deploy_manifest(manifest_path=deploy_manifest_path):
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as file:
+        return json.load(file)
+
+
+def save_deploy_manifest(manifest, manifest_path=deploy_manifest_path):
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def plan_deploy(applications, manifest, force=False):
+    """
+    Mark each app 'new', 'changed', 'moved' (other port) or 'unchanged'
+    against the manifest of the last deploy. Only apps not 'unchanged' are
+    rebuilt.
+    """
+    for application in applications:
+        application['files'] = application_hashes(application)
+        application['hash'] = content_hash(application['files'])
+        deployed = manifest.get(application['name'])
+        if deployed is None:
+            application['plan'], application['changed_files'] = 'new', sorted(application['files'])
+            continue
+        application['changed_files'] = sorted(
+            path for path in set(application['files']) | set(deployed['files'])
+            if application['files'].get(path) != deployed['files'].get(path))
+        if application['hash'] != deployed['hash']:
+            application['plan'] = 'changed'
+        elif application['external_port'] != deployed['external_port']:
+            application['plan'] = 'moved'
+        else:
+            application['plan'] = 'forced' if force else 'unchanged'
+    return applications
+
+
+def removed_applications(applications, manifest):
+    """
+    Deployed apps no longer in the tree, e.g. renamed in their config.toml.
+    Their containers are removed: they hold the ports of the apps after them.
+    """
+    names = {application['name'] for application in applications}
+    return [dict(entry, name=name) for name, entry in manifest.items() if name not in names]
+
+
+def print_plan(applications):
+    for application in applications:
+        print(f"{application['name']:40} {application['plan']}")
+        if application['plan'] == 'changed':
+            for path in application['changed_files']:
+                print(f"    {path}")
+
+
+def requirement_name(line):
+    return re.split(r'[<>=!~;\[ ]', line, maxsplit=1)[0].strip().lower()
+
+
+def union_requirements(applications):
+    """
+    One requirement line per package over all apps' requirements.txt,
+    version specifiers of the same package are combined.
+    """
+    specifiers = {}
+    for application in applications:
+        with open(os.path.join(application['dir_path'], 'requirements.txt'), 'r') as file:
+            for line in file:
+                line = line.split('#')[0].strip()
+                if not line:
+                    continue
+                name = requirement_name(line)
+                specifier = line[len(name):].strip()
+                specifiers.setdefault(name, set())
+                if specifier:
+                    specifiers[name].add(specifier)
+    return [name + ','.join(sorted(specifiers[name])) for name in sorted(specifiers)]
+
+
+def image_size(image, runner=run_command):
+    result = runner(["docker", "image", "inspect", "--format", "{{.Size}}", image])
+    if result.returncode != 0:
+        return None
+    return int(result.stdout.strip())
+
+
+def build_base_image(applications, runner=run_command):
+    """
+    Build the shared base image with the union of all apps' requirements,
+    compiled to wheels in a throwaway stage. The tag is a hash of the
+    requirements and Dockerfile_base, so an unchanged base is reused.
+    """
+    requirements = "\n".join(union_requirements(applications)) + "\n"
+    with open(base_dockerfile_path, 'rb') as file:
+        tag_hash = hashlib.sha256(file.read() + requirements.encode('utf-8')).hexdigest()[:12]
+    base = {'image': f'{base_image_name}:{tag_hash}', 'build_seconds': None}
+
+    if image_size(base['image'], runner) is None:
+        print(f"Building {base['image']}:\n{requirements}")
+        context = tempfile.mkdtemp()
+        try:
+            shutil.copy(base_dockerfile_path, os.path.join(context, 'Dockerfile'))
+            with open(os.path.join(context, 'requirements-base.txt'), 'w') as file:
+                file.write(requirements)
+            start = time.perf_counter()
+            result = runner(["docker", "build", "-t", base['image'], "-t", base_image_name, context],
+                            env=dict(os.environ, DOCKER_BUILDKIT='1'))
+            base['build_seconds'] = time.perf_counter() - start
+        finally:
+            shutil.rmtree(context)
+        if result.returncode != 0:
+            print(f"Build of {base['image']} failed:\n{result.stdout}\n{result.stderr}")
+            return None
+    else:
+        print(f"Reusing {base['image']}")
+    base['image_bytes'] = image_size(base['image'], runner)
+    return base
+
+
+def image_name(application):
+    # docker image names are lower case
+    return f"ddvis-{application['name'].lower()}"
+
+
+def container_name(application):
+    return f"strealmit-{application['name']}"
+
+
+def docker_env(application):
+    application_name = application['name']
+    # worker and thread counts of gunicorn served (Dash) apps, from config.toml
+    gunicorn = application.get('config', {}).get('gunicorn', {})
+    return dict(os.environ,
+                GUNICORN_WORKERS=str(gunicorn.get('workers', '')),
+                GUNICORN_THREADS=str(gunicorn.get('threads', '')),
+                DOCKER_BUILDKIT='1',
+                COMPOSE_DOCKER_CLI_BUILD='1',
+                APP_PATH=application['dir_path'],
+                BASE_IMAGE=application.get('base_image', base_image_name),
+                IMAGE_NAME=image_name(application),
+                BASE_URL_PATH=application_name,
+                CONTAINER_NAME=container_name(application),
+                EXTERNAL_PORT=str(application['external_port']),
+                METRICS_EXTERNAL_PORT=str(application['external_port'] + metrics_port_offset))
+
+
+def stage_build_context(application):
+    # the host directory has its own compose file, its build context is the repository
+    if application.get('host'):
+        return
+    dir_path = application['dir_path']
+    docker_compose_path = os.path.abspath(os.path.join(script_dir, 'docker-compose-template.yml'))
     os.system(f"cp {docker_compose_path} {dir_path}/docker-compose.yml")
-    subprocess.run(["docker-compose", "-f", "docker-compose.yml", "up", "--build", "-d"], cwd=dir_path)
+    # shared package (offline geometries, helpers) is copied into the build context
+    os.system(f"cp -r {shared_package_path} {dir_path}")
+
+
+def clean_build_context(application):
+    if application.get('host'):
+        return
+    dir_path = application['dir_path']
     os.system(f"rm {dir_path}/docker-compose.yml")
+    os.system(f"rm -rf {dir_path}/ddvis")
+
+
+def build_application(application, runner=run_command):
+    """
+    Build the app image, runs concurrently for several apps.
+    """
+    dir_path = application['dir_path']
+    print(f"Building {application['name']} from {dir_path}")
+    start = time.perf_counter()
+    result = runner(["docker-compose", "-f", "docker-compose.yml", "build"], cwd=dir_path, env=docker_env(application))
+    application['build_seconds'] = time.perf_counter() - start
+    application['built'] = result.returncode == 0
+    if not application['built']:
+        print(f"Build of {application['name']} failed:\n{result.stdout}\n{result.stderr}")
+    else:
+        application['image_bytes'] = image_size(image_name(application), runner)
+        if not application.get('host'):
+            application['importtime'] = profile_imports(application, runner)
+    return application
+
+
+def profile_imports(application, runner=run_command):
+    """
+    Import-time profile of the app's cold start inside its new image, with
+    the figure cache warmed as at container start, see ddvis/importtime.py.
+    """
+    script = "([ ! -f charts.py ] || python3 charts.py > /dev/null) && python3 -m ddvis.importtime --json"
+    result = runner(["docker", "run", "--rm", "--entrypoint", "sh", image_name(application), "-c", script])
+    if result.returncode != 0:
+        print(f"Import-time profile of {application['name']} failed:\n{result.stderr[-2000:]}")
+        return None
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"{application['name']}: imports {report['import_seconds'] * 1000:.0f} ms, "
+          f"first run {report['first_run_seconds'] * 1000:.0f} ms, slowest "
+          + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in report['top'][:3]))
+    return report
+
+
+def container_health(container_name, runner=run_command):
+    result = runner(["docker", "inspect", "--format", "{{.State.Health.Status}}", container_name])
+    if result.returncode != 0:
+        return 'missing'
+    return result.stdout.strip()
+
+
+def wait_until_healthy(container_name, runner=run_command, timeout=180, interval=2, sleep=time.sleep):
+    """
+    Poll the container HEALTHCHECK until it reports healthy, gives up on
+    'unhealthy' or after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        status = container_health(container_name, runner)
+        if status in ('healthy', 'unhealthy') or time.monotonic() >= deadline:
+            return status
+        sleep(interval)
+
+
+def previous_image(application):
+    return f"{image_name(application)}:previous"
+
+
+def keep_previous_image(application, runner=run_command):
+    """
+    Tag the image of the running container <image>:previous, the image
+    start_application goes back to. False when no container runs yet.
+    """
+    result = runner(["docker", "inspect", "--format", "{{.Image}}", container_name(application)])
+    if result.returncode != 0:
+        return False
+    return runner(["docker", "tag", result.stdout.strip(), previous_image(application)]).returncode == 0
+
+
+def up(application, runner=run_command, health_timeout=180):
+    """
+    (Re)create the app's container from its image tag, then its health.
+    """
+    env = docker_env(application)
+    result = runner(["docker-compose", "-f", "docker-compose.yml", "up", "-d"], cwd=application['dir_path'], env=env)
+    if result.returncode != 0:
+        print(f"Start of {application['name']} failed:\n{result.stdout}\n{result.stderr}")
+        return 'not started'
+    return wait_until_healthy(env['CONTAINER_NAME'], runner, timeout=health_timeout)
+
+
+def start_application(application, runner=run_command, health_timeout=180):
+    """
+    Replace the running container with the freshly built image and wait for
+    its health check. A new container that is not healthy is rolled back:
+    the previous image gets its tag again and its container is recreated.
+    """
+    start = time.perf_counter()
+    has_previous = keep_previous_image(application, runner)
+    application['health'] = up(application, runner, health_timeout)
+    if application['health'] != 'healthy' and has_previous:
+        print(f"{application['name']} is {application['health']}, rolling back to the previous image")
+        runner(["docker", "tag", previous_image(application), image_name(application)])
+        application['rolled_back'] = up(application, runner, health_timeout)
+    application['start_seconds'] = time.perf_counter() - start
+    return application
+
+
+def compression_config(brotli=None):
+    """
+    Compression of the proxied responses: Dash JSON, scripts and styles.
+    Responses the app already compressed are passed through. Streamlit
+    compresses its websocket itself (server.enableWebsocketCompression).
+    """
+    lines = ['gzip on;',
+             'gzip_proxied any;',
+             'gzip_vary on;',
+             'gzip_comp_level 5;',
+             'gzip_min_length 1024;',
+             f'gzip_types {compressed_types};']
+    if brotli is None:
+        brotli = nginx_brotli
+    if brotli:
+        lines += ['brotli on;',
+                  'brotli_comp_level 5;',
+                  'brotli_min_length 1024;',
+                  f'brotli_types {compressed_types};']
+    return '\n'.join(f'        {line}' for line in lines)
 
 
 def prepare_nginx_config(application_config, external_port):
@@ -53,42 +446,279 @@ def prepare_nginx_config(application_config, external_port):
         proxy_http_version 1.1;
         proxy_set_header Upgrade $http_upgrade;
         proxy_set_header Connection "upgrade";
+{compression_config()}
         proxy_pass http://localhost:{external_port};
     }}
     """
     return nginx_config
 
 
-def reload_applications(apps_directory):
-    external_port = 8501
-    nginx_configs = []
-    for dir_path in glob.glob(os.path.join(apps_directory, '*/')):
-        print(f"Checking {dir_path}")
-        config_path = os.path.join(dir_path, 'config.toml')
-        if os.path.isfile(config_path):
-            config = load_config(config_path)
-            if config:
-                application_config = config.get('application', {})
-                nginx_config = prepare_nginx_config(application_config, external_port)
-                nginx_configs.append(nginx_config)
-                set_env_and_run_docker(config, dir_path, external_port)
-        else:
-            print(f"No config file found in {dir_path}")
+def prepare_host_nginx_config(application_config, external_port):
+    """
+    Same public route as prepare_nginx_config, served by the host container:
+    the app prefix is stripped and the app is named in a header instead.
+    """
+    application_name = application_config.get('name', '')
+    nginx_config = f"""
+    location ~ ^/{application_name}(/.*)$ {{
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header X-Ddvis-App {application_name};
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+{compression_config()}
+        proxy_pass http://127.0.0.1:{external_port}$1$is_args$args;
+    }}
+    """
+    return nginx_config
 
-        external_port += 1
 
-    full_nginx_config = "\n".join(nginx_configs)
-    nginx_snippets_path = '/etc/nginx/snippets/ddivs.config'
+def metrics_url(application, hosted=False):
+    """
+    Where the metrics of an app are served: the side port of its Streamlit
+    container, or of the host container, or the /metrics route of the Dash app.
+    """
+    if hosted:
+        return f"http://127.0.0.1:{host_port + metrics_port_offset}/metrics"
+    if is_streamlit_application(application):
+        return f"http://127.0.0.1:{application['external_port'] + metrics_port_offset}/metrics"
+    return f"http://127.0.0.1:{application['external_port']}/{application['name']}/metrics"
+
+
+def prepare_metrics_nginx_config(application_config, url, allow=None):
+    """
+    /<application name>/metrics for Prometheus, from the allowed addresses
+    only. The exact match takes precedence over the app's regex location.
+    """
+    application_name = application_config.get('name', '')
+    rules = '\n'.join(f'        allow {address};' for address in (metrics_allow if allow is None else allow))
+    nginx_config = f"""
+    location = /{application_name}/metrics {{
+{rules}
+        deny all;
+        proxy_pass {url};
+    }}
+    """
+    return nginx_config
+
+
+def reload_nginx(nginx_config, runner=run_command, snippets_path=nginx_snippets_path):
+    """
+    Write the snippet, check the configuration and reload nginx gracefully:
+    workers finish their open connections, nothing is dropped. The previous
+    snippet is restored when the check fails.
+    """
+    previous = None
+    if os.path.isfile(snippets_path):
+        with open(snippets_path, 'r') as nginx_file:
+            previous = nginx_file.read()
+
+    print(f"Save Nginx Configuration: {snippets_path}")
+    with open(snippets_path, 'w') as nginx_file:
+        nginx_file.write(nginx_config)
+
+    result = runner(["sudo", "nginx", "-t"])
+    if result.returncode != 0:
+        print(f"Nginx configuration test failed, keeping the previous configuration:\n{result.stderr}")
+        if previous is not None:
+            with open(snippets_path, 'w') as nginx_file:
+                nginx_file.write(previous)
+        return False
+
+    runner(["sudo", "systemctl", "reload", "nginx"])
+    print("Nginx has been reloaded.")
+    return True
+
+
+def parse_memory(text):
+    units = {'B': 1, 'KiB': 1 << 10, 'MiB': 1 << 20, 'GiB': 1 << 30, 'kB': 10 ** 3, 'MB': 10 ** 6, 'GB': 10 ** 9}
+    match = re.match(r'([\d.]+)\s*([A-Za-z]+)', text.strip())
+    if not match or match.group(2) not in units:
+        return None
+    return float(match.group(1)) * units[match.group(2)]
+
+
+def print_memory(runner=run_command):
+    """
+    Resident memory of every running app container and the total, to compare
+    one container per app with host mode.
+    """
+    result = runner(["docker", "stats", "--no-stream", "--format", "{{.Name}}\t{{.MemUsage}}"])
+    if result.returncode != 0:
+        return None
+    total = 0
+    for line in result.stdout.splitlines():
+        name, _, usage = line.partition('\t')
+        size = parse_memory(usage.split('/')[0])
+        if name.startswith('strealmit-') and size is not None:
+            print(f"{name:46} {format_bytes(size):>8}")
+            total += size
+    print(f"{'total':46} {format_bytes(total):>8}")
+    return total
+
+
+def format_seconds(seconds):
+    return f'{seconds:.1f}s' if seconds is not None else '-'
+
 
-    print(f"Save Nginx Configuration: {nginx_snippets_path}")
-    with open(nginx_snippets_path, 'w') as nginx_file:
-        nginx_file.write(full_nginx_config)
+def format_milliseconds(report, key):
+    return f'{report[key] * 1000:.0f}ms' if report else '-'
 
-    # Restart Nginx
-    subprocess.run(["sudo", "systemctl", "restart", "nginx"])
-    print("Nginx has been restarted.")
+
+def format_bytes(size):
+    return f'{size / (1 << 20):.0f}MB' if size is not None else '-'
+
+
+def print_report(applications, manifest, base=None):
+    """
+    Build time, image size and health per app, next to the values of the
+    previous deploy from the manifest.
+    """
+    if base is not None:
+        print(f"{base['image']}: build {format_seconds(base['build_seconds'])}, "
+              f"size {format_bytes(base['image_bytes'])}")
+    print(f"{'application':40} {'build (before)':>16} {'size (before)':>16} {'own layers':>10} "
+          f"{'imports (before)':>18} {'first run (before)':>20} {'start':>8}  health")
+    for application in applications:
+        before = manifest.get(application['name'], {})
+        build = f"{format_seconds(application.get('build_seconds'))} ({format_seconds(before.get('build_seconds'))})"
+        size = f"{format_bytes(application.get('image_bytes'))} ({format_bytes(before.get('image_bytes'))})"
+        # image sizes include the base layers they share
+        own = None
+        if application.get('image_bytes') is not None and base is not None and base['image_bytes'] is not None:
+            own = application['image_bytes'] - base['image_bytes']
+        imports = (f"{format_milliseconds(application.get('importtime'), 'import_seconds')} "
+                   f"({format_milliseconds(before.get('importtime'), 'import_seconds')})")
+        first_run = (f"{format_milliseconds(application.get('importtime'), 'first_run_seconds')} "
+                     f"({format_milliseconds(before.get('importtime'), 'first_run_seconds')})")
+        print(f"{application['name']:40} {build:>16} {size:>16} {format_bytes(own):>10} {imports:>18} {first_run:>20} "
+              f"{format_seconds(application.get('start_seconds')):>8}  "
+              f"{application.get('health', 'not built')}"
+              + (f", rolled back: {application['rolled_back']}" if 'rolled_back' in application else ''))
+
+
+def is_serving(application):
+    # a rolled back container serves the previous version, as before the deploy
+    return (application['plan'] == 'unchanged' or application.get('health') == 'healthy'
+            or application.get('rolled_back') == 'healthy')
+
+
+def remove_containers(applications, runner=run_command):
+    for application in applications:
+        print(f"Removing container {container_name(application)}")
+        runner(["docker", "rm", "-f", container_name(application)])
+
+
+def reload_applications(apps_directory, workers=3, runner=run_command, snippets_path=nginx_snippets_path,
+                        health_timeout=180, manifest_path=deploy_manifest_path, force=False, dry_run=False,
+                        host=False):
+    """
+    Rebuild the apps whose content changed since the last deploy: build their
+    images in parallel with a bounded pool, then roll the new containers out
+    one app at a time, each gated on its health check. An app whose build or
+    start fails does not stop the others and is retried on the next deploy.
+
+    With host=True the Streamlit apps are served by a single host container
+    instead of one container each, study_location keeps its own. Containers
+    of the other mode are removed once their replacements are healthy and
+    nginx points at them.
+    """
+    manifest = load_deploy_manifest(manifest_path)
+    applications = find_applications(apps_directory)
+    hosted = host_application(applications)
+    if host:
+        containers = [hosted] + [application for application in applications if not is_streamlit_application(application)]
+    else:
+        containers = applications
+    plan_deploy(containers, manifest, force)
+    removed = removed_applications([hosted] + applications, manifest)
+    print_plan(containers + [dict(application, plan='removed') for application in removed])
+    if dry_run:
+        return containers
+
+    to_deploy = [application for application in containers if application['plan'] != 'unchanged']
+    base = build_base_image(applications, runner) if to_deploy else None
+    if to_deploy and base is None:
+        to_deploy = []
+    previous = {name: dict(entry) for name, entry in manifest.items()}
+    for application in to_deploy:
+        application['base_image'] = base['image']
+        stage_build_context(application)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda application: build_application(application, runner), to_deploy))
+
+        if removed:
+            remove_containers(removed, runner)
+            for application in removed:
+                manifest.pop(application['name'])
+            save_deploy_manifest(manifest, manifest_path)
+        for application in to_deploy:
+            if application['built']:
+                start_application(application, runner, health_timeout)
+            if application.get('health') == 'healthy':
+                manifest[application['name']] = {'hash': application['hash'],
+                                                 'files': application['files'],
+                                                 'external_port': application['external_port'],
+                                                 'build_seconds': application['build_seconds'],
+                                                 'image_bytes': application['image_bytes'],
+                                                 'importtime': application.get('importtime')}
+                save_deploy_manifest(manifest, manifest_path)
+    finally:
+        for application in to_deploy:
+            clean_build_context(application)
+
+    # containers of the other mode keep serving until their replacements do
+    if host:
+        use_host = {application['name']: is_serving(hosted) for application in hosted['hosted']}
+        retired = [application for application in hosted['hosted'] if application['name'] in manifest] if is_serving(hosted) else []
+    else:
+        host_running = hosted['name'] in manifest
+        use_host = {application['name']: host_running and not is_serving(application) for application in hosted['hosted']}
+        retired = [hosted] if host_running and not any(use_host.values()) else []
+
+    nginx_configs = []
+    for application in applications:
+        if use_host.get(application['name']):
+            nginx_configs.append(prepare_host_nginx_config(application['config'].get('application', {}), host_port))
+        else:
+            nginx_configs.append(prepare_nginx_config(application['config'].get('application', {}), application['external_port']))
+        nginx_configs.append(prepare_metrics_nginx_config(application['config'].get('application', {}),
+                                                          metrics_url(application, use_host.get(application['name']))))
+    nginx_config = "\n".join(nginx_configs)
+    current = None
+    if os.path.isfile(snippets_path):
+        with open(snippets_path, 'r') as nginx_file:
+            current = nginx_file.read()
+    reloaded = nginx_config == current or reload_nginx(nginx_config, runner, snippets_path)
+
+    if reloaded and retired:
+        remove_containers(retired, runner)
+        for application in retired:
+            manifest.pop(application['name'], None)
+        save_deploy_manifest(manifest, manifest_path)
+    print_report(to_deploy, previous, base)
+    print_memory(runner)
+    return containers
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and roll out the changed apps behind nginx')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('DEPLOY_WORKERS', 3)),
+                        help='number of images built in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='only print which apps would be rebuilt')
+    parser.add_argument('--force', action='store_true', help='rebuild every app')
+    parser.add_argument('--base-only', action='store_true', help='only build the shared base image')
+    parser.add_argument('--host', action='store_true',
+                        help='serve all Streamlit apps from one host container, see ddvis/host.py')
+    args = parser.parse_args()
+
     apps_directory = os.path.abspath(os.path.join(script_dir, '../apps'))
-    reload_applications(apps_directory)
+    if args.base_only:
+        build_base_image(find_applications(apps_directory))
+        raise SystemExit
+    reload_applications(apps_directory, workers=args.workers, force=args.force, dry_run=args.dry_run,
+                        host=args.host)
@@ -0,0 +1,364 @@
+"""
+Concurrent-session load test of the deployed apps.
+
+Runs locally against the containers deploy.py brings up (or, with --url,
+against the nginx routes) and reports, per app, the throughput and the
+p50/p95/p99 latency of interactions, next to the CPU and memory of the
+app's container sampled from `docker stats` during the run.
+
+Streamlit apps get N concurrent websocket sessions speaking Streamlit's own
+protocol, like browsers: each session loads the page, then keeps switching
+tabs, moving select sliders and paging number inputs it was sent, one
+rerun at a time, with a random think time in between. An interaction lasts
+from the rerun request to the script_finished message.
+
+Dash apps get N concurrent clients firing the app's server callbacks with
+values from its layout: a random dropdown option (the country picked by a
+map click, which is resolved in the browser, or by the dropdown) and the
+layout's initial values for other inputs.
+
+    python3 deploy/loadtest.py --sessions 20 --duration 60
+    python3 deploy/loadtest.py --apps life-expectancy-app --url https://example.org
+
+Needs the `websockets` package (pip install websockets) for Streamlit apps.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from deploy import script_dir, find_applications, is_streamlit_application, container_name, run_command, \
+    parse_memory, format_bytes  # noqa: E402
+
+# seconds between two interactions of a session, drawn uniformly
+THINK_SECONDS = (0.5, 2.0)
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of values, None when there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+class Results:
+    """
+    Latencies and errors of one app, shared by its sessions.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.first_loads = []
+        self.errors = 0
+        self.bytes = 0
+
+    def summary(self, seconds):
+        def milliseconds(values, fraction):
+            value = percentile(values, fraction)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {'interactions': len(self.latencies), 'errors': self.errors,
+                'throughput': round(len(self.latencies) / seconds, 2) if seconds else None,
+                'p50_ms': milliseconds(self.latencies, 0.5), 'p95_ms': milliseconds(self.latencies, 0.95),
+                'p99_ms': milliseconds(self.latencies, 0.99), 'first_load_p50_ms': milliseconds(self.first_loads, 0.5),
+                'received_bytes': self.bytes}
+
+
+class StreamlitSession:
+    """
+    One browser session: the widget states it would send and the widgets it
+    was sent, on one websocket.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widget_states = {}
+        self.tabs = {}
+        self.sliders = {}
+        self.number_inputs = {}
+
+    async def rerun(self):
+        """
+        Request a rerun with the current widget states, wait for it to
+        finish. Returns the bytes received.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.widget_states.widgets.extend(self.widget_states.values())
+        await self.websocket.send(message.SerializeToString())
+
+        received = 0
+        tab_container = None
+        while True:
+            data = await self.websocket.recv()
+            received += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                return received
+            if kind != 'delta':
+                continue
+            delta = forward.delta
+            if delta.WhichOneof('type') == 'add_block':
+                block = delta.add_block
+                if block.WhichOneof('type') == 'tab_container':
+                    tab_container = block.id
+                    self.tabs[tab_container] = []
+                elif block.WhichOneof('type') == 'tab' and tab_container:
+                    self.tabs[tab_container].append(block.tab.label)
+            elif delta.WhichOneof('type') == 'new_element':
+                element = delta.new_element
+                if element.WhichOneof('type') == 'slider' and element.slider.options:
+                    self.sliders[element.slider.id] = list(element.slider.options)
+                elif element.WhichOneof('type') == 'number_input' and element.number_input.has_max:
+                    self.number_inputs[element.number_input.id] = (element.number_input.min, element.number_input.max)
+
+    def interact(self):
+        """
+        Change one widget state at random: a tab, a select slider or a number input.
+        """
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        choices = [('tab', key) for key, labels in self.tabs.items() if len(labels) > 1]
+        choices += [('slider', key) for key in self.sliders] + [('number', key) for key in self.number_inputs]
+        if not choices:
+            return
+        kind, key = random.choice(choices)
+        state = WidgetState(id=key)
+        if kind == 'tab':
+            state.string_value = random.choice(self.tabs[key])
+        elif kind == 'slider':
+            state.string_array_value.data.append(random.choice(self.sliders[key]))
+        else:
+            low, high = self.number_inputs[key]
+            state.double_value = random.randint(int(low), int(high))
+        self.widget_states[key] = state
+        # widgets of the other tabs are sent again when their tab is shown
+        self.sliders.clear()
+        self.number_inputs.clear()
+
+
+async def streamlit_session(url, results, deadline):
+    import websockets
+
+    stream_url = url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+    try:
+        async with websockets.connect(stream_url, subprotocols=['streamlit'], max_size=None) as websocket:
+            session = StreamlitSession(websocket)
+            start = time.perf_counter()
+            results.bytes += await session.rerun()
+            results.first_loads.append(time.perf_counter() - start)
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(random.uniform(*THINK_SECONDS))
+                session.interact()
+                start = time.perf_counter()
+                results.bytes += await session.rerun()
+                results.latencies.append(time.perf_counter() - start)
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as error:
+        print(f"Session of {url} failed: {error}")
+        results.errors += 1
+
+
+def _request(url, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.read()
+
+
+def dash_callbacks(url):
+    """
+    Payload builders of the server callbacks of the Dash app at url, one per callback.
+    """
+    layout = json.loads(_request(url + '_dash-layout'))
+    dependencies = json.loads(_request(url + '_dash-dependencies'))
+
+    components = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            props = node.get('props', {})
+            if 'id' in props and isinstance(props['id'], str):
+                components[props['id']] = props
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+
+    def value(item):
+        props = components.get(item['id'], {})
+        options = props.get('options')
+        if item['property'] == 'value' and options:
+            option = random.choice(options)
+            return option['value'] if isinstance(option, dict) else option
+        return props.get(item['property'])
+
+    callbacks = []
+    for dependency in dependencies:
+        if dependency.get('clientside_function'):
+            continue
+        output = dependency['output']
+        outputs = [dict(zip(('id', 'property'), part.split('.', 1))) for part in output.strip('.').split('...')]
+
+        def payload(dependency=dependency, output=output, outputs=outputs):
+            inputs = [dict(item, value=value(item)) for item in dependency['inputs']]
+            return {'output': output, 'outputs': outputs if len(outputs) > 1 else outputs[0], 'inputs': inputs,
+                    'changedPropIds': [f"{inputs[0]['id']}.{inputs[0]['property']}"], 'state': []}
+
+        callbacks.append(payload)
+    return callbacks
+
+
+async def dash_client(url, callbacks, results, deadline):
+    loop = asyncio.get_running_loop()
+    try:
+        start = time.perf_counter()
+        results.bytes += len(await loop.run_in_executor(None, _request, url))
+        results.first_loads.append(time.perf_counter() - start)
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(random.uniform(*THINK_SECONDS))
+            payload = random.choice(callbacks)()
+            start = time.perf_counter()
+            results.bytes += len(await loop.run_in_executor(None, _request, url + '_dash-update-component', payload))
+            results.latencies.append(time.perf_counter() - start)
+    except OSError as error:
+        print(f"Client of {url} failed: {error}")
+        results.errors += 1
+
+
+def container_stats(runner=run_command):
+    """
+    {container name: (CPU %, memory bytes)} of the running containers, None without docker.
+    """
+    try:
+        result = runner(["docker", "stats", "--no-stream", "--format", "{{.Name}}\t{{.CPUPerc}}\t{{.MemUsage}}"])
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    stats = {}
+    for line in result.stdout.splitlines():
+        name, cpu, usage = (line.split('\t') + ['', ''])[:3]
+        try:
+            stats[name] = (float(cpu.rstrip('%')), parse_memory(usage.split('/')[0]))
+        except ValueError:
+            continue
+    return stats
+
+
+class StatsSampler(threading.Thread):
+    """
+    docker stats of every container, sampled until stopped.
+    """
+
+    def __init__(self, runner=run_command):
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.samples = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            stats = container_stats(self.runner)
+            if stats is None:
+                return
+            for name, sample in stats.items():
+                self.samples.setdefault(name, []).append(sample)
+
+    def summary(self, name):
+        samples = self.samples.get(name)
+        if not samples:
+            return {}
+        cpu = [cpu for cpu, _ in samples]
+        memory = [memory for _, memory in samples if memory is not None]
+        return {'cpu_mean_percent': round(sum(cpu) / len(cpu), 1), 'cpu_max_percent': round(max(cpu), 1),
+                'memory_max_bytes': max(memory) if memory else None}
+
+
+async def load_test(targets, sessions, duration):
+    """
+    Drive `sessions` concurrent sessions per target for `duration` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    # one thread per Dash client, so requests are not queued on the client side
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(4, sessions * len(targets))))
+    deadline = time.perf_counter() + duration
+    tasks = []
+    for target in targets:
+        if target['streamlit']:
+            tasks += [streamlit_session(target['url'], target['results'], deadline) for _ in range(sessions)]
+        else:
+            callbacks = await loop.run_in_executor(None, dash_callbacks, target['url'])
+            tasks += [dash_client(target['url'], callbacks, target['results'], deadline) for _ in range(sessions)]
+    await asyncio.gather(*tasks)
+
+
+def print_report(report):
+    print(f"{'app':32} {'sessions':>8} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'load p50':>9} {'errors':>6} "
+          f"{'cpu avg':>8} {'cpu max':>8} {'memory':>8}")
+    for name, entry in report['apps'].items():
+        def ms(key):
+            return f"{entry[key]:.0f}ms" if entry.get(key) is not None else '-'
+
+        def percent(key):
+            return f"{entry[key]:.0f}%" if entry.get(key) is not None else '-'
+
+        memory = format_bytes(entry['memory_max_bytes']) if entry.get('memory_max_bytes') else '-'
+        print(f"{name:32} {report['sessions']:8} {entry['throughput']:7.1f} {ms('p50_ms'):>8} {ms('p95_ms'):>8} "
+              f"{ms('p99_ms'):>8} {ms('first_load_p50_ms'):>9} {entry['errors']:6} "
+              f"{percent('cpu_mean_percent'):>8} {percent('cpu_max_percent'):>8} {memory:>8}")
+
+
+def run(applications, sessions, duration, base_url=None, runner=run_command):
+    targets = []
+    for application in applications:
+        name = application['name']
+        url = f"{base_url.rstrip('/')}/{name}/" if base_url else f"http://localhost:{application['external_port']}/{name}/"
+        targets.append({'name': name, 'url': url, 'streamlit': is_streamlit_application(application),
+                        'container': container_name(application), 'results': Results()})
+
+    sampler = StatsSampler(runner)
+    sampler.start()
+    start = time.perf_counter()
+    asyncio.run(load_test(targets, sessions, duration))
+    seconds = time.perf_counter() - start
+    sampler.stopped.set()
+    sampler.join()
+
+    apps = {}
+    for target in targets:
+        apps[target['name']] = dict(target['results'].summary(seconds), **sampler.summary(target['container']))
+    return {'sessions': sessions, 'duration': round(seconds, 1), 'apps': apps}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the deployed apps with concurrent sessions')
+    parser.add_argument('--sessions', type=int, default=10, help='concurrent sessions per app')
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load')
+    parser.add_argument('--apps', nargs='*', help='application names from config.toml, default all')
+    parser.add_argument('--url', help='public base URL (nginx), default the container ports on localhost')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    applications = find_applications(os.path.abspath(os.path.join(script_dir, '../apps')))
+    if args.apps:
+        applications = [application for application in applications if application['name'] in args.apps]
+    report = run(applications, args.sessions, args.duration, args.url)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,22 @@
+"""
+Host mode: all Streamlit apps in one process, see ddvis/host.py.
+
+    cd host && PYTHONPATH=.. streamlit run streamlit_app.py
+    # then open /?app=<application name>
+"""
+import os
+import streamlit as st
+from ddvis import host, metrics
+
+apps_directory = os.environ.get('APPS_DIRECTORY', os.path.join(os.path.dirname(os.path.abspath(__file__)), '../apps'))
+apps = host.discover_apps(apps_directory)
+
+name = st.context.headers.get(host.APP_HEADER) or st.query_params.get('app')
+if name in apps:
+    # samples of the app's run are labelled with its name, see ddvis/metrics.py
+    with metrics.app(name):
+        host.run_app(apps[name])
+else:
+    st.title('Digital Divide')
+    for app_name in apps:
+        st.markdown(f'- [{app_name}](?app={app_name})')
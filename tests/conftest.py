@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ddvis is imported from the repository root, deploy.py is a script of deploy/
+for path in (REPOSITORY_ROOT, os.path.join(REPOSITORY_ROOT, 'deploy')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+# modules of an app directory, the same names in every app
+APP_MODULES = ('charts', 'compile_data', 'streamlit_app', 'app')
+
+
+@pytest.fixture
+def compiled_app(tmp_path, monkeypatch):
+    """
+    Factory of a copy of apps/<name> (see benchmark.link_app) with its
+    artifacts compiled, made the working directory as in the app's container.
+    """
+    from ddvis import benchmark
+
+    def make(name):
+        directory = tmp_path / name
+        directory.mkdir()
+        benchmark.link_app(os.path.join(REPOSITORY_ROOT, 'apps', name), str(directory))
+        monkeypatch.chdir(directory)
+        monkeypatch.syspath_prepend(str(directory))
+        for module in APP_MODULES:
+            sys.modules.pop(module, None)
+        import compile_data
+
+        compile_data.compile_all()
+        return directory
+
+    yield make
+    for module in APP_MODULES:
+        sys.modules.pop(module, None)
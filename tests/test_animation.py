@@ -0,0 +1,113 @@
+import base64
+import copy
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from ddvis import animation, figures
+
+
+def merge(trace, frame_trace):
+    """
+    trace with frame_trace merged in, as plotly.js applies an animation
+    frame: nested attributes merged, arrays and values replaced.
+    """
+    merged = dict(trace)
+    for key, value in frame_trace.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict) and 'bdata' not in value:
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def played_frames(figure):
+    """
+    The traces shown at each frame of a figure dict, its frames played in order.
+    """
+    traces = figure['data']
+    shown = []
+    for frame in figure['frames']:
+        traces = [merge(trace, frame_trace) for trace, frame_trace in zip(traces, frame['data'])]
+        shown.append(traces)
+    return shown
+
+
+def array(value):
+    if isinstance(value, dict):
+        return np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+    return np.asarray(value)
+
+
+def shown_values(trace):
+    """
+    {location: value} drawn by a choropleth trace, missing values not drawn.
+    """
+    return {location: float(value) for location, value in zip(trace['locations'], array(trace['z']))
+            if not np.isnan(value)}
+
+
+@pytest.fixture
+def gapminder():
+    return pd.DataFrame({
+        'iso': ['FRA', 'DEU', 'ITA', 'FRA', 'DEU', 'ITA', 'FRA', 'ITA'],
+        'country': ['France', 'Germany', 'Italy'] * 2 + ['France', 'Italy'],
+        'year': [2000, 2000, 2000, 2005, 2005, 2005, 2010, 2010],
+        'life': [79.0, 78.1, 79.9, 80.2, 79.0, 80.8, 81.3, 82.0],
+    })
+
+
+def px_figure(frame):
+    import plotly.express as px
+
+    return px.choropleth(frame, locations='iso', color='life', animation_frame='year', hover_name='country')
+
+
+def test_frames_without_repeated_data_play_as_the_original(gapminder):
+    # every country in every period, only the values change
+    original = json.loads(px_figure(gapminder[gapminder['year'] < 2010]).to_json())
+    stripped = figures.drop_repeated_frame_data(copy.deepcopy(original))
+
+    # the hover template names the period, it changes too
+    assert all(sorted(frame['data'][0]) == ['hovertemplate', 'type', 'z'] for frame in stripped['frames'])
+    assert played_frames(stripped) == played_frames(original)
+
+
+def test_attributes_that_change_between_frames_are_kept(gapminder):
+    # Germany has no 2010 value, the locations of that frame differ
+    original = json.loads(px_figure(gapminder).to_json())
+    stripped = figures.drop_repeated_frame_data(copy.deepcopy(original))
+
+    assert all('locations' in frame['data'][0] for frame in stripped['frames'])
+    assert played_frames(stripped) == played_frames(original)
+
+
+def test_encoded_figure_plays_as_the_figure(gapminder):
+    fig = animation.period_choropleth(gapminder, 'iso', 'life', 'year', hover_name='country')
+
+    assert played_frames(json.loads(figures.encode(fig))) == played_frames(json.loads(fig.to_json()))
+
+
+@pytest.mark.parametrize('periods', [None, [2005, 2010]])
+def test_period_choropleth_shows_the_values_of_plotly_express(gapminder, periods):
+    expected_figure = json.loads(px_figure(gapminder).to_json())
+    expected = {frame['name']: shown_values(frame['data'][0]) for frame in expected_figure['frames']}
+    expected_hover = {location: name for trace in played_frames(expected_figure)
+                      for location, name in zip(trace[0]['locations'], trace[0]['hovertext'])}
+
+    figure = json.loads(figures.encode(
+        animation.period_choropleth(gapminder, 'iso', 'life', 'year', periods=periods, hover_name='country')))
+    names = [frame['name'] for frame in figure['frames']]
+    shown = {name: shown_values(traces[0]) for name, traces in zip(names, played_frames(figure))}
+
+    assert names == [str(period) for period in periods or [2000, 2005, 2010]]
+    assert shown.keys() == {name: expected[name] for name in names}.keys()
+    for name in names:
+        # values are sent as float32
+        assert shown[name] == pytest.approx(expected[name], rel=1e-6)
+    trace = figure['data'][0]
+    assert dict(zip(trace['locations'], trace['hovertext'])) == expected_hover
+    assert [step['label'] for step in figure['layout']['sliders'][0]['steps']] == names
+    # the same colors in every period, whichever are shown
+    color_axis = figure['layout']['coloraxis']
+    assert (color_axis['cmin'], color_axis['cmax']) == (gapminder['life'].min(), gapminder['life'].max())
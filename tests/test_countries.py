@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+from ddvis import countries
+
+
+@pytest.mark.parametrize('value, iso3', [
+    # Natural Earth names and codes
+    ('France', 'FRA'),
+    ('FRA', 'FRA'),
+    ('FR', 'FRA'),
+    ('Dem. Rep. Congo', 'COD'),
+    # aliases of country_codes.json
+    ('Korea, Rep.', 'KOR'),
+    ('Korea (Rep. of)', 'KOR'),
+    ('Republic of Korea', 'KOR'),
+    ('Korea, Dem. Rep.', 'PRK'),
+    ('Congo, Rep.', 'COG'),
+    ('Congo - Brazzaville', 'COG'),
+    ('Democratic Republic of the Congo', 'COD'),
+    ('United Kingdom of Great Britain and Northern Ireland', 'GBR'),
+    ('Bolivia (Plurinational State of)', 'BOL'),
+    ('Viet Nam', 'VNM'),
+    ('Russian Federation', 'RUS'),
+    ('St. Kitts', 'KNA'),
+    # codes Natural Earth does not have
+    ('Kosovo', 'KOS'),
+    ('XK', 'KOS'),
+    # case, accents, typographic apostrophes and blanks are ignored
+    ('kor', 'KOR'),
+    ('SOUTH KOREA', 'KOR'),
+    ('  united   states  ', 'USA'),
+    ('Côte d’Ivoire', 'CIV'),
+    ("Cote d'Ivoire", 'CIV'),
+    ('Türkiye', 'TUR'),
+])
+def test_resolves_names_aliases_and_codes(value, iso3):
+    assert countries.resolve([value])[0] == iso3
+
+
+@pytest.mark.parametrize('value, iso3', [
+    # renamed countries resolve to the country of today
+    ('Zaire', 'COD'),
+    ('Swaziland', 'SWZ'),
+    ('Macedonia', 'MKD'),
+    ('Sudan', 'SDN'),
+    ('South Sudan', 'SSD'),
+    # names shared by two countries mean the one the datasets mean by them
+    ('Korea', 'KOR'),
+    ('Congo', 'COG'),
+    ('Niger', 'NER'),
+    ('Guinea', 'GIN'),
+    ('Dominica', 'DMA'),
+])
+def test_resolves_historical_and_ambiguous_names(value, iso3):
+    assert countries.resolve([value])[0] == iso3
+
+
+@pytest.mark.parametrize('value', [
+    # states split into several countries have no single ISO3 code
+    'Czechoslovakia',
+    'USSR',
+    'Soviet Union',
+    'Yugoslavia',
+    'Serbia and Montenegro',
+    'West Germany',
+    'East Germany',
+    'Netherlands Antilles',
+    # aggregates and unknown names
+    'European Union',
+    'EU',
+    'Atlantis',
+    '',
+])
+def test_unknown_names_are_missing(value):
+    assert pd.isna(countries.resolve([value])[0])
+    assert countries.unresolved([value]) == [value]
+
+
+def test_resolves_in_bulk_to_categorical_codes():
+    values = pd.Series(['France', None, 'FR', 'Atlantis', 'france', float('nan')])
+    resolved = countries.resolve(values)
+
+    assert isinstance(resolved, pd.Categorical)
+    assert list(resolved.categories) == list(countries.codes())
+    assert list(resolved.astype(object)[[0, 2, 4]]) == ['FRA'] * 3
+    assert resolved.isna().tolist() == [False, True, False, True, False, True]
+    assert countries.unresolved(values) == ['Atlantis']
+
+
+def test_every_alias_resolves_to_its_code():
+    aliases = pd.read_json(countries.CODES_PATH, orient='records', encoding='utf-8')
+    resolved = countries.resolve(aliases['geoName'])
+    # names given to two codes keep the first one
+    first = aliases.assign(key=aliases['geoName'].map(countries.normalize)).drop_duplicates('key')
+    shadowed = ~aliases.index.isin(first.index)
+
+    mismatched = aliases[(pd.Series(resolved.astype(object)) != aliases['CCA3']) & ~shadowed]
+    assert mismatched.empty, mismatched
@@ -0,0 +1,262 @@
+import json
+import time
+import threading
+import subprocess
+import pytest
+import deploy
+
+
+class FakeRunner:
+    """
+    docker, docker-compose and nginx as deploy.py calls them, with images
+    and containers kept in memory.
+    """
+
+    def __init__(self, failing_builds=(), unhealthy_builds=(), nginx_ok=True, build_seconds=0.0):
+        self.failing_builds = set(failing_builds)
+        # names of apps whose next build makes an image that never gets healthy
+        self.unhealthy_builds = set(unhealthy_builds)
+        self.nginx_ok = nginx_ok
+        self.build_seconds = build_seconds
+        self.images = {}
+        self.unhealthy_images = set()
+        self.containers = {}
+        self.calls = []
+        self.building = 0
+        self.max_building = 0
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _image_id(self):
+        with self._lock:
+            self._next_id += 1
+            return f'sha256:{self._next_id:04d}'
+
+    def _resolve(self, image):
+        return image if image.startswith('sha256:') else self.images.get(image if ':' in image else f'{image}:latest')
+
+    def _tag(self, image):
+        return image if ':' in image else f'{image}:latest'
+
+    def __call__(self, args, cwd=None, env=None):
+        with self._lock:
+            self.calls.append(list(args))
+        if args[:2] == ['docker-compose', '-f']:
+            if args[-1] == 'build':
+                return self.compose_build(env)
+            return self.compose_up(env)
+        if args[:3] == ['docker', 'image', 'inspect']:
+            return self.result(0 if self._resolve(args[-1]) else 1, '1048576')
+        if args[:2] == ['docker', 'build']:
+            image_id = self._image_id()
+            for tag in args[3:-1:2]:
+                self.images[self._tag(tag)] = image_id
+            return self.result(0)
+        if args[:2] == ['docker', 'run']:
+            return self.result(0, json.dumps({'import_seconds': 0.1, 'first_run_seconds': 0.2, 'top': []}))
+        if args[:2] == ['docker', 'inspect']:
+            image_id = self.containers.get(args[-1])
+            if image_id is None:
+                return self.result(1)
+            if args[3] == '{{.Image}}':
+                return self.result(0, image_id)
+            return self.result(0, 'unhealthy' if image_id in self.unhealthy_images else 'healthy')
+        if args[:2] == ['docker', 'tag']:
+            self.images[self._tag(args[3])] = self._resolve(args[2])
+            return self.result(0)
+        if args[:2] == ['docker', 'rm']:
+            self.containers.pop(args[-1], None)
+            return self.result(0)
+        if args[:2] == ['docker', 'stats']:
+            return self.result(0)
+        if args == ['sudo', 'nginx', '-t']:
+            return self.result(0 if self.nginx_ok else 1, stderr='nginx: configuration test failed')
+        if args == ['sudo', 'systemctl', 'reload', 'nginx']:
+            return self.result(0)
+        raise AssertionError(f'unexpected command {args}')
+
+    def compose_build(self, env):
+        name = env['BASE_URL_PATH']
+        with self._lock:
+            self.building += 1
+            self.max_building = max(self.max_building, self.building)
+        time.sleep(self.build_seconds)
+        with self._lock:
+            self.building -= 1
+        if name in self.failing_builds:
+            return self.result(1, stderr='build failed')
+        image_id = self._image_id()
+        if name in self.unhealthy_builds:
+            self.unhealthy_images.add(image_id)
+        self.images[self._tag(env['IMAGE_NAME'])] = image_id
+        return self.result(0)
+
+    def compose_up(self, env):
+        self.containers[env['CONTAINER_NAME']] = self.images[self._tag(env['IMAGE_NAME'])]
+        return self.result(0)
+
+    @staticmethod
+    def result(returncode, stdout='', stderr=''):
+        return subprocess.CompletedProcess([], returncode, stdout, stderr)
+
+
+APP_NAMES = ['first-app', 'second-app', 'third-app']
+
+
+@pytest.fixture
+def apps_directory(tmp_path):
+    for name in APP_NAMES:
+        app_path = tmp_path / 'apps' / name
+        app_path.mkdir(parents=True)
+        (app_path / 'config.toml').write_text(f'[application]\nname = "{name}"\n')
+        (app_path / 'requirements.txt').write_text('streamlit\n')
+        (app_path / 'streamlit_app.py').write_text('import streamlit as st\n')
+        (app_path / 'Dockerfile').write_text('FROM ddvis-base\n')
+    return tmp_path / 'apps'
+
+
+def deploy_apps(apps_directory, runner, **options):
+    root = apps_directory.parent
+    return {application['name']: application for application in deploy.reload_applications(
+        str(apps_directory), runner=runner, snippets_path=str(root / 'nginx.config'),
+        manifest_path=str(root / 'deployed.json'), health_timeout=1, **options)}
+
+
+def manifest(apps_directory):
+    return deploy.load_deploy_manifest(str(apps_directory.parent / 'deployed.json'))
+
+
+def test_builds_in_parallel(apps_directory):
+    runner = FakeRunner(build_seconds=0.2)
+    applications = deploy_apps(apps_directory, runner, workers=3)
+
+    assert runner.max_building == 3
+    assert all(application['health'] == 'healthy' for application in applications.values())
+    assert sorted(manifest(apps_directory)) == APP_NAMES
+    assert sorted(runner.containers) == sorted(f'strealmit-{name}' for name in APP_NAMES)
+
+
+def test_failed_build_does_not_stop_the_others(apps_directory):
+    runner = FakeRunner(failing_builds=['second-app'])
+    applications = deploy_apps(apps_directory, runner)
+
+    assert not applications['second-app']['built']
+    assert 'health' not in applications['second-app']
+    assert 'strealmit-second-app' not in runner.containers
+    assert sorted(manifest(apps_directory)) == ['first-app', 'third-app']
+
+
+def test_unhealthy_container_is_rolled_back(apps_directory):
+    runner = FakeRunner()
+    deploy_apps(apps_directory, runner)
+    serving = runner.containers['strealmit-second-app']
+    deployed_hash = manifest(apps_directory)['second-app']['hash']
+
+    (apps_directory / 'second-app' / 'streamlit_app.py').write_text('raise SystemExit\n')
+    runner.unhealthy_builds.add('second-app')
+    applications = deploy_apps(apps_directory, runner)
+
+    assert applications['second-app']['health'] == 'unhealthy'
+    assert applications['second-app']['rolled_back'] == 'healthy'
+    assert runner.containers['strealmit-second-app'] == serving
+    assert runner.images['ddvis-second-app:latest'] == serving
+    # retried on the next deploy
+    assert manifest(apps_directory)['second-app']['hash'] == deployed_hash
+
+
+def test_unhealthy_first_deploy_has_nothing_to_roll_back_to(apps_directory):
+    runner = FakeRunner(unhealthy_builds=['first-app'])
+    applications = deploy_apps(apps_directory, runner)
+
+    assert applications['first-app']['health'] == 'unhealthy'
+    assert 'rolled_back' not in applications['first-app']
+    assert 'first-app' not in manifest(apps_directory)
+
+
+def test_failed_nginx_check_restores_the_previous_config(apps_directory):
+    snippets_path = apps_directory.parent / 'nginx.config'
+    snippets_path.write_text('# previous configuration\n')
+    runner = FakeRunner(nginx_ok=False)
+    deploy_apps(apps_directory, runner)
+
+    assert snippets_path.read_text() == '# previous configuration\n'
+    assert ['sudo', 'nginx', '-t'] in runner.calls
+    assert ['sudo', 'systemctl', 'reload', 'nginx'] not in runner.calls
+
+
+def compose_builds(runner):
+    return [call for call in runner.calls if call[:2] == ['docker-compose', '-f'] and call[-1] == 'build']
+
+
+def test_unchanged_apps_are_skipped(apps_directory):
+    runner = FakeRunner()
+    deploy_apps(apps_directory, runner)
+    runner.calls.clear()
+
+    applications = deploy_apps(apps_directory, runner)
+    assert {name: application['plan'] for name, application in applications.items()} == dict.fromkeys(APP_NAMES, 'unchanged')
+    assert compose_builds(runner) == []
+
+    (apps_directory / 'third-app' / 'streamlit_app.py').write_text('import streamlit as st\nst.write(1)\n')
+    applications = deploy_apps(apps_directory, runner)
+    assert applications['third-app']['plan'] == 'changed'
+    assert applications['third-app']['changed_files'] == ['streamlit_app.py']
+    assert len(compose_builds(runner)) == 1
+
+
+def test_moved_app_is_restarted_on_its_new_port(apps_directory):
+    runner = FakeRunner()
+    deploy_apps(apps_directory, runner)
+
+    # directories are given ports in order, first-app now comes last
+    (apps_directory / 'first-app').rename(apps_directory / 'z-app')
+    applications = deploy_apps(apps_directory, runner)
+
+    assert {name: application['plan'] for name, application in applications.items()} == dict.fromkeys(APP_NAMES, 'moved')
+    assert all(application['changed_files'] == [] for application in applications.values())
+    assert {name: entry['external_port'] for name, entry in manifest(apps_directory).items()} == {
+        'first-app': 8503, 'second-app': 8501, 'third-app': 8502}
+
+
+def test_renamed_app_replaces_its_container(apps_directory):
+    runner = FakeRunner()
+    deploy_apps(apps_directory, runner)
+
+    (apps_directory / 'second-app' / 'config.toml').write_text('[application]\nname = "renamed-app"\n')
+    applications = deploy_apps(apps_directory, runner)
+
+    assert applications['renamed-app']['plan'] == 'new'
+    assert applications['renamed-app']['health'] == 'healthy'
+    assert ['docker', 'rm', '-f', 'strealmit-second-app'] in runner.calls
+    assert sorted(runner.containers) == ['strealmit-first-app', 'strealmit-renamed-app', 'strealmit-third-app']
+    assert sorted(manifest(apps_directory)) == ['first-app', 'renamed-app', 'third-app']
+
+
+def test_dry_run_does_not_call_the_runner(apps_directory):
+    deploy_apps(apps_directory, FakeRunner())
+    deployed = manifest(apps_directory)
+    (apps_directory / 'first-app' / 'requirements.txt').write_text('streamlit\npandas\n')
+    (apps_directory / 'third-app' / 'config.toml').write_text('[application]\nname = "renamed-app"\n')
+
+    runner = FakeRunner()
+    applications = deploy_apps(apps_directory, runner, dry_run=True)
+
+    assert runner.calls == []
+    assert {name: application['plan'] for name, application in applications.items()} == {
+        'first-app': 'changed', 'second-app': 'unchanged', 'renamed-app': 'new'}
+    assert manifest(apps_directory) == deployed
+
+
+def test_base_change_redeploys_every_app(apps_directory, monkeypatch):
+    base_dockerfile_path = apps_directory.parent / 'Dockerfile_base'
+    base_dockerfile_path.write_text('FROM python:3.11-slim\n')
+    monkeypatch.setattr(deploy, 'base_dockerfile_path', str(base_dockerfile_path))
+    runner = FakeRunner()
+    deploy_apps(apps_directory, runner)
+
+    base_dockerfile_path.write_text('FROM python:3.12-slim\n')
+    applications = deploy_apps(apps_directory, runner)
+
+    assert all(application['plan'] == 'changed' for application in applications.values())
+    assert all(application['changed_files'] == ['Dockerfile_base'] for application in applications.values())
+    assert all(application['health'] == 'healthy' for application in applications.values())
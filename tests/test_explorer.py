@@ -0,0 +1,47 @@
+import pytest
+from ddvis import artifacts, explorer
+
+DATA_TAB = '**Time Series Data**'
+
+
+@pytest.fixture
+def data_tab(compiled_app):
+    """
+    Run the Data tab of life_expectancy, the explorer of its gapminder artifact.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    directory = compiled_app('life_expectancy')
+
+    def run():
+        at = AppTest.from_file(str(directory / 'streamlit_app.py'), default_timeout=300)
+        at.session_state['tabs'] = DATA_TAB
+        at.run()
+        assert not at.exception
+        return at
+
+    return run
+
+
+def test_encoded_page_is_the_element_st_dataframe_sends(data_tab, monkeypatch):
+    encoded = data_tab()
+    monkeypatch.setattr(explorer, '_send_encoded', False)
+    plain = data_tab()
+
+    assert encoded.dataframe[0].proto == plain.dataframe[0].proto
+    expected = artifacts.read('gapminder', columns=list(explorer.shown_columns('gapminder'))).head(explorer.PAGE_SIZE)
+    assert encoded.dataframe[0].value.reset_index(drop=True).equals(expected)
+    assert encoded.caption[-1].value == f'{len(artifacts.read("gapminder"))} rows, page 1 of 35'
+
+
+def test_page_is_shown_with_st_dataframe_when_streamlit_does_not_take_it(data_tab, monkeypatch, capsys):
+    def changed_internals(payload):
+        raise TypeError("_enqueue() got an unexpected keyword argument 'layout_config'")
+
+    monkeypatch.setattr(explorer, '_enqueue_encoded', changed_internals)
+    monkeypatch.setattr(explorer, '_send_encoded', True)
+    at = data_tab()
+
+    assert explorer._send_encoded is False
+    assert at.dataframe[0].value.shape == (explorer.PAGE_SIZE, len(explorer.shown_columns('gapminder')))
+    assert 'using st.dataframe' in capsys.readouterr().out
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ddvis import fetch
+
+
+class Fixtures(BaseHTTPRequestHandler):
+    """
+    Files of server.files, {path: (bytes, etag)}, answering If-None-Match
+    with 304; the headers of every request are kept in server.requests.
+    """
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path not in self.server.files:
+            self.send_error(404)
+            return
+        data, etag = self.server.files[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Fixtures)
+    server.files, server.requests = {'/data.csv': (b'a,b\n1,2\n', '"v1"')}, []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def meta(path):
+    with open(f'{path}.json') as file:
+        return json.load(file)
+
+
+def test_first_fetch_keeps_the_etag(server, tmp_path):
+    path = fetch.fetch(f'{server.url}/data.csv', cache_dir=str(tmp_path))
+
+    assert read(path) == b'a,b\n1,2\n'
+    assert meta(path)['etag'] == '"v1"'
+    assert 'If-None-Match' not in server.requests[0][1]
+
+
+def test_stale_copy_is_revalidated_without_being_rewritten(server, tmp_path):
+    url = f'{server.url}/data.csv'
+    path = fetch.fetch(url, cache_dir=str(tmp_path))
+    written = os.stat(path).st_mtime_ns
+    checked = meta(path)['checked']
+
+    # a fresh copy is used as is
+    assert fetch.fetch(url, cache_dir=str(tmp_path)) == path
+    assert len(server.requests) == 1
+
+    assert fetch.fetch(url, max_age=0, cache_dir=str(tmp_path), background=False) == path
+    assert server.requests[1][1]['If-None-Match'] == '"v1"'
+    assert os.stat(path).st_mtime_ns == written
+    assert meta(path)['checked'] > checked
+
+
+def test_changed_file_replaces_the_copy(server, tmp_path):
+    url = f'{server.url}/data.csv'
+    path = fetch.fetch(url, cache_dir=str(tmp_path))
+    server.files['/data.csv'] = (b'a,b\n3,4\n', '"v2"')
+
+    assert fetch.revalidate(url, cache_dir=str(tmp_path)) == 200
+    assert read(path) == b'a,b\n3,4\n'
+    assert meta(path)['etag'] == '"v2"'
+
+
+def test_cached_copy_is_used_when_the_server_is_down(server, tmp_path, capsys):
+    url = f'{server.url}/data.csv'
+    path = fetch.fetch(url, cache_dir=str(tmp_path))
+    server.shutdown()
+    server.server_close()
+
+    assert read(fetch.fetch(url, max_age=0, cache_dir=str(tmp_path), timeout=1, background=False)) == b'a,b\n1,2\n'
+    assert 'keeping the cached copy' in capsys.readouterr().out
+    # only a URL never fetched fails
+    with pytest.raises(urllib.error.URLError):
+        fetch.fetch(f'{server.url}/other.csv', cache_dir=str(tmp_path), timeout=1)
+
+
+def test_fixtures_server_stands_in_for_remote_urls(server, tmp_path, monkeypatch):
+    server.files['/example.org/datasets/data.csv'] = (b'x\n1\n', '"f1"')
+    monkeypatch.setattr(fetch, 'FIXTURES_URL', f'{server.url}/')
+
+    path = fetch.fetch('https://example.org/datasets/data.csv', cache_dir=str(tmp_path))
+
+    assert read(path) == b'x\n1\n'
+    assert server.requests[0][0] == '/example.org/datasets/data.csv'
+    assert meta(path)['url'] == f'{server.url}/example.org/datasets/data.csv'
@@ -0,0 +1,93 @@
+import copy
+import json
+import base64
+import pytest
+from ddvis import figures
+
+STREAMLIT_APPS = ['digital_skills', 'exclusion_reasons', 'hidden_labour_force_of_AI', 'internet_users_by_country',
+                  'life_expectancy']
+
+
+def caches(cache_dir):
+    return (figures.FigureCache(64 << 20, cache_dir, decode=figures.decode_figure),
+            figures.FigureCache(32 << 20, cache_dir, suffix='.png', name='png'))
+
+
+@pytest.mark.parametrize('app', STREAMLIT_APPS)
+def test_warmed_figures_are_served_to_the_app(compiled_app, monkeypatch, tmp_path, app):
+    from streamlit.testing.v1 import AppTest
+
+    directory = compiled_app(app)
+    import charts
+
+    # `python charts.py` at container start, then the app in a process of its own
+    cache_dir = str(tmp_path / 'figures')
+    monkeypatch.setattr(figures, 'figure_cache', caches(cache_dir)[0])
+    monkeypatch.setattr(figures, 'png_cache', caches(cache_dir)[1])
+    figures.warm_up(charts.WARM_UP, getattr(charts, 'STATIC_MAPS', ()))
+    figure_cache, png_cache = caches(cache_dir)
+    monkeypatch.setattr(figures, 'figure_cache', figure_cache)
+    monkeypatch.setattr(figures, 'png_cache', png_cache)
+
+    at = AppTest.from_file(str(directory / 'streamlit_app.py'), default_timeout=300)
+    at.run()
+    for label in [tab.label for tab in at.tabs]:
+        at.session_state['tabs'] = label
+        at.run()
+
+    assert (figure_cache.misses, png_cache.misses) == (0, 0)
+    assert figure_cache.hits >= len(charts.WARM_UP)
+
+
+def test_encode_writes_numeric_arrays_as_typed_arrays():
+    import numpy as np
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Scatter(x=np.arange(3), y=np.array([1.5, 2.0, 3.0]), text=['a', 'b', 'c']))
+    encoded = figures.encode(fig)
+    trace = json.loads(encoded)['data'][0]
+
+    assert set(trace['y']) == {'dtype', 'bdata'}
+    assert np.frombuffer(base64.b64decode(trace['y']['bdata']), dtype=trace['y']['dtype']).tolist() == [1.5, 2.0, 3.0]
+    # text stays a list, and the JSON has no blanks
+    assert trace['text'] == ['a', 'b', 'c']
+    assert b', ' not in encoded and b': ' not in encoded
+    # the cached Figure keeps the typed array, it is sent on as is
+    assert json.loads(figures.decode_figure(encoded).to_json())['data'][0]['y'] == trace['y']
+
+
+def animated(*frames, **trace):
+    return {'data': [dict(trace, type='choropleth')],
+            'frames': [{'name': str(index), 'data': [dict(frame, type='choropleth')]} for index, frame in enumerate(frames)]}
+
+
+def test_drop_repeated_frame_data_keeps_what_changes():
+    figure = figures.drop_repeated_frame_data(animated(
+        {'locations': ['FRA', 'ITA'], 'hovertext': ['France', 'Italy'], 'z': [1, 2], 'name': 'a'},
+        {'locations': ['FRA', 'ITA'], 'hovertext': ['France', 'Italy'], 'z': [3, 4], 'name': 'b'},
+        locations=['FRA', 'ITA'], hovertext=['France', 'Italy'], z=[1, 2], name='a'))
+
+    assert [frame['data'] for frame in figure['frames']] == [[{'type': 'choropleth', 'z': [1, 2], 'name': 'a'}],
+                                                             [{'type': 'choropleth', 'z': [3, 4], 'name': 'b'}]]
+    assert figure['data'][0]['locations'] == ['FRA', 'ITA']
+
+
+def test_drop_repeated_frame_data_keeps_attributes_missing_from_the_traces():
+    # a frame attribute the traces do not have is not merged from anywhere else
+    figure = figures.drop_repeated_frame_data(animated(
+        {'locations': ['FRA'], 'zmax': 5, 'z': [1]}, {'locations': ['FRA'], 'zmax': 5, 'z': [2]},
+        locations=['FRA'], z=[1]))
+
+    assert [sorted(frame['data'][0]) for frame in figure['frames']] == [['type', 'z', 'zmax']] * 2
+
+
+@pytest.mark.parametrize('figure', [
+    {'data': [{'type': 'scatter', 'y': [1]}]},
+    {'data': [{'type': 'scatter', 'y': [1]}], 'frames': []},
+    # frames naming the traces they change, or not one per trace, are left as they are
+    {'data': [{'type': 'scatter', 'y': [1]}], 'frames': [{'data': [{'type': 'scatter', 'y': [1]}], 'traces': [0]}]},
+    {'data': [{'type': 'scatter', 'y': [1]}, {'type': 'scatter', 'y': [2]}],
+     'frames': [{'data': [{'type': 'scatter', 'y': [1]}]}]},
+])
+def test_drop_repeated_frame_data_leaves_other_figures_alone(figure):
+    assert figures.drop_repeated_frame_data(copy.deepcopy(figure)) == figure
@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import threading
+import pytest
+from ddvis import metrics
+
+
+@pytest.fixture
+def directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'MULTIPROCESS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_overlapping_flushes_do_not_fail(directory):
+    metrics.observe('data', 'overlap', 0.01)
+    errors = []
+
+    def flush_repeatedly():
+        try:
+            for _ in range(50):
+                metrics.flush()
+        except Exception as error:
+            errors.append(error)
+
+    # the flusher thread and scrapes flush the same process's file
+    threads = [threading.Thread(target=flush_repeatedly) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [name for name in os.listdir(directory) if name.endswith('.tmp')] == []
+    with open(directory / f'{os.getpid()}.json') as file:
+        assert json.load(file)['stages']
+
+
+def test_flusher_keeps_running_after_a_failed_write(directory, monkeypatch):
+    write = metrics._write
+    calls = []
+
+    def failing_once(path, snapshot):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError('disk full')
+        write(path, snapshot)
+
+    monkeypatch.setattr(metrics, '_write', failing_once)
+    monkeypatch.setattr(metrics, 'FLUSH_SECONDS', 0.01)
+    monkeypatch.setattr(metrics, '_dirty', True)
+    flusher = threading.Thread(target=metrics._flush_changes, daemon=True)
+    flusher.start()
+
+    deadline = time.monotonic() + 5
+    while not (directory / f'{os.getpid()}.json').exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert flusher.is_alive()
+    assert len(calls) >= 2
+    assert (directory / f'{os.getpid()}.json').exists()
@@ -0,0 +1,25 @@
+import flask
+import pytest
+from ddvis import profiling
+
+TOKEN = 'secret'
+
+
+@pytest.fixture(autouse=True)
+def token(monkeypatch):
+    monkeypatch.setattr(profiling, 'TOKEN', TOKEN)
+    monkeypatch.setattr(profiling, 'RATE', 0)
+
+
+@pytest.mark.parametrize('path, headers, requested', [
+    ('/_dash-update-component', {}, False),
+    ('/_dash-update-component?profile=secret', {}, True),
+    ('/_dash-update-component?profile=wrong', {}, False),
+    ('/_dash-update-component', {'X-Profile': TOKEN}, True),
+    ('/_dash-update-component', {'X-Profile': 'wrong'}, False),
+    # every callback fired from a profiled page sends its URL, they are not profiled
+    ('/_dash-update-component', {'Referer': 'https://example.org/app/?profile=secret'}, False),
+])
+def test_callback_is_profiled_by_its_own_request(path, headers, requested):
+    with flask.Flask(__name__).test_request_context(path, method='POST', headers=headers):
+        assert profiling._callback_requested() is requested
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ddvis.tables import TableQuery, split_filter_part
+
+
+@pytest.mark.parametrize('filter_part, expected', [
+    ('{year} >= 2000', ('year', 'ge', 2000.0)),
+    ('{year} ge 2000', ('year', 'ge', 2000.0)),
+    ('{year} <= 2000', ('year', 'le', 2000.0)),
+    ('{year} le 2000', ('year', 'le', 2000.0)),
+    ('{year} < 2000', ('year', 'lt', 2000.0)),
+    ('{year} lt 2000', ('year', 'lt', 2000.0)),
+    ('{year} > 2000', ('year', 'gt', 2000.0)),
+    ('{year} gt 2000', ('year', 'gt', 2000.0)),
+    ('{value} != 3.5', ('value', 'ne', 3.5)),
+    ('{value} ne 3.5', ('value', 'ne', 3.5)),
+    ('{value} = -1e3', ('value', 'eq', -1000.0)),
+    ('{value} eq -1e3', ('value', 'eq', -1000.0)),
+    ('{country} contains United', ('country', 'contains', 'United')),
+    ('{date} datestartswith 2020-01', ('date', 'datestartswith', '2020-01')),
+    # quoted values are strings, quotes escaped inside them
+    ('{country} = "United Kingdom"', ('country', 'eq', 'United Kingdom')),
+    ("{country} eq 'O\\'Brien'", ('country', 'eq', "O'Brien")),
+    ('{code} = `5`', ('code', 'eq', '5')),
+    # operators are only looked for after the column name
+    ('{a > b} = 1', ('a > b', 'eq', 1.0)),
+    ('{country} contains >=', ('country', 'contains', '>=')),
+])
+def test_split_filter_part(filter_part, expected):
+    assert split_filter_part(filter_part) == expected
+
+
+@pytest.mark.parametrize('filter_part', [
+    '',
+    '{year} 2000',       # no operator
+    '{year} >',          # no value
+    'year > 2000',       # no column
+    '{} > 2000',         # empty column
+    '{year} between 1 3',
+])
+def test_bad_expression_is_not_split(filter_part):
+    assert split_filter_part(filter_part) == (None, None, None)
+
+
+@pytest.fixture
+def query():
+    return TableQuery(pd.DataFrame({
+        'country': ['France', 'United Kingdom', 'United States', 'Peru', None],
+        'year': [1999, 2000, 2001, 2002, 2003],
+        'value': [3.5, np.nan, 1.0, 10.0, 2.0],
+        'share': np.array([3.4, 1.2, np.nan, 3.4, 0.5], dtype='float32'),
+        'date': ['2020-01-05', '2020-02-01', '2019-12-31', '2020-01-30', None],
+    }))
+
+
+@pytest.mark.parametrize('filter_query, rows', [
+    ('', [0, 1, 2, 3, 4]),
+    ('{year} >= 2001', [2, 3, 4]),
+    ('{year} le 2000', [0, 1]),
+    ('{year} < 2000', [0]),
+    ('{year} gt 2002', [4]),
+    ('{year} = 2000', [1]),
+    # missing values never match a comparison, and always match !=
+    ('{value} > 1', [0, 3, 4]),
+    ('{value} != 3.5', [1, 2, 3, 4]),
+    ('{country} ne France', [1, 2, 3, 4]),
+    # float32 values compare as shown, 3.4 and not 3.4000000953674316
+    ('{share} = 3.4', [0, 3]),
+    # strings compare as text
+    ('{country} < M', [0]),
+    ('{country} = "United States"', [2]),
+    ('{country} contains United', [1, 2]),
+    ('{date} datestartswith 2020-01', [0, 3]),
+    # numbers are matched as written in string columns and by contains
+    ('{date} contains 31', [2]),
+    ('{date} < 2020', [2]),
+    ('{year} contains 200', [1, 2, 3, 4]),
+    ('{country} contains United && {year} ge 2001', [2]),
+    # bad expressions and unknown columns filter nothing
+    ('{year} garbage', [0, 1, 2, 3, 4]),
+    ('{unknown} > 1', [0, 1, 2, 3, 4]),
+    ('{year} > 2000 && {year} garbage', [2, 3, 4]),
+])
+def test_filter(query, filter_query, rows):
+    assert query.rows(filter_query).tolist() == rows
+
+
+@pytest.mark.parametrize('sort_by, rows', [
+    ([], [0, 1, 2, 3, 4]),
+    ([{'column_id': 'year', 'direction': 'desc'}], [4, 3, 2, 1, 0]),
+    # missing values last in both directions
+    ([{'column_id': 'value', 'direction': 'asc'}], [2, 4, 0, 3, 1]),
+    ([{'column_id': 'value', 'direction': 'desc'}], [3, 0, 4, 2, 1]),
+    ([{'column_id': 'country', 'direction': 'asc'}], [0, 3, 1, 2, 4]),
+    ([{'column_id': 'share', 'direction': 'desc'}, {'column_id': 'year', 'direction': 'desc'}], [3, 0, 1, 4, 2]),
+    ([{'column_id': 'unknown', 'direction': 'asc'}], [0, 1, 2, 3, 4]),
+])
+def test_sort(query, sort_by, rows):
+    assert query.rows('', sort_by).tolist() == rows
+
+
+@pytest.mark.parametrize('page_current, page_size, years, page_count', [
+    (0, 2, [1999, 2000], 3),
+    (1, 2, [2001, 2002], 3),
+    # the last page is partial
+    (2, 2, [2003], 3),
+    # past the last page
+    (3, 2, [], 3),
+    (0, 5, [1999, 2000, 2001, 2002, 2003], 1),
+    (0, 10, [1999, 2000, 2001, 2002, 2003], 1),
+])
+def test_page_boundaries(query, page_current, page_size, years, page_count):
+    records, pages = query.page('', [], page_current, page_size)
+    assert [record['year'] for record in records] == years
+    assert pages == page_count
+
+
+def test_page_of_filtered_and_sorted_rows(query):
+    records, page_count = query.page('{year} >= 2000', [{'column_id': 'year', 'direction': 'desc'}], 1, 3)
+    assert records == [{'country': 'United Kingdom', 'year': 2000, 'value': None, 'share': 1.2, 'date': '2020-02-01'}]
+    assert page_count == 2
+
+
+def test_empty_result_has_one_page(query):
+    assert query.page('{year} > 3000', [], 0, 2) == ([], 1)